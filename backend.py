@@ -1,10 +1,34 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import csv
+import base64
+import codecs
+import hashlib
+import io
+import itertools
 import json
+import os
+import queue
 import random
+import re
+import sqlite3
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
 from copy import deepcopy
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow가 없으면 thumbnail 대신 원본 mirror를 사용합니다.
+    Image = None
 
 
 RUNCOMFY_API_BASE = "https://api.runcomfy.net"
@@ -18,6 +42,100 @@ BODY_WORKFLOW_PATH = WORKFLOW_DIR / "Reference-based_Outfit_Change.json"
 SCENE_WORKFLOW_PATH = WORKFLOW_DIR / "Reference-based_Scene_Generation.json"
 CAMERA_REFINEMENT_WORKFLOW_PATH = WORKFLOW_DIR / "Camera_Refinement.json"
 
+RUNCOMFY_PENDING_STATUSES = {"in_queue", "in_progress"}
+RUNCOMFY_FAILED_STATUSES = {"failed", "error", "cancelled", "canceled"}
+
+# Job engine의 HTTP 호출(submit/status/result)을 처리하는 worker thread 수입니다.
+# polling 대기는 event loop의 asyncio.sleep으로 처리하므로
+# in-flight job 수가 아니라 동시에 진행 중인 HTTP 요청 수만큼만 필요합니다.
+JOB_ENGINE_HTTP_WORKERS = 16
+
+# 완료된 job handle을 engine registry에 유지하는 시간입니다.
+JOB_RETENTION_SECONDS = 60 * 60
+
+# deployment_id별 RunComfy API 호출 rate(token bucket)와 동시 in-flight job 수 상한입니다.
+# 같은 process의 모든 session이 공유하며, 상한을 넘는 job은 owner(session)별
+# round-robin 대기열에서 순서를 기다립니다.
+GOVERNOR_REQUESTS_PER_SECOND = 5.0
+GOVERNOR_BURST = 10
+GOVERNOR_MAX_IN_FLIGHT = 8
+
+# 여러 deployment로 routing할 때의 failover 설정입니다.
+# submit이 이 status로 거절되거나 연결 자체가 실패하면 서버가 요청을 받지 않은 것이므로
+# 다른 deployment로 다시 submit하고, 실패한 deployment는 cooldown 동안 후보에서 뺍니다.
+ROUTER_FAILOVER_STATUSES = (429, 502, 503, 504)
+ROUTER_FAILURE_COOLDOWN_SECONDS = 30.0
+ROUTER_MAX_COOLDOWN_SECONDS = 300.0
+
+# submit된 job의 request_id / status_url / result_url을 기록하는 SQLite ledger 위치입니다.
+# server가 재시작되어도 ledger에 남은 미완료 job의 polling을 이어서 결과를 받아옵니다.
+JOB_LEDGER_PATH = Path(__file__).parent / ".cache" / "job_ledger.sqlite3"
+JOB_LEDGER_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+# Streamlit rerun과 무관하게 run_* 호출 전체(submit → poll → 결과 정리)를
+# 대신 실행하는 background worker thread 수입니다.
+BACKGROUND_RUN_WORKERS = 8
+
+# Step 3 batch mode에서 동시에 실행할 최대 job 수입니다.
+# RunComfy deployment의 replica 수에 맞춰 설정합니다.
+SCENE_BATCH_MAX_CONCURRENCY = 4
+SCENE_BATCH_SHOTS_PER_JOB = 1
+
+# Step 4 camera angle sweep에서 동시에 실행할 최대 pose job 수입니다.
+CAMERA_SWEEP_MAX_CONCURRENCY = 4
+
+# Pipeline runner가 동시에 실행할 최대 stage 수입니다.
+# Boy/Girl 2A → 2B 두 갈래가 동시에 진행되도록 2 이상이어야 합니다.
+PIPELINE_MAX_CONCURRENCY = 4
+
+# 동일한 patched workflow에 대한 결과 cache 기본값입니다.
+# seed를 고정한 요청만 cache하므로 random seed 요청은 항상 새로 실행됩니다.
+RESULT_CACHE_DIR = Path(__file__).parent / ".cache" / "results"
+RESULT_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+RESULT_CACHE_MAX_ENTRIES = 500
+RESULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# 결과 이미지 local mirror / thumbnail 저장 위치입니다.
+# Streamlit static serving(.streamlit/config.toml의 enableStaticServing)으로
+# app/static/image_cache/... 경로에서 제공됩니다.
+STATIC_DIR = Path(__file__).parent / "static"
+IMAGE_STORE_DIR = STATIC_DIR / "image_cache"
+IMAGE_STORE_STATIC_URL = "app/static/image_cache"
+IMAGE_STORE_MAX_BYTES = 500 * 1024 * 1024
+IMAGE_STORE_THUMBNAIL_QUALITY = 82
+IMAGE_STORE_RETRY_SECONDS = 5 * 60
+IMAGE_STORE_WORKERS = 4
+
+# 업로드된 reference 이미지(garment / outfit)를 content hash로 한 번만 저장하는 위치입니다.
+# RunComfy가 내려받을 수 있도록 외부에서 접근 가능한 app URL(public_base_url)이 필요합니다.
+REFERENCE_ASSET_DIR = STATIC_DIR / "reference_assets"
+REFERENCE_ASSET_STATIC_PATH = "app/static/reference_assets"
+REFERENCE_ASSET_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/webp": ".webp",
+}
+
+# RunComfy HTTP client connection pool / retry 기본값입니다.
+# pool_maxsize는 host별 keep-alive connection 수이므로
+# job engine의 HTTP worker 수 이상으로 둡니다.
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 32
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_TIMEOUT_SECONDS = 60
+
+# Adaptive polling 설정입니다.
+# - 대기열(in_queue)에서는 POLL_MIN_INTERVAL부터 지수 backoff + jitter
+# - 실행 중(in_progress)에는 workflow별 과거 실행 시간을 기준으로
+#   예상 완료 시점에 가까울수록 촘촘하게 polling 합니다.
+POLL_MIN_INTERVAL = 1.0
+POLL_MAX_INTERVAL = 30.0
+POLL_JITTER_RATIO = 0.2
+POLL_DURATION_EMA_ALPHA = 0.3
+
 
 # =========================
 # Common helpers
@@ -36,6 +154,107 @@ def _headers(api_key: str, include_content_type: bool = True) -> dict:
     return headers
 
 
+class _RunComfyRetry(Retry):
+    """
+    submit(POST)은 멱등이 아니므로 서버가 요청을 받지 않은 것이 확실한 경우
+    (429 응답, connect 단계 오류)에만 재시도합니다.
+    status/result 조회(GET)는 HTTP_RETRY_STATUSES와 read 오류 모두 재시도합니다.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == "POST" and status_code != 429:
+            return False
+
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        error = kwargs.get("error")
+
+        if method == "POST" and error is not None and self._is_read_error(error):
+            return self.new(read=False).increment(method, url, *args, **kwargs)
+
+        return super().increment(method, url, *args, **kwargs)
+
+
+_HTTP_SESSION: requests.Session | None = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def _build_http_session(
+    pool_connections: int,
+    pool_maxsize: int,
+    max_retries: int,
+    backoff_factor: float,
+) -> requests.Session:
+    retry = _RunComfyRetry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def configure_http_client(
+    pool_connections: int = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    max_retries: int = HTTP_MAX_RETRIES,
+    backoff_factor: float = HTTP_BACKOFF_FACTOR,
+) -> requests.Session:
+    """
+    모든 RunComfy 호출이 공유하는 keep-alive connection pool을 (재)구성합니다.
+
+    - pool_connections: connection pool을 유지할 host 수
+    - pool_maxsize: host별 최대 keep-alive connection 수
+    - max_retries / backoff_factor: 429 / 5xx 재시도 횟수와 지수 backoff 계수
+    """
+    global _HTTP_SESSION
+
+    session = _build_http_session(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries,
+        backoff_factor=backoff_factor,
+    )
+
+    with _HTTP_SESSION_LOCK:
+        previous_session = _HTTP_SESSION
+        _HTTP_SESSION = session
+
+    if previous_session is not None:
+        previous_session.close()
+
+    return session
+
+
+def get_http_session() -> requests.Session:
+    global _HTTP_SESSION
+
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            _HTTP_SESSION = _build_http_session(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+                max_retries=HTTP_MAX_RETRIES,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+            )
+
+        return _HTTP_SESSION
+
+
 def load_workflow_api_json(workflow_path: str | Path) -> dict:
     workflow_path = Path(workflow_path)
 
@@ -57,6 +276,93 @@ def load_workflow_api_json(workflow_path: str | Path) -> dict:
     return workflow
 
 
+# =========================
+# Workflow template cache
+# =========================
+class WorkflowInstance(dict):
+    """
+    workflow template cache가 반환하는 copy-on-write workflow dict입니다.
+
+    top-level dict만 새로 만들고 node dict는 cache의 template과 공유합니다.
+    patch 함수는 _writable_node()로 수정할 node만 복사하므로
+    요청마다 전체 workflow를 deepcopy하지 않습니다.
+    공유 node를 직접 수정하면 cache의 template이 바뀌므로
+    반드시 _writable_node()를 거쳐 수정해야 합니다.
+    """
+
+    def __init__(self, *args, template_key: tuple | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.template_key = template_key
+        self._owned_nodes: set[str] = set()
+
+
+_WORKFLOW_TEMPLATE_CACHE: dict[Path, dict] = {}
+_WORKFLOW_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def _copy_on_write(workflow: dict) -> WorkflowInstance:
+    return WorkflowInstance(
+        workflow,
+        template_key=getattr(workflow, "template_key", None),
+    )
+
+
+def load_workflow_template(workflow_path: str | Path) -> WorkflowInstance:
+    """
+    workflow JSON을 process 전체에서 한 번만 parse하고,
+    파일 mtime / size가 바뀌면 다시 읽습니다.
+    반환값은 cache된 template을 공유하는 WorkflowInstance입니다.
+    """
+    workflow_path = Path(workflow_path).resolve()
+
+    try:
+        stat = workflow_path.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"workflow_api_json file not found: {workflow_path}"
+        ) from None
+
+    template_key = (str(workflow_path), stat.st_mtime_ns, stat.st_size)
+
+    with _WORKFLOW_TEMPLATE_CACHE_LOCK:
+        entry = _WORKFLOW_TEMPLATE_CACHE.get(workflow_path)
+
+    if entry is None or entry["template_key"] != template_key:
+        entry = {
+            "template_key": template_key,
+            "workflow": load_workflow_api_json(workflow_path),
+        }
+
+        with _WORKFLOW_TEMPLATE_CACHE_LOCK:
+            _WORKFLOW_TEMPLATE_CACHE[workflow_path] = entry
+
+    return WorkflowInstance(
+        entry["workflow"],
+        template_key=entry["template_key"],
+    )
+
+
+def clear_workflow_template_cache() -> None:
+    with _WORKFLOW_TEMPLATE_CACHE_LOCK:
+        _WORKFLOW_TEMPLATE_CACHE.clear()
+
+
+class RunComfyHTTPError(RuntimeError):
+    """
+    RunComfy API가 4xx/5xx로 응답했을 때 발생합니다. status_code로 failover 여부를 판단합니다.
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RunComfyCancelledError(RuntimeError):
+    """
+    cancel로 중단된 job / run을 기다리던 쪽에 전달됩니다.
+    """
+
+
 def submit_runcomfy_dynamic_workflow(
     api_key: str,
     deployment_id: str,
@@ -67,75 +373,80 @@ def submit_runcomfy_dynamic_workflow(
 
     url = f"{RUNCOMFY_API_BASE}/prod/v2/deployments/{deployment_id}/inference"
 
-    response = requests.post(
+    response = get_http_session().post(
         url,
         headers=_headers(api_key),
         json={"workflow_api_json": workflow_api_json},
-        timeout=60,
+        timeout=HTTP_TIMEOUT_SECONDS,
     )
 
     if response.status_code >= 400:
-        raise RuntimeError(
+        raise RunComfyHTTPError(
             "RunComfy dynamic workflow submit failed: "
-            f"{response.status_code} / {response.text}"
+            f"{response.status_code} / {response.text}",
+            status_code=response.status_code,
         )
 
     return response.json()
 
 
-def poll_runcomfy_result(
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _fetch_runcomfy_status(
     api_key: str,
     status_url: str,
-    result_url: str,
-    poll_interval: int = 10,
-    timeout_seconds: int = 1800,
-) -> dict:
-    start_time = time.time()
-
-    while True:
-        if time.time() - start_time > timeout_seconds:
-            raise TimeoutError("RunComfy request timed out.")
+) -> tuple[dict, float | None]:
+    status_response = get_http_session().get(
+        status_url,
+        headers=_headers(api_key, include_content_type=False),
+        timeout=HTTP_TIMEOUT_SECONDS,
+    )
 
-        status_response = requests.get(
-            status_url,
-            headers=_headers(api_key, include_content_type=False),
-            timeout=60,
+    if status_response.status_code >= 400:
+        raise RunComfyHTTPError(
+            "RunComfy status check failed: "
+            f"{status_response.status_code} / {status_response.text}",
+            status_code=status_response.status_code,
         )
 
-        if status_response.status_code >= 400:
-            raise RuntimeError(
-                "RunComfy status check failed: "
-                f"{status_response.status_code} / {status_response.text}"
-            )
-
-        status_data = status_response.json()
-        status = status_data.get("status", "")
+    retry_after = _parse_retry_after(
+        status_response.headers.get("Retry-After")
+    )
 
-        if status == "completed":
-            break
+    return status_response.json(), retry_after
 
-        if status in {"failed", "error", "cancelled", "canceled"}:
-            raise RuntimeError(
-                f"RunComfy request failed during polling: {status_data}"
-            )
 
-        if status not in {"in_queue", "in_progress"}:
-            raise RuntimeError(
-                f"Unexpected RunComfy status: {status_data}"
-            )
+def get_runcomfy_status(
+    api_key: str,
+    status_url: str,
+) -> dict:
+    status_data, _retry_after = _fetch_runcomfy_status(api_key, status_url)
+    return status_data
 
-        time.sleep(poll_interval)
 
-    result_response = requests.get(
+def get_runcomfy_result(
+    api_key: str,
+    result_url: str,
+) -> dict:
+    result_response = get_http_session().get(
         result_url,
         headers=_headers(api_key, include_content_type=False),
-        timeout=60,
+        timeout=HTTP_TIMEOUT_SECONDS,
     )
 
     if result_response.status_code >= 400:
-        raise RuntimeError(
+        raise RunComfyHTTPError(
             "RunComfy result fetch failed: "
-            f"{result_response.status_code} / {result_response.text}"
+            f"{result_response.status_code} / {result_response.text}",
+            status_code=result_response.status_code,
         )
 
     result_data = result_response.json()
@@ -148,110 +459,220 @@ def poll_runcomfy_result(
     return result_data
 
 
-def extract_output_images(result: dict) -> list[dict]:
+def cancel_runcomfy_request(
+    api_key: str,
+    request_data: dict,
+) -> dict:
+    """
+    submit 응답의 cancel_url(없으면 status_url의 /status를 /cancel로 바꾼 URL)로
+    RunComfy에 실행 취소를 요청합니다.
+    """
+    cancel_url = request_data.get("cancel_url", "")
+    status_url = request_data.get("status_url", "")
+
+    if not cancel_url and status_url.rstrip("/").endswith("/status"):
+        cancel_url = status_url.rstrip("/")[: -len("/status")] + "/cancel"
+
+    if not cancel_url:
+        raise ValueError(f"RunComfy cancel URL is missing: {request_data}")
+
+    response = get_http_session().post(
+        cancel_url,
+        headers=_headers(api_key),
+        timeout=HTTP_TIMEOUT_SECONDS,
+    )
+
+    if response.status_code >= 400:
+        raise RunComfyHTTPError(
+            "RunComfy cancel failed: "
+            f"{response.status_code} / {response.text}",
+            status_code=response.status_code,
+        )
+
+    return response.json() if response.content else {}
+
+
+def _check_runcomfy_status(status_data: dict) -> str:
+    status = status_data.get("status", "")
+
+    if status in RUNCOMFY_FAILED_STATUSES:
+        raise RuntimeError(
+            f"RunComfy request failed during polling: {status_data}"
+        )
+
+    if status != "completed" and status not in RUNCOMFY_PENDING_STATUSES:
+        raise RuntimeError(
+            f"Unexpected RunComfy status: {status_data}"
+        )
+
+    return status
+
+
+def poll_runcomfy_result(
+    api_key: str,
+    status_url: str,
+    result_url: str,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+) -> dict:
+    start_time = time.time()
+    scheduler = AdaptivePollScheduler(base_interval=poll_interval)
+
+    while True:
+        if time.time() - start_time > timeout_seconds:
+            raise TimeoutError("RunComfy request timed out.")
+
+        status_data, retry_after = _fetch_runcomfy_status(api_key, status_url)
+        status = _check_runcomfy_status(status_data)
+
+        if status == "completed":
+            break
+
+        delay = scheduler.next_delay(status, status_data, retry_after)
+        remaining = timeout_seconds - (time.time() - start_time)
+        time.sleep(max(0.0, min(delay, remaining)))
+
+    return get_runcomfy_result(api_key, result_url)
+
+
+OUTPUT_IMAGE_URL_KEYS = ("url", "image", "image_url", "file_url", "download_url", "path")
+OUTPUT_FILE_LIST_KEYS = ("images", "files", "output_files")
+OUTPUT_IMAGE_PATTERN = re.compile(r"\.(?:png|jpe?g|webp)", re.IGNORECASE)
+
+
+class OutputImageIndex:
     """
-    RunComfy 결과에서 이미지 URL을 안전하게 추출합니다.
+    RunComfy 결과를 한 번만 훑어 node_id → 이미지 목록 index를 만듭니다.
 
     지원 구조:
     1. outputs -> node_id -> images
     2. outputs -> node_id -> files / output_files
-    3. 위 구조에서 찾지 못하면 result 전체를 재귀 탐색
+    3. 위 구조에서 찾지 못하면 result 전체를 탐색 (숫자 key를 node_id로 봅니다)
+
+    - image record는 node_id / url / image / filename / subfolder / type만 가진 dict이며
+      원본 응답 item은 복사하지 않습니다.
+    - URL이 같은 이미지는 처음 나온 것만 남깁니다.
     """
-    images = []
 
-    def add_image_item(item: dict, node_id: str = ""):
+    def __init__(self, result: dict):
+        self.images: list[dict] = []
+        self.by_node: dict[str, list[dict]] = {}
+        self._seen_urls: set[str] = set()
+
+        outputs = result.get("outputs", {}) if isinstance(result, dict) else {}
+
+        if isinstance(outputs, dict):
+            for node_id, node_output in outputs.items():
+                if not isinstance(node_output, dict):
+                    continue
+
+                for key in OUTPUT_FILE_LIST_KEYS:
+                    items = node_output.get(key, [])
+
+                    if isinstance(items, dict):
+                        items = [items]
+
+                    if isinstance(items, list):
+                        for item in items:
+                            self._add(item, str(node_id))
+
+        if not self.images:
+            self._walk(result)
+
+    def _add(self, item, node_id: str) -> None:
         if not isinstance(item, dict):
             return
 
-        url = (
-            item.get("url")
-            or item.get("image")
-            or item.get("image_url")
-            or item.get("file_url")
-            or item.get("download_url")
-            or item.get("path")
-            or ""
-        )
+        url = next((item[key] for key in OUTPUT_IMAGE_URL_KEYS if item.get(key)), "")
+
+        if not isinstance(url, str) or not url or url in self._seen_urls:
+            return
 
         filename = item.get("filename", "")
 
-        if not filename and isinstance(url, str) and "/" in url:
+        if not filename and "/" in url:
             filename = url.split("?")[0].rstrip("/").split("/")[-1]
 
-        if not isinstance(url, str) or not url:
+        if not (
+            OUTPUT_IMAGE_PATTERN.search(url)
+            or OUTPUT_IMAGE_PATTERN.search(str(filename))
+        ):
             return
 
-        lower_url = url.lower()
-        lower_filename = str(filename).lower()
+        record = {
+            "node_id": node_id,
+            "url": url,
+            "image": url,
+            "filename": filename,
+            "subfolder": item.get("subfolder", ""),
+            "type": item.get("type", ""),
+        }
 
-        is_image = (
-            lower_url.endswith((".png", ".jpg", ".jpeg", ".webp"))
-            or ".png" in lower_url
-            or ".jpg" in lower_url
-            or ".jpeg" in lower_url
-            or ".webp" in lower_url
-            or lower_filename.endswith((".png", ".jpg", ".jpeg", ".webp"))
-        )
+        self._seen_urls.add(url)
+        self.images.append(record)
+        self.by_node.setdefault(node_id, []).append(record)
 
-        if not is_image:
-            return
+    def _walk(self, result) -> None:
+        # 재귀 대신 stack으로 깊이 우선 순회합니다 (원래 순서 유지).
+        stack = [(result, "")]
 
-        images.append(
-            {
-                "node_id": str(node_id),
-                "url": url,
-                "image": url,
-                "filename": filename,
-                "subfolder": item.get("subfolder", ""),
-                "type": item.get("type", ""),
-                "raw": item,
-            }
-        )
+        while stack:
+            obj, node_id = stack.pop()
 
-    outputs = result.get("outputs", {})
+            if isinstance(obj, dict):
+                self._add(obj, node_id)
+                stack.extend(
+                    (value, str(key) if str(key).isdigit() else node_id)
+                    for key, value in reversed(list(obj.items()))
+                )
+            elif isinstance(obj, list):
+                stack.extend((value, node_id) for value in reversed(obj))
 
-    if isinstance(outputs, dict):
-        for node_id, node_output in outputs.items():
-            if not isinstance(node_output, dict):
-                continue
+    def node_images(self, node_id: str) -> list[dict]:
+        """
+        node_id의 이미지 목록입니다.
+        RunComfy 응답에 type='output'이 있으면 그것을 우선 사용하고, type 필드가 없는 응답도 지원합니다.
+        """
+        images = self.by_node.get(str(node_id), [])
+        output_images = [image for image in images if image["type"] == "output"]
 
-            for key in ("images", "files", "output_files"):
-                items = node_output.get(key, [])
+        return output_images or images
 
-                if isinstance(items, dict):
-                    items = [items]
 
-                if isinstance(items, list):
-                    for item in items:
-                        add_image_item(item, node_id=str(node_id))
+def extract_output_images(result: dict) -> list[dict]:
+    """
+    RunComfy 결과에서 이미지 URL을 안전하게 추출합니다. (OutputImageIndex 참고)
+    """
+    return OutputImageIndex(result).images
 
-    if not images:
-        def walk(obj, node_id: str = ""):
-            if isinstance(obj, dict):
-                add_image_item(obj, node_id=node_id)
 
-                for key, value in obj.items():
-                    next_node_id = node_id
-                    if str(key).isdigit():
-                        next_node_id = str(key)
-                    walk(value, node_id=next_node_id)
+def build_output_images(
+    result_data: dict,
+    save_node_id: str,
+    label: str,
+    shot_ids: list[str] | None = None,
+) -> list[dict]:
+    """
+    save node의 이미지에 UI label을 붙여 반환합니다.
 
-            elif isinstance(obj, list):
-                for value in obj:
-                    walk(value, node_id=node_id)
+    - label: 이미지마다 f"{label} {n}"으로 붙습니다.
+    - shot_ids: 이미지 수와 shot 수가 같으면 순서대로 shot 하나씩, 아니면 모든 shot을 기록합니다.
+      storyboard 수정 시 바뀐 shot의 결과만 버릴 수 있도록 씁니다.
+    """
+    node_images = OutputImageIndex(result_data).node_images(save_node_id)
+    one_to_one = shot_ids is not None and len(node_images) == len(shot_ids)
+    images = []
 
-        walk(result)
+    for idx, image in enumerate(node_images, start=1):
+        item = dict(image)
 
-    deduped = []
-    seen = set()
+        if shot_ids is not None:
+            item["shot_ids"] = [shot_ids[idx - 1]] if one_to_one else list(shot_ids)
 
-    for item in images:
-        url = item.get("url", "")
-        if url and url not in seen:
-            deduped.append(item)
-            seen.add(url)
+        item["label"] = f"{label} {idx}"
+        images.append(item)
 
-    return deduped
+    return images
 
 
 def find_nodes_by_class_type(workflow: dict, class_type: str) -> list[str]:
@@ -303,162 +724,3510 @@ def _require_node(
     return node
 
 
-def _set_image_input(
+def _writable_node(
     workflow: dict,
     node_id: str,
-    image_value: str,
-) -> None:
-    """
-    LoadImageFromUrl 노드에 원격 이미지 URL을 주입합니다.
+    expected_class_type: str | None = None,
+    description: str = "",
+) -> dict:
     """
-    if not str(image_value or "").strip():
-        raise ValueError(
-            f"Image URL for node {node_id} is empty."
-        )
+    _require_node()와 같이 node를 검증한 뒤, 수정 가능한 복사본을 반환합니다.
 
+    WorkflowInstance에서는 node와 inputs dict를 처음 수정할 때 한 번만 복사하고
+    이후에는 같은 복사본을 반환합니다.
+    """
+    node_id = str(node_id)
     node = _require_node(
         workflow,
         node_id,
-        expected_class_type="LoadImageFromUrl",
-        description=f"Image input node {node_id}",
+        expected_class_type,
+        description,
     )
 
-    inputs = node.setdefault("inputs", {})
-    inputs["image"] = str(image_value).strip()
+    owned_nodes = getattr(workflow, "_owned_nodes", None)
 
-    if "keep_alpha_channel" in inputs:
-        inputs["keep_alpha_channel"] = False
+    if owned_nodes is None:
+        node.setdefault("inputs", {})
+        return node
 
-    if "output_mode" in inputs:
-        inputs["output_mode"] = False
+    if node_id not in owned_nodes:
+        node = dict(node)
+        node["inputs"] = dict(node.get("inputs") or {})
+        workflow[node_id] = node
+        owned_nodes.add(node_id)
 
+    return node
 
-def _extract_save_node_images(
-    result_data: dict,
-    save_node_id: str,
-) -> list[dict]:
-    extracted_images = extract_output_images(result_data)
 
-    save_node_images = [
-        item
-        for item in extracted_images
-        if str(item.get("node_id", "")) == str(save_node_id)
-    ]
+# =========================
+# Workflow patch plans
+# =========================
+# patch plan은 workflow에 주입할 값을 선언적으로 정의합니다.
+#
+# - nodes: alias -> node selector
+#     {"class_type": ..., "description": ...}            alias가 곧 node id
+#     {"class_type": ..., "select": "first" | "all"}     class_type으로 탐색
+#     {"select": "all"}                                  모든 node
+# - fields: (value name, node alias, input name, mode)
+#     set         항상 설정
+#     if_present  template에 해당 input이 있을 때만 설정
+#     if_int      template의 해당 input이 INT일 때만 설정
+#     mapping     values[value name] dict 중 template에 있는 input만 설정
+#     image       LoadImageFromUrl image 설정 + alpha / output_mode 비활성화
+# - constants: (node alias, input name, value) 항상 설정하는 고정값
+#
+# compile_patch_plan()은 node id / class_type / input 존재 여부를
+# template당 한 번만 검증하고 평탄한 assignment 목록으로 변환합니다.
+PATCH_SET = "set"
+PATCH_IF_PRESENT = "if_present"
+PATCH_IF_INT = "if_int"
+PATCH_MAPPING = "mapping"
+PATCH_IMAGE = "image"
+
+_FROM_VALUE = object()
+
+_COMPILED_PATCH_PLANS: dict[tuple, dict] = {}
+_COMPILED_PATCH_PLANS_LOCK = threading.Lock()
+
+
+def _resolve_plan_nodes(
+    workflow: dict,
+    plan: dict,
+) -> dict[str, list[str]]:
+    resolved = {}
+
+    for alias, spec in plan["nodes"].items():
+        class_type = spec.get("class_type")
+        select = spec.get("select")
+
+        if select is None:
+            _require_node(
+                workflow,
+                alias,
+                class_type,
+                spec.get("description", ""),
+            )
+            resolved[alias] = [str(alias)]
+
+        elif select == "first":
+            resolved[alias] = [
+                find_first_node_by_class_type(workflow, class_type)
+            ]
+
+        elif select == "all":
+            resolved[alias] = [
+                str(node_id)
+                for node_id, node in workflow.items()
+                if isinstance(node, dict)
+                and (class_type is None or node.get("class_type") == class_type)
+            ]
+
+        else:
+            raise ValueError(
+                f"{plan['name']} patch plan has unknown node selector: {select}"
+            )
 
-    # RunComfy 응답에 type='output'이 있으면 그것을 우선 사용합니다.
-    # type 필드가 없는 응답도 지원합니다.
-    typed_output_images = [
-        item
-        for item in save_node_images
-        if item.get("raw", {}).get("type") == "output"
-    ]
+    return resolved
 
-    return typed_output_images or save_node_images
 
+def _compile_patch_plan(workflow: dict, plan: dict) -> dict:
+    resolved_nodes = _resolve_plan_nodes(workflow, plan)
 
-def character_filter_to_name(character_filter: str) -> str:
-    if character_filter == "C1":
-        return "boy"
-    if character_filter == "C2":
-        return "girl"
+    assignments = []
+    mappings = []
 
-    return str(character_filter).lower().replace(" ", "_")
+    def template_inputs(node_id: str) -> dict:
+        inputs = workflow[node_id].get("inputs", {})
+        return inputs if isinstance(inputs, dict) else {}
 
+    for value_name, alias, input_name, mode in plan.get("fields", ()):
+        if alias not in resolved_nodes:
+            raise KeyError(
+                f"{plan['name']} patch plan references unknown node alias '{alias}'."
+            )
 
-def _run_workflow(
-    api_key: str,
-    deployment_id: str,
-    workflow: dict,
-    poll_interval: int,
-    timeout_seconds: int,
-) -> tuple[dict, dict]:
-    request_data = submit_runcomfy_dynamic_workflow(
-        api_key=api_key,
-        deployment_id=deployment_id,
-        workflow_api_json=workflow,
-    )
+        for node_id in resolved_nodes[alias]:
+            inputs = template_inputs(node_id)
 
-    status_url = request_data.get("status_url")
-    result_url = request_data.get("result_url")
+            if mode == PATCH_SET:
+                assignments.append((node_id, input_name, value_name, _FROM_VALUE))
 
-    if not status_url or not result_url:
-        raise RuntimeError(
-            "RunComfy response does not include status/result URL: "
-            f"{request_data}"
-        )
+            elif mode == PATCH_IF_PRESENT:
+                if input_name in inputs:
+                    assignments.append(
+                        (node_id, input_name, value_name, _FROM_VALUE)
+                    )
 
-    result_data = poll_runcomfy_result(
-        api_key=api_key,
-        status_url=status_url,
-        result_url=result_url,
-        poll_interval=poll_interval,
-        timeout_seconds=timeout_seconds,
-    )
+            elif mode == PATCH_IF_INT:
+                value = inputs.get(input_name)
+                if isinstance(value, int) and not isinstance(value, bool):
+                    assignments.append(
+                        (node_id, input_name, value_name, _FROM_VALUE)
+                    )
 
-    return request_data, result_data
+            elif mode == PATCH_MAPPING:
+                mappings.append((node_id, value_name, frozenset(inputs)))
 
+            elif mode == PATCH_IMAGE:
+                actual_class_type = workflow[node_id].get("class_type", "")
+                if actual_class_type != "LoadImageFromUrl":
+                    raise ValueError(
+                        f"Image input node {node_id} expected "
+                        "class_type='LoadImageFromUrl', "
+                        f"but found '{actual_class_type}'."
+                    )
 
-# =========================
-# Step 1. CSV Parser Test
-# =========================
-def patch_csv_parser_test_workflow(
-    workflow: dict,
-    storyboard_input_config: dict,
-) -> dict:
-    workflow = deepcopy(workflow)
+                assignments.append((node_id, input_name, value_name, _FROM_VALUE))
 
-    storyboard_input = storyboard_input_config.get(
-        "storyboard_input",
-        storyboard_input_config,
-    )
+                for flag_name in ("keep_alpha_channel", "output_mode"):
+                    if flag_name in inputs:
+                        assignments.append((node_id, flag_name, value_name, False))
 
-    csv_text = storyboard_input.get("csv_text", "")
-    shot_filter = storyboard_input.get("shot_filter", "ALL")
-    custom_shot_ids = storyboard_input.get("custom_shot_ids", "")
+            else:
+                raise ValueError(
+                    f"{plan['name']} patch plan has unknown mode: {mode}"
+                )
 
-    if not str(csv_text).strip():
-        raise ValueError(
-            "csv_text is empty. Upload a CSV file first."
-        )
+    for alias, input_name, value in plan.get("constants", ()):
+        for node_id in resolved_nodes[alias]:
+            assignments.append((node_id, input_name, None, value))
 
-    csv_parser_node_id = find_first_node_by_class_type(
-        workflow,
-        "CSVStoryboardParser",
-    )
+    return {
+        "name": plan["name"],
+        "assignments": tuple(assignments),
+        "mappings": tuple(mappings),
+    }
 
-    inputs = workflow[csv_parser_node_id].setdefault("inputs", {})
-    inputs["input_mode"] = "text"
-    inputs["csv_file"] = "CUSTOM"
-    inputs["csv_text"] = csv_text
-    inputs["shot_filter"] = shot_filter
-    inputs["custom_shot_ids"] = custom_shot_ids
 
-    seed = random.randint(1, 4_294_967_295)
-    filename_prefix = f"csv_parser_test_{seed}"
+def compile_patch_plan(workflow: dict, plan: dict) -> dict:
+    """
+    patch plan을 workflow template에 대해 검증/컴파일합니다.
+    load_workflow_template()이 반환한 workflow는 template별로 결과를 재사용합니다.
+    """
+    template_key = getattr(workflow, "template_key", None)
 
-    for node_id in find_nodes_by_class_type(workflow, "KSampler"):
-        inputs = workflow[node_id].setdefault("inputs", {})
-        if "seed" in inputs:
-            inputs["seed"] = seed
+    if template_key is None:
+        return _compile_patch_plan(workflow, plan)
 
-    for node_id, node in workflow.items():
-        if not isinstance(node, dict):
+    cache_key = (plan["name"], template_key)
+
+    with _COMPILED_PATCH_PLANS_LOCK:
+        compiled = _COMPILED_PATCH_PLANS.get(cache_key)
+
+    if compiled is None:
+        compiled = _compile_patch_plan(workflow, plan)
+
+        with _COMPILED_PATCH_PLANS_LOCK:
+            _COMPILED_PATCH_PLANS[cache_key] = compiled
+
+    return compiled
+
+
+def apply_patch_plan(
+    workflow: dict,
+    plan: dict,
+    values: dict,
+) -> WorkflowInstance:
+    """
+    컴파일된 patch plan을 workflow의 copy-on-write 복사본에 적용합니다.
+    values에 없는 value name의 field는 건너뜁니다.
+    """
+    compiled = compile_patch_plan(workflow, plan)
+    workflow = _copy_on_write(workflow)
+
+    node_inputs: dict[str, dict] = {}
+
+    def writable_inputs(node_id: str) -> dict:
+        inputs = node_inputs.get(node_id)
+        if inputs is None:
+            inputs = _writable_node(workflow, node_id)["inputs"]
+            node_inputs[node_id] = inputs
+        return inputs
+
+    for node_id, input_name, value_name, constant in compiled["assignments"]:
+        if value_name is None:
+            value = deepcopy(constant)
+        elif value_name not in values:
+            continue
+        elif constant is _FROM_VALUE:
+            value = values[value_name]
+        else:
+            value = constant
+
+        writable_inputs(node_id)[input_name] = value
+
+    for node_id, value_name, allowed_inputs in compiled["mappings"]:
+        mapping = values.get(value_name) or {}
+        patched = {
+            key: value
+            for key, value in mapping.items()
+            if key in allowed_inputs
+        }
+
+        if patched:
+            writable_inputs(node_id).update(patched)
+
+    return workflow
+
+
+def character_filter_to_name(character_filter: str) -> str:
+    if character_filter == "C1":
+        return "boy"
+    if character_filter == "C2":
+        return "girl"
+
+    return str(character_filter).lower().replace(" ", "_")
+
+
+# =========================
+# Adaptive polling
+# =========================
+class WorkflowDurationStats:
+    """
+    workflow_key(face / body / scene / camera ...)별
+    대기열 시간과 실행 시간의 지수 이동 평균(EMA)을 기록합니다.
+    """
+
+    def __init__(self, alpha: float = POLL_DURATION_EMA_ALPHA):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(
+        self,
+        workflow_key: str,
+        queue_seconds: float | None = None,
+        execution_seconds: float | None = None,
+    ) -> None:
+        if not workflow_key:
+            return
+
+        with self._lock:
+            stats = self._stats.setdefault(
+                workflow_key,
+                {"queue_seconds": None, "execution_seconds": None, "samples": 0},
+            )
+
+            for key, value in (
+                ("queue_seconds", queue_seconds),
+                ("execution_seconds", execution_seconds),
+            ):
+                if value is None:
+                    continue
+
+                previous = stats[key]
+                stats[key] = (
+                    value
+                    if previous is None
+                    else previous + self.alpha * (value - previous)
+                )
+
+            stats["samples"] += 1
+
+    def expected_execution_seconds(self, workflow_key: str) -> float | None:
+        with self._lock:
+            return self._stats.get(workflow_key, {}).get("execution_seconds")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return deepcopy(self._stats)
+
+
+_WORKFLOW_DURATION_STATS = WorkflowDurationStats()
+
+
+def get_workflow_duration_stats() -> WorkflowDurationStats:
+    return _WORKFLOW_DURATION_STATS
+
+
+def _status_eta_seconds(status_data: dict) -> float | None:
+    """
+    status 응답에 서버가 제공하는 예상 대기/완료 시간이 있으면 초 단위로 반환합니다.
+    """
+    for key in (
+        "eta_seconds",
+        "eta",
+        "estimated_seconds_remaining",
+        "estimated_time_remaining",
+        "estimated_wait_seconds",
+    ):
+        value = status_data.get(key)
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return max(0.0, float(value))
+
+    return None
+
+
+def _status_queue_position(status_data: dict) -> int | None:
+    """
+    status 응답에 queue 순번이 있으면 정수로 반환합니다.
+    """
+    for key in ("queue_position", "position", "queue_index"):
+        value = status_data.get(key)
+
+        if isinstance(value, int) and not isinstance(value, bool):
+            return max(0, value)
+
+    return None
+
+
+class AdaptivePollScheduler:
+    """
+    다음 status 요청까지의 대기 시간을 계산합니다.
+
+    - base_interval(호출한 쪽의 poll_interval)부터 2배씩 늘려 POLL_MAX_INTERVAL까지 backoff
+      (in_queue, 예상 실행 시간이 없는 in_progress, 예상 시간을 넘긴 in_progress)
+    - in_progress: 예상 실행 시간이 있으면 남은 시간의 절반만큼 대기하므로
+      처음에는 간격이 길고, 예상 완료 시점 근처에서만 POLL_MIN_INTERVAL까지 촘촘해짐
+    - 서버 ETA도 같은 방식으로 대기 간격의 기준으로, Retry-After는 최소 대기 시간으로 사용
+    """
+
+    def __init__(
+        self,
+        base_interval: float = 10,
+        expected_execution_seconds: float | None = None,
+    ):
+        self.base_interval = min(
+            max(POLL_MIN_INTERVAL, float(base_interval)),
+            POLL_MAX_INTERVAL,
+        )
+        self.expected_execution_seconds = expected_execution_seconds
+
+        self._backoff_delay = self.base_interval
+        self._in_progress_since: float | None = None
+
+    def _backoff(self) -> float:
+        delay = self._backoff_delay
+        self._backoff_delay = min(self._backoff_delay * 2, POLL_MAX_INTERVAL)
+        return delay
+
+    def next_delay(
+        self,
+        status: str,
+        status_data: dict | None = None,
+        retry_after: float | None = None,
+    ) -> float:
+        eta = _status_eta_seconds(status_data or {})
+
+        if status != "in_queue" and self._in_progress_since is None:
+            # 실행이 시작되면 queue에서 늘어난 backoff를 처음부터 다시 셉니다.
+            self._in_progress_since = time.time()
+            self._backoff_delay = self.base_interval
+
+        if status != "in_queue" and eta is None and self.expected_execution_seconds:
+            remaining = self.expected_execution_seconds - (
+                time.time() - self._in_progress_since
+            )
+            if remaining > 0:
+                eta = remaining
+
+        if eta is not None:
+            delay = min(max(eta / 2, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL)
+        else:
+            delay = self._backoff()
+
+        delay *= random.uniform(1 - POLL_JITTER_RATIO, 1 + POLL_JITTER_RATIO)
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+
+# =========================
+# Result cache
+# =========================
+def workflow_cache_key(workflow: dict) -> str:
+    """
+    patched workflow의 canonical JSON(sha256)을 cache key로 사용합니다.
+    """
+    canonical = json.dumps(
+        workflow,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# random seed 요청의 in-flight 중복 판단에서 제외하는 node 입력입니다.
+# seed가 매번 새로 뽑히고 filename_prefix에 seed가 들어가므로 이 값들만 다른 요청은 같은 요청으로 봅니다.
+COALESCE_IGNORED_INPUTS = ("seed", "noise_seed", "filename_prefix")
+
+
+def workflow_fingerprint(workflow: dict, ignore_seed: bool = False) -> str:
+    """
+    in-flight 요청 coalescing용 workflow hash입니다.
+    ignore_seed=True이면 COALESCE_IGNORED_INPUTS를 제외한 canonical JSON으로 계산합니다.
+    """
+    if not ignore_seed:
+        return workflow_cache_key(workflow)
+
+    return workflow_cache_key(
+        {
+            node_id: {
+                **node,
+                "inputs": {
+                    name: value
+                    for name, value in node.get("inputs", {}).items()
+                    if name not in COALESCE_IGNORED_INPUTS
+                },
+            }
+            if isinstance(node, dict)
+            else node
+            for node_id, node in workflow.items()
+        }
+    )
+
+
+def _resolve_seed(config: dict) -> int:
+    """
+    config["seed"]가 있으면 고정 seed로 사용하고, 없으면 random seed를 생성합니다.
+    """
+    if not _has_fixed_seed(config):
+        return random.randint(1, 4_294_967_295)
+
+    return int(config["seed"])
+
+
+def _has_fixed_seed(config: dict) -> bool:
+    return config.get("seed") not in (None, "")
+
+
+class MemoryResultStore:
+    """
+    process memory에 cache entry를 보관하는 기본 store입니다.
+    호출한 쪽이 결과의 images / label을 바꿔도 cache가 바뀌지 않도록 복사본을 주고받습니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+        return deepcopy(entry) if entry is not None else None
+
+    def put(self, key: str, entry: dict) -> None:
+        entry = deepcopy(entry)
+
+        with self._lock:
+            self._entries[key] = entry
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def touch(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["accessed_at"] = time.time()
+
+    def list_entries(self) -> list[tuple[str, float, int]]:
+        """
+        (key, last access time, size in bytes) 목록을 반환합니다.
+        """
+        with self._lock:
+            return [
+                (key, entry["accessed_at"], entry.get("size", 0))
+                for key, entry in self._entries.items()
+            ]
+
+
+class DiskResultStore:
+    """
+    directory/<key>.json 파일로 cache entry를 보관합니다.
+    파일 mtime을 마지막 접근 시각으로 사용합니다.
+    """
+
+    def __init__(self, directory: str | Path = RESULT_CACHE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        try:
+            with self._path(key).open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def touch(self, key: str) -> None:
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((path.stem, stat.st_mtime, stat.st_size))
+
+        return entries
+
+
+class ResultCache:
+    """
+    patched workflow hash -> (request, result) content-addressed cache입니다.
+
+    store는 get / put / delete / touch / list_entries를 구현하면 교체할 수 있습니다.
+    ttl_seconds가 지난 entry는 조회 시 무시하고,
+    max_entries / max_bytes를 넘으면 오래 사용하지 않은 entry부터 삭제합니다.
+    list_entries는 처음 한 번만 읽고, 이후에는 memory index로 크기 / 사용 순서를 추적합니다.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+    ):
+        self.store = store if store is not None else MemoryResultStore()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # key -> size. 앞쪽이 가장 오래 사용하지 않은 entry입니다.
+        self._index: OrderedDict[str, int] | None = None
+        self._total_bytes = 0
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        if self._index is None:
+            self._index = OrderedDict()
+            self._total_bytes = 0
+
+            for key, _accessed_at, size in sorted(
+                self.store.list_entries(),
+                key=lambda item: item[1],
+            ):
+                self._index[key] = size
+                self._total_bytes += size
+
+        return self._index
+
+    def get(self, workflow: dict) -> tuple[dict, dict] | None:
+        key = workflow_cache_key(workflow)
+        entry = self.store.get(key)
+
+        if entry is None:
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self.store.delete(key)
+
+            with self._lock:
+                index = self._load_index()
+                self._total_bytes -= index.pop(key, 0)
+
+            return None
+
+        self.store.touch(key)
+
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+
+        return entry["request"], entry["result"]
+
+    def put(self, workflow: dict, request_data: dict, result_data: dict) -> None:
+        now = time.time()
+        entry = {
+            "created_at": now,
+            "accessed_at": now,
+            "request": request_data,
+            "result": result_data,
+        }
+        entry["size"] = len(json.dumps(entry, ensure_ascii=False))
+
+        key = workflow_cache_key(workflow)
+        self.store.put(key, entry)
+
+        with self._lock:
+            index = self._load_index()
+            self._total_bytes += entry["size"] - index.pop(key, 0)
+            index[key] = entry["size"]
+
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            index = self._load_index()
+
+            while index and (
+                len(index) > self.max_entries
+                or self._total_bytes > self.max_bytes
+            ):
+                key, size = index.popitem(last=False)
+                self.store.delete(key)
+                self._total_bytes -= size
+
+
+_RESULT_CACHE: ResultCache | None = None
+
+
+def configure_result_cache(
+    store=None,
+    ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+    max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+    max_bytes: int = RESULT_CACHE_MAX_BYTES,
+) -> ResultCache:
+    """
+    결과 cache를 활성화합니다. store를 지정하지 않으면 memory store를 사용합니다.
+    """
+    global _RESULT_CACHE
+
+    _RESULT_CACHE = ResultCache(
+        store=store,
+        ttl_seconds=ttl_seconds,
+        max_entries=max_entries,
+        max_bytes=max_bytes,
+    )
+
+    return _RESULT_CACHE
+
+
+def disable_result_cache() -> None:
+    global _RESULT_CACHE
+    _RESULT_CACHE = None
+
+
+def get_result_cache() -> ResultCache | None:
+    return _RESULT_CACHE
+
+
+# =========================
+# Job ledger
+# =========================
+class JobLedger:
+    """
+    submit된 RunComfy job을 SQLite에 기록하는 durable ledger입니다.
+
+    job_id마다 request_id, status_url, result_url, workflow hash, step(workflow_key)와
+    진행 상태를 저장하고, 완료되면 result JSON 또는 error를 남깁니다.
+    server 재시작 후 unfinished()의 job을 RunComfyJobEngine.resume()으로 이어서 polling 합니다.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = JOB_LEDGER_PATH,
+        retention_seconds: float = JOB_LEDGER_RETENTION_SECONDS,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    request_id TEXT,
+                    run_id TEXT,
+                    workflow_key TEXT,
+                    deployment_id TEXT,
+                    workflow_hash TEXT,
+                    status_url TEXT,
+                    result_url TEXT,
+                    status TEXT,
+                    poll_interval REAL,
+                    timeout_seconds REAL,
+                    created_at REAL,
+                    submitted_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    result_json TEXT,
+                    error TEXT
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_request_id ON jobs (request_id)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_run_id ON jobs (run_id)"
+            )
+            # background run 하나가 여러 job(batch / pipeline / 후보)을 submit하므로
+            # run → job 목록과 run 결과를 따로 기록합니다.
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    step TEXT,
+                    status TEXT,
+                    created_at REAL,
+                    finished_at REAL,
+                    result_json TEXT,
+                    error TEXT
+                )
+                """
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_jobs (
+                    run_id TEXT,
+                    job_id TEXT,
+                    added_at REAL,
+                    PRIMARY KEY (run_id, job_id)
+                )
+                """
+            )
+
+        self.prune()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        transaction을 commit / rollback한 뒤 connection을 닫습니다.
+        sqlite3 connection의 with 문은 transaction만 끝내고 connection은 닫지 않습니다.
+        """
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(sql, params)
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self._lock, self._connect() as connection:
+            return [dict(row) for row in connection.execute(sql, params)]
+
+    def record_submission(self, job: "RunComfyJob") -> None:
+        self._execute(
+            """
+            INSERT OR REPLACE INTO jobs (
+                job_id, request_id, workflow_key, deployment_id, workflow_hash,
+                status_url, result_url, status, poll_interval, timeout_seconds,
+                created_at, submitted_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job.job_id,
+                job.request_id,
+                job.workflow_key,
+                job.deployment_id,
+                workflow_cache_key(job.workflow),
+                job.request_data.get("status_url", ""),
+                job.request_data.get("result_url", ""),
+                job.status,
+                job.poll_interval,
+                job.timeout_seconds,
+                job.created_at,
+                job.submitted_at,
+            ),
+        )
+
+    def update_status(self, job: "RunComfyJob") -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE job_id = ?",
+            (job.status, job.started_at, job.job_id),
+        )
+
+    def record_finish(
+        self,
+        job: "RunComfyJob",
+        result_data: dict | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        self._execute(
+            """
+            UPDATE jobs
+            SET status = ?, started_at = ?, finished_at = ?, result_json = ?, error = ?
+            WHERE job_id = ?
+            """,
+            (
+                job.status,
+                job.started_at,
+                job.finished_at,
+                json.dumps(result_data) if result_data is not None else None,
+                str(error) if error is not None else None,
+                job.job_id,
+            ),
+        )
+
+    def record_run_start(self, run: "BackgroundRun") -> None:
+        self._execute(
+            """
+            INSERT OR REPLACE INTO runs (run_id, step, status, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (run.run_id, run.step, run.status, run.created_at),
+        )
+
+    def record_run_finish(
+        self,
+        run: "BackgroundRun",
+        result_data: dict | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        self._execute(
+            """
+            UPDATE runs
+            SET status = ?, finished_at = ?, result_json = ?, error = ?
+            WHERE run_id = ?
+            """,
+            (
+                run.status,
+                run.finished_at,
+                json.dumps(result_data, default=str) if result_data is not None else None,
+                str(error) if error is not None else None,
+                run.run_id,
+            ),
+        )
+
+    def add_run_job(self, run_id: str, job_id: str) -> None:
+        self._execute(
+            "INSERT OR IGNORE INTO run_jobs (run_id, job_id, added_at) VALUES (?, ?, ?)",
+            (run_id, job_id, time.time()),
+        )
+
+    def get_run(self, run_id: str) -> dict | None:
+        rows = self._query("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+        return rows[0] if rows else None
+
+    def get(self, job_id: str) -> dict | None:
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def find_by_request_id(self, request_id: str) -> dict | None:
+        rows = self._query(
+            "SELECT * FROM jobs WHERE request_id = ? ORDER BY created_at DESC LIMIT 1",
+            (request_id,),
+        )
+        return rows[0] if rows else None
+
+    def find_by_run_id(self, run_id: str) -> list[dict]:
+        """
+        run이 submit한 job 목록입니다. 아직 submit 기록이 없는 job은 job_id / run_id만 있는 행입니다.
+        """
+        return self._query(
+            """
+            SELECT run_jobs.job_id AS run_job_id, jobs.*
+            FROM run_jobs LEFT JOIN jobs ON jobs.job_id = run_jobs.job_id
+            WHERE run_jobs.run_id = ?
+            ORDER BY run_jobs.added_at
+            """,
+            (run_id,),
+        )
+
+    def unfinished(self) -> list[dict]:
+        return self._query(
+            "SELECT * FROM jobs WHERE finished_at IS NULL ORDER BY created_at"
+        )
+
+    def prune(self) -> None:
+        expire_before = time.time() - self.retention_seconds
+
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (expire_before,),
+            )
+            connection.execute(
+                "DELETE FROM runs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (expire_before,),
+            )
+            connection.execute(
+                "DELETE FROM run_jobs WHERE added_at < ? AND run_id NOT IN (SELECT run_id FROM runs)",
+                (expire_before,),
+            )
+
+    @staticmethod
+    def result_of(row: dict) -> dict | None:
+        result_json = row.get("result_json")
+        return json.loads(result_json) if result_json else None
+
+
+_JOB_LEDGER: JobLedger | None = None
+
+
+def configure_job_ledger(path: str | Path = JOB_LEDGER_PATH) -> JobLedger:
+    global _JOB_LEDGER
+
+    _JOB_LEDGER = JobLedger(path)
+
+    return _JOB_LEDGER
+
+
+def disable_job_ledger() -> None:
+    global _JOB_LEDGER
+    _JOB_LEDGER = None
+
+
+def get_job_ledger() -> JobLedger | None:
+    return _JOB_LEDGER
+
+
+# =========================
+# Deployment governor
+# =========================
+_JOB_OWNER: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "runcomfy_job_owner",
+    default="",
+)
+
+
+@contextlib.contextmanager
+def job_owner(owner: str):
+    """
+    이 context 안에서 submit되는 job의 owner(session 등)를 지정합니다.
+    DeploymentGovernor는 owner 단위로 공정하게 in-flight slot을 나눠 줍니다.
+    """
+    token = _JOB_OWNER.set(str(owner or ""))
+    try:
+        yield
+    finally:
+        _JOB_OWNER.reset(token)
+
+
+class _DeploymentLane:
+    def __init__(
+        self,
+        requests_per_second: float,
+        burst: int,
+        max_in_flight: int,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.waiters: OrderedDict[str, deque] = OrderedDict()
+
+
+class DeploymentGovernor:
+    """
+    deployment_id별 token bucket rate limiter와 max in-flight governor입니다.
+
+    - throttle(): submit / status / result HTTP 호출 전에 token을 하나 소비합니다.
+    - acquire_slot() / release_slot(): submit부터 완료까지 in-flight slot을 점유합니다.
+      slot이 없으면 owner별 대기열에 들어가고, slot은 owner를 돌아가며 하나씩 배정되므로
+      한 사용자의 대량 batch가 다른 사용자의 요청을 굶기지 않습니다.
+
+    job engine event loop 안에서만 사용합니다.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = GOVERNOR_REQUESTS_PER_SECOND,
+        burst: int = GOVERNOR_BURST,
+        max_in_flight: int = GOVERNOR_MAX_IN_FLIGHT,
+    ):
+        self.defaults = {
+            "requests_per_second": requests_per_second,
+            "burst": burst,
+            "max_in_flight": max_in_flight,
+        }
+        self._overrides: dict[str, dict] = {}
+        self._lanes: dict[str, _DeploymentLane] = {}
+
+    def configure(self, deployment_id: str | None = None, **limits) -> None:
+        """
+        deployment_id가 없으면 기본값을, 있으면 해당 deployment의 상한을 변경합니다.
+        """
+        limits = {key: value for key, value in limits.items() if value is not None}
+
+        if deployment_id is None:
+            self.defaults.update(limits)
+            lanes = list(self._lanes.values())
+        else:
+            self._overrides.setdefault(deployment_id, {}).update(limits)
+            lanes = [self._lanes[deployment_id]] if deployment_id in self._lanes else []
+
+        for lane in lanes:
+            for key, value in limits.items():
+                setattr(lane, key, value)
+            self._grant(lane)
+
+    def _lane(self, deployment_id: str) -> _DeploymentLane:
+        lane = self._lanes.get(deployment_id)
+
+        if lane is None:
+            lane = _DeploymentLane(
+                **{**self.defaults, **self._overrides.get(deployment_id, {})}
+            )
+            self._lanes[deployment_id] = lane
+
+        return lane
+
+    async def throttle(self, deployment_id: str) -> None:
+        lane = self._lane(deployment_id)
+
+        while True:
+            now = time.monotonic()
+            lane.tokens = min(
+                float(lane.burst),
+                lane.tokens + (now - lane.refilled_at) * lane.requests_per_second,
+            )
+            lane.refilled_at = now
+
+            if lane.tokens >= 1.0:
+                lane.tokens -= 1.0
+                return
+
+            await asyncio.sleep((1.0 - lane.tokens) / lane.requests_per_second)
+
+    async def acquire_slot(self, deployment_id: str, owner: str = "") -> None:
+        lane = self._lane(deployment_id)
+
+        if lane.in_flight < lane.max_in_flight and not lane.waiters:
+            lane.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiters.setdefault(owner, deque()).append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release_slot(deployment_id)
+            raise
+
+    def release_slot(self, deployment_id: str) -> None:
+        lane = self._lane(deployment_id)
+        lane.in_flight = max(0, lane.in_flight - 1)
+        self._grant(lane)
+
+    def has_free_slot(self, deployment_id: str) -> bool:
+        lane = self._lane(deployment_id)
+        return lane.in_flight < lane.max_in_flight and not lane.waiters
+
+    def queued(self, deployment_id: str) -> int:
+        lane = self._lanes.get(deployment_id)
+        if lane is None:
+            return 0
+
+        return sum(len(waiters) for waiters in lane.waiters.values())
+
+    def in_flight(self, deployment_id: str) -> int:
+        lane = self._lanes.get(deployment_id)
+        return lane.in_flight if lane is not None else 0
+
+    def load(self, deployment_id: str) -> tuple[int, int]:
+        """
+        (in-flight + 대기 중인 job 수, max_in_flight)를 반환합니다.
+        조회만 하므로 아직 사용하지 않은 deployment의 lane을 만들지 않습니다.
+        """
+        lane = self._lanes.get(deployment_id)
+
+        if lane is None:
+            limits = {**self.defaults, **self._overrides.get(deployment_id, {})}
+            return 0, int(limits["max_in_flight"])
+
+        return self.in_flight(deployment_id) + self.queued(deployment_id), lane.max_in_flight
+
+    @staticmethod
+    def _grant(lane: _DeploymentLane) -> None:
+        while lane.waiters and lane.in_flight < lane.max_in_flight:
+            owner, waiters = lane.waiters.popitem(last=False)
+            waiter = waiters.popleft()
+
+            if waiters:
+                lane.waiters[owner] = waiters
+
+            if waiter.cancelled():
+                continue
+
+            lane.in_flight += 1
+            waiter.set_result(None)
+
+
+# =========================
+# Deployment routing
+# =========================
+def _is_failover_error(error: BaseException) -> bool:
+    """
+    submit 오류 중 RunComfy가 요청을 받지 않은 것이 확실한 경우만 True입니다.
+    read timeout처럼 요청이 접수됐을 수 있는 오류에서 failover하면 같은 job이 두 번 실행될 수 있습니다.
+    """
+    if isinstance(error, RunComfyHTTPError):
+        return error.status_code in ROUTER_FAILOVER_STATUSES
+
+    return isinstance(error, requests.ConnectionError)
+
+
+class DeploymentRouter:
+    """
+    workflow_key(face / body / scene / camera ...)별로 submit할 deployment 후보를 관리합니다.
+
+    - routes에 없는 workflow_key는 호출한 쪽이 넘긴 deployment_id를 그대로 사용합니다.
+    - 후보가 여럿이면 (governor의 in-flight + 로컬 대기 job 수 + 1) / max_in_flight에
+      deployment별 평균 소요 시간(queue + 실행 EMA)을 곱한 예상 대기 시간이 가장 짧은 곳을 고릅니다.
+    - submit 오류가 난 deployment는 연속 실패 횟수에 따라 늘어나는 cooldown 동안 후보에서 빠집니다.
+      모든 후보가 cooldown 중이면 가장 먼저 풀리는 deployment를 사용합니다.
+
+    job engine event loop 안에서만 사용합니다.
+    """
+
+    def __init__(self):
+        self._routes: dict[str, list[str]] = {}
+        self._failures: dict[str, int] = {}
+        self._cooldown_until: dict[str, float] = {}
+
+    def configure(self, routes: dict[str, list[str] | str] | None) -> None:
+        self._routes = {}
+
+        for workflow_key, deployment_ids in (routes or {}).items():
+            if isinstance(deployment_ids, str):
+                deployment_ids = deployment_ids.split(",")
+
+            deployment_ids = [
+                str(item).strip() for item in deployment_ids if str(item).strip()
+            ]
+            if deployment_ids:
+                self._routes[str(workflow_key)] = deployment_ids
+
+    def routes(self) -> dict[str, list[str]]:
+        return deepcopy(self._routes)
+
+    def candidates(self, workflow_key: str, deployment_id: str) -> list[str]:
+        return list(self._routes.get(workflow_key) or [deployment_id])
+
+    @staticmethod
+    def stats_key(workflow_key: str, deployment_id: str) -> str:
+        return f"{workflow_key}@{deployment_id}"
+
+    def _expected_seconds(self, workflow_key: str, deployment_id: str) -> float:
+        snapshot = get_workflow_duration_stats().snapshot()
+
+        # 아직 기록이 없는 deployment는 workflow 전체 평균으로 추정해 한 번은 시도되게 합니다.
+        for key in (self.stats_key(workflow_key, deployment_id), workflow_key):
+            stats = snapshot.get(key) or {}
+            seconds = (stats.get("queue_seconds") or 0.0) + (
+                stats.get("execution_seconds") or 0.0
+            )
+            if seconds > 0:
+                return seconds
+
+        return 1.0
+
+    def choose(
+        self,
+        workflow_key: str,
+        deployment_id: str,
+        governor: DeploymentGovernor,
+        exclude: tuple[str, ...] = (),
+    ) -> str | None:
+        """
+        exclude를 뺀 후보 중 예상 대기 시간이 가장 짧은 deployment를 반환합니다.
+        남은 후보가 없으면 None입니다.
+        """
+        candidates = [
+            candidate
+            for candidate in self.candidates(workflow_key, deployment_id)
+            if candidate not in exclude
+        ]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [
+            candidate
+            for candidate in candidates
+            if self._cooldown_until.get(candidate, 0.0) <= now
+        ]
+        if not healthy:
+            return min(candidates, key=lambda item: self._cooldown_until[item])
+
+        def expected_wait(candidate: str) -> float:
+            load, max_in_flight = governor.load(candidate)
+            return (load + 1) / max(1, max_in_flight) * self._expected_seconds(
+                workflow_key, candidate
+            )
+
+        return min(healthy, key=expected_wait)
+
+    def record_success(self, deployment_id: str) -> None:
+        self._failures.pop(deployment_id, None)
+        self._cooldown_until.pop(deployment_id, None)
+
+    def record_failure(self, deployment_id: str) -> None:
+        failures = self._failures.get(deployment_id, 0) + 1
+        self._failures[deployment_id] = failures
+        self._cooldown_until[deployment_id] = time.monotonic() + min(
+            ROUTER_MAX_COOLDOWN_SECONDS,
+            ROUTER_FAILURE_COOLDOWN_SECONDS * 2 ** (failures - 1),
+        )
+
+
+# =========================
+# Cancellation
+# =========================
+class CancelScope:
+    """
+    이 scope 안에서 submit된 job을 모아 두었다가 cancel()로 한 번에 취소합니다.
+    cancel() 이후 scope 안에서 새로 submit하면 RunComfyCancelledError가 발생하므로
+    후보 / pipeline stage / batch처럼 여러 job으로 나뉜 실행도 남은 job 없이 멈춥니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: list = []
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled:
+            raise RunComfyCancelledError("RunComfy run was cancelled.")
+
+    def track(self, job) -> None:
+        with self._lock:
+            self._jobs.append(job)
+            cancelled = self._cancelled
+
+        if cancelled:
+            cancel_job(job)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            jobs = list(self._jobs)
+
+        get_job_engine().cancel_many(jobs)
+
+
+_CANCEL_SCOPE: contextvars.ContextVar[CancelScope | None] = contextvars.ContextVar(
+    "runcomfy_cancel_scope",
+    default=None,
+)
+
+# BackgroundRunRegistry가 실행 중인 run_id입니다. submit한 job을 JobLedger의 run 기록에 연결합니다.
+_BACKGROUND_RUN_ID: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "runcomfy_background_run_id",
+    default="",
+)
+
+
+@contextlib.contextmanager
+def cancel_scope(scope: CancelScope | None = None):
+    """
+    이 context 안에서 submit되는 job을 scope에 등록합니다. scope가 없으면 새로 만듭니다.
+    """
+    scope = scope or CancelScope()
+    token = _CANCEL_SCOPE.set(scope)
+    try:
+        yield scope
+    finally:
+        _CANCEL_SCOPE.reset(token)
+
+
+# =========================
+# Async job engine
+# =========================
+class _ProgressEventLog:
+    """
+    RunComfyJob / BackgroundRun이 공유하는 progress event 기록입니다.
+    subclass는 self._future를 가지고 있어야 합니다.
+    """
+
+    def _init_progress_events(self) -> None:
+        self._events: list[dict] = []
+        self._events_condition = threading.Condition()
+        self._progress_listeners: list = []
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def events(self) -> list[dict]:
+        with self._events_condition:
+            return list(self._events)
+
+    def add_progress_listener(self, listener) -> None:
+        """
+        listener(event)는 event를 발생시킨 thread에서 호출됩니다.
+        이미 발생한 event도 등록 시점에 순서대로 전달합니다.
+        """
+        with self._events_condition:
+            past_events = list(self._events)
+            self._progress_listeners.append(listener)
+
+        for event in past_events:
+            listener(event)
+
+    def iter_events(self, timeout: float | None = None):
+        """
+        끝날 때까지 progress event를 호출한 thread에서 순서대로 yield 합니다.
+        timeout초 동안 새 event가 없으면 TimeoutError를 발생시킵니다.
+        """
+        index = 0
+
+        while True:
+            with self._events_condition:
+                if index >= len(self._events) and not self.done():
+                    notified = self._events_condition.wait_for(
+                        lambda: index < len(self._events) or self.done(),
+                        timeout=timeout,
+                    )
+                    if not notified:
+                        raise TimeoutError("No RunComfy progress event received.")
+
+                new_events = self._events[index:]
+                finished = self.done()
+
+            for event in new_events:
+                yield event
+            index += len(new_events)
+
+            if finished and not new_events:
+                return
+
+    def _append_event(self, event: dict) -> None:
+        with self._events_condition:
+            self._events.append(event)
+            listeners = list(self._progress_listeners)
+            self._events_condition.notify_all()
+
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                pass
+
+    def _notify_finished(self) -> None:
+        with self._events_condition:
+            self._events_condition.notify_all()
+
+
+class RunComfyJob(_ProgressEventLog):
+    """
+    RunComfyJobEngine.submit()이 즉시 반환하는 job handle입니다.
+
+    - async 코드: await job.result()
+    - sync 코드: job.wait()
+    - callback: job.add_done_callback(lambda job: ...)
+    - 진행 상황: for event in job.iter_events(): ...
+
+    request_data에는 submit 응답(request_id, status_url, result_url)이
+    submit 완료 후 채워집니다.
+
+    progress event는 dict이며 type은 waiting / submitting / submitted / failover /
+    status / completed / failed / cancelled 중 하나입니다. queue_seconds, execution_seconds로
+    workflow별 queue 대기 시간과 실행 시간을 구분해서 볼 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        deployment_id: str,
+        workflow: dict,
+        poll_interval: int = 10,
+        timeout_seconds: int = 1800,
+        workflow_key: str = "",
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.api_key = api_key
+        self.deployment_id = deployment_id
+        self.workflow = workflow
+        self.poll_interval = poll_interval
+        self.timeout_seconds = timeout_seconds
+        self.workflow_key = workflow_key
+        self.owner = _JOB_OWNER.get()
+        self.coalesce_key = ""
+        self.coalesced_count = 0
+        self.waiter_count = 0
+
+        self.request_data: dict = {}
+        self.status = "pending"
+        self.created_at = time.time()
+        self.submitted_at: float | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        # timeout_seconds를 세기 시작한 시각입니다. resume된 job은 resume 시각부터 다시 셉니다.
+        self.timeout_started_at: float | None = None
+        self.resumed = False
+
+        self._future: concurrent.futures.Future = concurrent.futures.Future()
+        self._task: asyncio.Task | None = None
+        self._cancel_requested = False
+        self._init_progress_events()
+
+    @property
+    def request_id(self) -> str:
+        return str(self.request_data.get("request_id", ""))
+
+    def add_done_callback(self, callback) -> None:
+        self._future.add_done_callback(lambda _future: callback(self))
+
+    async def result(self) -> dict:
+        return await asyncio.wrap_future(self._future)
+
+    def wait(self, timeout: float | None = None) -> dict:
+        return self._future.result(timeout=timeout)
+
+    @property
+    def future(self) -> concurrent.futures.Future:
+        return self._future
+
+    @property
+    def queue_seconds(self) -> float | None:
+        if self.submitted_at is None:
+            return None
+
+        return (self.started_at or self.finished_at or time.time()) - self.submitted_at
+
+    @property
+    def execution_seconds(self) -> float | None:
+        if self.started_at is None:
+            return None
+
+        return (self.finished_at or time.time()) - self.started_at
+
+    def _emit(self, event_type: str, **fields) -> dict:
+        now = time.time()
+        event = {
+            "type": event_type,
+            "job_id": self.job_id,
+            "request_id": self.request_id,
+            "workflow_key": self.workflow_key,
+            "deployment_id": self.deployment_id,
+            "status": self.status,
+            "time": now,
+            "elapsed_seconds": now - self.created_at,
+            "queue_seconds": self.queue_seconds,
+            "execution_seconds": self.execution_seconds,
+            **fields,
+        }
+
+        self._append_event(event)
+
+        return event
+
+    def _finish(
+        self,
+        result_data: dict | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        self.finished_at = time.time()
+
+        if isinstance(error, RunComfyCancelledError):
+            self.status = "cancelled"
+            self._emit("cancelled", error=str(error))
+            self._future.set_exception(error)
+        elif error is not None:
+            self.status = "failed"
+            self._emit("failed", error=str(error))
+            self._future.set_exception(error)
+        else:
+            self.status = "completed"
+            self._emit("completed", images=extract_output_images(result_data or {}))
+            self._future.set_result(result_data)
+
+        self._notify_finished()
+
+
+class RunComfyJobWaiter(_ProgressEventLog):
+    """
+    coalescing된 RunComfyJob을 기다리는 호출자 하나의 handle입니다.
+
+    같은 요청을 여러 session / rerun이 함께 기다리더라도 cancel은 그 호출자의 waiter만 떼어 내고,
+    마지막 waiter가 떠날 때만 공유 job(RunComfy request)을 취소합니다.
+    wait() / result() / iter_events()는 RunComfyJob과 같고, 나머지 속성은 공유 job 값을 읽습니다.
+    """
+
+    def __init__(self, job: RunComfyJob):
+        self.job = job
+        self.waiter_id = uuid.uuid4().hex
+        self.owner = _JOB_OWNER.get()
+        self.detached = False
+        self.left = False
+
+        self._future: concurrent.futures.Future = concurrent.futures.Future()
+        self._init_progress_events()
+
+        job.add_progress_listener(self._forward_event)
+        job.add_done_callback(self._forward_result)
+
+    def __getattr__(self, name):
+        return getattr(self.job, name)
+
+    @property
+    def status(self) -> str:
+        return "cancelled" if self.detached else self.job.status
+
+    def add_done_callback(self, callback) -> None:
+        self._future.add_done_callback(lambda _future: callback(self))
+
+    async def result(self) -> dict:
+        return await asyncio.wrap_future(self._future)
+
+    def wait(self, timeout: float | None = None) -> dict:
+        return self._future.result(timeout=timeout)
+
+    @property
+    def future(self) -> concurrent.futures.Future:
+        return self._future
+
+    def _forward_event(self, event: dict) -> None:
+        if not self.detached:
+            self._append_event(event)
+
+    def _forward_result(self, job: RunComfyJob) -> None:
+        if self.detached or self._future.done():
+            return
+
+        error = job.future.exception()
+        if error is not None:
+            self._future.set_exception(error)
+        else:
+            self._future.set_result(job.future.result())
+
+        self._notify_finished()
+
+    def _detach(self) -> None:
+        """
+        공유 job은 그대로 두고 이 waiter만 RunComfyCancelledError로 끝냅니다.
+        """
+        self.detached = True
+        error = RunComfyCancelledError(
+            "RunComfy job was cancelled for this caller; "
+            "other callers waiting on the same request keep running."
+        )
+        self._append_event(
+            {
+                "type": "cancelled",
+                "job_id": self.job.job_id,
+                "request_id": self.job.request_id,
+                "workflow_key": self.job.workflow_key,
+                "deployment_id": self.job.deployment_id,
+                "status": "cancelled",
+                "time": time.time(),
+                "error": str(error),
+            }
+        )
+        self._future.set_exception(error)
+        self._notify_finished()
+
+
+class RunComfyJobEngine:
+    """
+    하나의 background event loop에서 모든 RunComfy job을 submit/poll 합니다.
+
+    polling 대기는 asyncio.sleep으로 처리하므로 in-flight job마다
+    thread를 점유하지 않습니다. HTTP 호출만 JOB_ENGINE_HTTP_WORKERS 크기의
+    executor에서 실행됩니다.
+    """
+
+    def __init__(self, http_workers: int = JOB_ENGINE_HTTP_WORKERS):
+        self.http_workers = http_workers
+
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._jobs: dict[str, RunComfyJob] = {}
+        self._in_flight: dict[str, RunComfyJob] = {}
+        self.governor = DeploymentGovernor()
+        self.router = DeploymentRouter()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(
+                    concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.http_workers,
+                        thread_name_prefix="runcomfy-http",
+                    )
+                )
+
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="runcomfy-job-engine",
+                    daemon=True,
+                )
+                thread.start()
+
+                self._loop = loop
+                self._thread = thread
+
+            return self._loop
+
+    def submit(
+        self,
+        api_key: str,
+        deployment_id: str,
+        workflow: dict,
+        poll_interval: int = 10,
+        timeout_seconds: int = 1800,
+        workflow_key: str = "",
+        coalesce_key: str = "",
+    ) -> "RunComfyJob | RunComfyJobWaiter":
+        """
+        coalesce_key가 있으면 RunComfyJobWaiter를 반환하며, 같은 key의 job이 아직 진행 중이면
+        새로 submit하지 않고 그 job을 기다리는 waiter를 만듭니다.
+        cancel_scope() 안에서 호출하면 반환하는 handle을 그 scope에 등록합니다.
+        """
+        scope = _CANCEL_SCOPE.get()
+        if scope is not None:
+            scope.raise_if_cancelled()
+
+        job = self._submit_job(
+            api_key=api_key,
+            deployment_id=deployment_id,
+            workflow=workflow,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+            workflow_key=workflow_key,
+            coalesce_key=coalesce_key,
+        )
+
+        if scope is not None:
+            scope.track(job)
+
+        run_id = _BACKGROUND_RUN_ID.get()
+        ledger = get_job_ledger()
+        if run_id and ledger is not None:
+            try:
+                ledger.add_run_job(run_id, job.job_id)
+            except sqlite3.Error:
+                pass
+
+        return job
+
+    def _submit_job(
+        self,
+        api_key: str,
+        deployment_id: str,
+        workflow: dict,
+        poll_interval: int,
+        timeout_seconds: int,
+        workflow_key: str,
+        coalesce_key: str,
+    ) -> "RunComfyJob | RunComfyJobWaiter":
+        job = RunComfyJob(
+            api_key=api_key,
+            deployment_id=deployment_id,
+            workflow=workflow,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+            workflow_key=workflow_key,
+        )
+        job.coalesce_key = coalesce_key
+
+        with self._lock:
+            if coalesce_key:
+                in_flight = self._in_flight.get(coalesce_key)
+                if in_flight is not None and not in_flight.done():
+                    in_flight.coalesced_count += 1
+                    in_flight.waiter_count += 1
+                    return RunComfyJobWaiter(in_flight)
+
+                self._in_flight[coalesce_key] = job
+                job.add_done_callback(self._release_coalesce_key)
+                job.waiter_count = 1
+
+            self._prune_jobs()
+            self._jobs[job.job_id] = job
+
+        asyncio.run_coroutine_threadsafe(
+            self._drive(job),
+            self._ensure_loop(),
+        )
+
+        return RunComfyJobWaiter(job) if coalesce_key else job
+
+    def cancel(self, job: "RunComfyJob | RunComfyJobWaiter") -> bool:
+        """
+        job을 취소합니다. 이미 submit된 job은 RunComfy cancel endpoint도 호출하며,
+        job.wait() 등으로 기다리던 쪽은 RunComfyCancelledError를 받습니다.
+        coalescing된 job의 waiter는 그 waiter만 떼어 내고, 마지막 waiter일 때만 job을 취소합니다.
+        이미 끝난 job이면 False를 반환합니다.
+        """
+        return self.cancel_many([job]) > 0
+
+    def cancel_many(self, jobs: list) -> int:
+        """
+        여러 job을 event loop의 한 callback에서 함께 취소합니다.
+        따로 취소하면 먼저 취소된 job이 반납한 slot을 대기 중인 job이 받아 submit할 수 있습니다.
+        취소를 요청한 job(waiter 포함) 수를 반환합니다.
+        """
+        jobs = [job for job in jobs if not job.done()]
+        cancelled_jobs = []
+
+        for job in jobs:
+            if isinstance(job, RunComfyJobWaiter):
+                job = self._leave(job)
+                if job is None:
+                    continue
+
+            if job not in cancelled_jobs:
+                cancelled_jobs.append(job)
+
+        if cancelled_jobs:
+            self._ensure_loop().call_soon_threadsafe(self._cancel_on_loop, cancelled_jobs)
+
+        return len(jobs)
+
+    def _leave(self, waiter: RunComfyJobWaiter) -> RunComfyJob | None:
+        """
+        waiter 하나를 공유 job에서 뗍니다. 마지막 waiter였으면 취소할 job을 반환합니다.
+        마지막 waiter는 job의 취소 결과(remote cancel 포함)를 그대로 받도록 떼어 내지 않습니다.
+        """
+        job = waiter.job
+
+        with self._lock:
+            if waiter.left:
+                return None
+
+            waiter.left = True
+            job.waiter_count -= 1
+
+            if job.waiter_count <= 0:
+                # 취소 중인 job에 새 요청이 합류하지 않게 합니다.
+                if self._in_flight.get(job.coalesce_key) is job:
+                    del self._in_flight[job.coalesce_key]
+                return job
+
+        waiter._detach()
+
+        return None
+
+    @staticmethod
+    def _cancel_on_loop(jobs: list[RunComfyJob]) -> None:
+        for job in jobs:
+            # 이미 취소 중이거나 끝난 job의 task는 remote cancel / ledger 기록 중이므로 건드리지 않습니다.
+            if job._cancel_requested or job.finished_at is not None:
+                continue
+
+            job._cancel_requested = True
+
+            # 아직 _drive가 시작되지 않았으면 시작할 때 _cancel_requested를 보고 멈춥니다.
+            if job._task is not None and not job._task.done():
+                job._task.cancel()
+
+    def _release_coalesce_key(self, job: RunComfyJob) -> None:
+        with self._lock:
+            if self._in_flight.get(job.coalesce_key) is job:
+                del self._in_flight[job.coalesce_key]
+
+    def get(self, job_id: str) -> RunComfyJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[RunComfyJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune_jobs(self) -> None:
+        expire_before = time.time() - JOB_RETENTION_SECONDS
+
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < expire_before:
+                del self._jobs[job_id]
+
+    def resume(self, api_key: str, ledger_row: dict) -> RunComfyJob:
+        """
+        JobLedger에 남은 미완료 job의 polling을 같은 job_id로 이어갑니다.
+        이미 submit된 job이므로 다시 POST 하지 않고 저장된 status_url/result_url을 사용합니다.
+        """
+        with self._lock:
+            existing = self._jobs.get(ledger_row["job_id"])
+            if existing is not None:
+                return existing
+
+        job = RunComfyJob(
+            api_key=api_key,
+            deployment_id=ledger_row.get("deployment_id") or "",
+            workflow={},
+            poll_interval=ledger_row.get("poll_interval") or 10,
+            timeout_seconds=ledger_row.get("timeout_seconds") or 1800,
+            workflow_key=ledger_row.get("workflow_key") or "",
+        )
+        job.job_id = ledger_row["job_id"]
+        job.request_data = {
+            "request_id": ledger_row.get("request_id") or "",
+            "status_url": ledger_row.get("status_url") or "",
+            "result_url": ledger_row.get("result_url") or "",
+        }
+        job.status = ledger_row.get("status") or "in_queue"
+        job.created_at = ledger_row.get("created_at") or job.created_at
+        job.submitted_at = ledger_row.get("submitted_at") or time.time()
+        job.started_at = ledger_row.get("started_at")
+        # server가 꺼져 있던 시간은 timeout에 넣지 않습니다. 그동안 끝난 결과도 받아야 합니다.
+        job.timeout_started_at = time.time()
+        job.resumed = True
+
+        with self._lock:
+            self._prune_jobs()
+            self._jobs[job.job_id] = job
+
+        asyncio.run_coroutine_threadsafe(
+            self._drive(job),
+            self._ensure_loop(),
+        )
+
+        return job
+
+    async def _drive(self, job: RunComfyJob) -> None:
+        job._task = asyncio.current_task()
+
+        try:
+            if job._cancel_requested:
+                raise asyncio.CancelledError()
+
+            result_data = await self._execute(job)
+        except asyncio.CancelledError:
+            error = await self._cancel_remote(job)
+            job._finish(error=error)
+            await self._record_finish(job, error=error)
+        except Exception as e:
+            job._finish(error=e)
+            await self._record_finish(job, error=e)
+        else:
+            job._finish(result_data=result_data)
+            await self._record_finish(job, result_data=result_data)
+
+    async def _cancel_remote(self, job: RunComfyJob) -> RunComfyCancelledError:
+        """
+        submit된 job이면 RunComfy에도 취소를 요청합니다.
+        취소 요청이 실패해도 로컬 대기는 끝내고, 실패 내용은 error message에 남깁니다.
+        """
+        if not job.request_data.get("status_url"):
+            return RunComfyCancelledError("RunComfy job was cancelled before submit.")
+
+        try:
+            await self.governor.throttle(job.deployment_id)
+            await asyncio.to_thread(
+                cancel_runcomfy_request,
+                job.api_key,
+                job.request_data,
+            )
+        except Exception as e:
+            return RunComfyCancelledError(
+                f"RunComfy job was cancelled locally, but remote cancel failed: {e}"
+            )
+
+        return RunComfyCancelledError("RunComfy job was cancelled.")
+
+    @staticmethod
+    async def _record_ledger(method_name: str, job: RunComfyJob, **kwargs) -> None:
+        ledger = get_job_ledger()
+        if ledger is None:
+            return
+
+        try:
+            await asyncio.to_thread(getattr(ledger, method_name), job, **kwargs)
+        except sqlite3.Error:
+            # ledger 기록 실패가 GPU job 결과 수신을 막지 않도록 무시합니다.
+            pass
+
+    async def _record_finish(self, job: RunComfyJob, **kwargs) -> None:
+        """
+        끝난 job의 ledger 기록은 task가 cancel되어도 끝까지 씁니다.
+        기록이 빠지면 다음 restart에서 이미 끝난 job을 다시 resume합니다.
+        """
+        write = asyncio.ensure_future(self._record_ledger("record_finish", job, **kwargs))
+
+        while not write.done():
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                continue
+
+    async def _submit(self, job: RunComfyJob) -> None:
+        job.status = "submitting"
+        job._emit("submitting")
+
+        await self.governor.throttle(job.deployment_id)
+        submit_future = asyncio.ensure_future(
+            asyncio.to_thread(
+                submit_runcomfy_dynamic_workflow,
+                api_key=job.api_key,
+                deployment_id=job.deployment_id,
+                workflow_api_json=job.workflow,
+            )
+        )
+
+        try:
+            request_data = await asyncio.shield(submit_future)
+        except asyncio.CancelledError:
+            # POST는 중간에 멈출 수 없으므로 응답을 받아 두어야 remote job도 취소할 수 있습니다.
+            with contextlib.suppress(Exception):
+                job.request_data = await submit_future
+            raise
+
+        if not request_data.get("status_url") or not request_data.get("result_url"):
+            raise RuntimeError(
+                "RunComfy response does not include status/result URL: "
+                f"{request_data}"
+            )
+
+        job.request_data = request_data
+        job.submitted_at = time.time()
+        job.timeout_started_at = job.submitted_at
+        job.status = "in_queue"
+        await self._record_ledger("record_submission", job)
+        job._emit("submitted")
+
+    async def _execute(self, job: RunComfyJob) -> dict:
+        # resume된 job은 이미 RunComfy에 submit되어 있으므로 slot 없이 polling만 이어갑니다.
+        if job.request_data:
+            return await self._poll(job)
+
+        requested_deployment_id = job.deployment_id
+        failed_deployment_ids: tuple[str, ...] = ()
+
+        while True:
+            job.deployment_id = self.router.choose(
+                job.workflow_key,
+                requested_deployment_id,
+                self.governor,
+                exclude=failed_deployment_ids,
+            )
+
+            if not self.governor.has_free_slot(job.deployment_id):
+                job.status = "waiting"
+                job._emit(
+                    "waiting",
+                    local_queue_position=self.governor.queued(job.deployment_id) + 1,
+                )
+
+            await self.governor.acquire_slot(job.deployment_id, job.owner)
+
+            try:
+                try:
+                    await self._submit(job)
+                except Exception as e:
+                    if not _is_failover_error(e):
+                        raise
+
+                    self.router.record_failure(job.deployment_id)
+                    failed_deployment_ids += (job.deployment_id,)
+
+                    if self.router.choose(
+                        job.workflow_key,
+                        requested_deployment_id,
+                        self.governor,
+                        exclude=failed_deployment_ids,
+                    ) is None:
+                        raise
+
+                    job._emit("failover", error=str(e))
+                    continue
+
+                self.router.record_success(job.deployment_id)
+
+                try:
+                    return await self._poll(job)
+                except Exception as e:
+                    # 이미 접수된 job은 다시 submit하지 않고, 이후 routing에서만 피합니다.
+                    if _is_failover_error(e):
+                        self.router.record_failure(job.deployment_id)
+                    raise
+            finally:
+                self.governor.release_slot(job.deployment_id)
+
+    async def _poll(self, job: RunComfyJob) -> dict:
+        status_url = job.request_data["status_url"]
+        result_url = job.request_data["result_url"]
+
+        duration_stats = get_workflow_duration_stats()
+        scheduler = AdaptivePollScheduler(
+            base_interval=job.poll_interval,
+            expected_execution_seconds=(
+                duration_stats.expected_execution_seconds(job.workflow_key)
+            ),
+        )
+
+        while True:
+            await self.governor.throttle(job.deployment_id)
+            status_data, retry_after = await asyncio.to_thread(
+                _fetch_runcomfy_status,
+                job.api_key,
+                status_url,
+            )
+            previous_status = job.status
+            job.status = _check_runcomfy_status(status_data)
+
+            if job.status != "in_queue" and job.started_at is None:
+                job.started_at = time.time()
+
+            if job.status != previous_status:
+                await self._record_ledger("update_status", job)
+
+            partial_images = (
+                extract_output_images(status_data)
+                if status_data.get("outputs")
+                else []
+            )
+            job._emit(
+                "status",
+                queue_position=_status_queue_position(status_data),
+                eta_seconds=_status_eta_seconds(status_data),
+                images=partial_images,
+            )
+
+            if job.status == "completed":
+                completed_at = time.time()
+                # resume된 job의 시간에는 server가 꺼져 있던 시간이 섞여 있으므로 기록하지 않습니다.
+                stats_keys = () if job.resumed else (
+                    job.workflow_key,
+                    DeploymentRouter.stats_key(job.workflow_key, job.deployment_id),
+                )
+                for stats_key in stats_keys:
+                    duration_stats.record(
+                        stats_key,
+                        queue_seconds=job.started_at - job.submitted_at,
+                        execution_seconds=completed_at - job.started_at,
+                    )
+                break
+
+            # timeout은 status를 한 번 이상 확인한 뒤에 적용합니다.
+            elapsed = time.time() - (job.timeout_started_at or job.submitted_at)
+
+            if elapsed > job.timeout_seconds:
+                raise TimeoutError("RunComfy request timed out.")
+
+            delay = scheduler.next_delay(job.status, status_data, retry_after)
+            await asyncio.sleep(
+                max(0.0, min(delay, job.timeout_seconds - elapsed))
+            )
+
+        await self.governor.throttle(job.deployment_id)
+        return await asyncio.to_thread(
+            get_runcomfy_result,
+            job.api_key,
+            result_url,
+        )
+
+
+_JOB_ENGINE: RunComfyJobEngine | None = None
+_JOB_ENGINE_LOCK = threading.Lock()
+
+
+def get_job_engine() -> RunComfyJobEngine:
+    global _JOB_ENGINE
+
+    with _JOB_ENGINE_LOCK:
+        if _JOB_ENGINE is None:
+            _JOB_ENGINE = RunComfyJobEngine()
+
+        return _JOB_ENGINE
+
+
+def configure_deployment_governor(
+    deployment_id: str | None = None,
+    requests_per_second: float | None = None,
+    burst: int | None = None,
+    max_in_flight: int | None = None,
+) -> None:
+    """
+    deployment_id별(없으면 기본값) rate limit과 in-flight 상한을 변경합니다.
+    governor는 job engine event loop에서 동작하므로 변경도 loop thread에서 적용합니다.
+    """
+    engine = get_job_engine()
+    engine._ensure_loop().call_soon_threadsafe(
+        lambda: engine.governor.configure(
+            deployment_id,
+            requests_per_second=requests_per_second,
+            burst=burst,
+            max_in_flight=max_in_flight,
+        )
+    )
+
+
+def cancel_job(job: RunComfyJob) -> bool:
+    """
+    RunComfyJobEngine.cancel()의 module 단위 진입점입니다.
+    """
+    return get_job_engine().cancel(job)
+
+
+def configure_deployment_routes(routes: dict[str, list[str] | str] | None) -> None:
+    """
+    workflow_key별 deployment 후보 목록을 설정합니다.
+    예: {"scene": ["scene-a", "scene-b"], "face": "face-a"} (문자열은 쉼표로 구분)
+    routes에 없는 workflow_key는 각 run 함수에 넘긴 deployment_id를 사용합니다.
+    """
+    engine = get_job_engine()
+    engine._ensure_loop().call_soon_threadsafe(engine.router.configure, routes)
+
+
+def resume_unfinished_jobs(api_key: str) -> list[RunComfyJob]:
+    """
+    server 시작 시 호출합니다. JobLedger에 남은 미완료 job의 polling을 재개하고
+    결과를 받으면 ledger에 기록합니다.
+    """
+    ledger = get_job_ledger()
+    if ledger is None:
+        return []
+
+    engine = get_job_engine()
+
+    return [
+        engine.resume(api_key, row)
+        for row in ledger.unfinished()
+        if row.get("status_url") and row.get("result_url")
+    ]
+
+
+def _run_workflow(
+    api_key: str,
+    deployment_id: str,
+    workflow: dict,
+    poll_interval: int,
+    timeout_seconds: int,
+    workflow_key: str = "",
+    cacheable: bool = False,
+    on_progress=None,
+) -> tuple[dict, dict]:
+    """
+    on_progress가 있으면 job의 progress event를 호출한 thread에서 순서대로 전달합니다.
+    Streamlit element 갱신처럼 script thread에서만 가능한 작업을 callback에서 할 수 있습니다.
+    """
+    result_cache = get_result_cache() if cacheable else None
+
+    if result_cache is not None:
+        cached = result_cache.get(workflow)
+        if cached is not None:
+            if on_progress is not None:
+                on_progress(
+                    {
+                        "type": "cached",
+                        "workflow_key": workflow_key,
+                        "status": "completed",
+                        "request_id": str(cached[0].get("request_id", "")),
+                        "images": extract_output_images(cached[1]),
+                    }
+                )
+            return cached
+
+    # double-click / rerun으로 같은 요청이 진행 중이면 그 job의 결과를 함께 기다립니다.
+    # 고정 seed 요청은 seed까지 같아야 같은 요청이고, random seed 요청은 seed를 무시합니다.
+    # random seed 요청은 session마다 독립된 sample이어야 하므로 같은 owner끼리만 합칩니다.
+    coalesce_key = (
+        f"{deployment_id}:"
+        f"{workflow_fingerprint(workflow, ignore_seed=not cacheable)}"
+    )
+    if not cacheable:
+        coalesce_key = f"{_JOB_OWNER.get()}@{coalesce_key}"
+
+    job = get_job_engine().submit(
+        api_key=api_key,
+        deployment_id=deployment_id,
+        workflow=workflow,
+        poll_interval=poll_interval,
+        timeout_seconds=timeout_seconds,
+        workflow_key=workflow_key,
+        coalesce_key=coalesce_key,
+    )
+
+    if on_progress is not None:
+        for event in job.iter_events():
+            on_progress(event)
+
+    result_data = job.wait()
+
+    if result_cache is not None:
+        result_cache.put(workflow, job.request_data, result_data)
+
+    return job.request_data, result_data
+
+
+def _run_candidates(
+    run_fn,
+    num_candidates: int,
+    seed: int | None = None,
+    on_progress=None,
+    **kwargs,
+) -> dict:
+    """
+    run_fn을 seed만 바꿔 num_candidates번 동시에 실행하고 결과를 하나로 합칩니다.
+
+    - seed가 있으면 seed, seed + 1, ...을 사용하므로 재실행 시 결과 cache 대상입니다.
+    - seed가 없으면 random 기준 seed를 뽑아 같은 방식으로 펼칩니다.
+      후보마다 seed를 명시해야 in-flight coalescing이 후보들을 하나로 합치지 않습니다.
+    - images는 후보 순서대로 이어 붙이고 label 뒤에 후보 번호를 붙입니다.
+    - request / result / workflow_api_json은 첫 번째 성공 후보 값을 유지하고,
+      candidates에 후보별 전체 결과를, candidate_errors에 실패한 후보를 담습니다.
+
+    on_progress는 후보 job의 event를 호출한 thread에서 전달하며,
+    후보별 completed event 대신 모든 후보가 끝났을 때 completed event를 한 번 보냅니다.
+    """
+    if seed is None:
+        seed = random.randint(1, 4_294_967_295)
+
+    events: queue.Queue = queue.Queue()
+
+    def forward_events(candidate_index: int):
+        def forward(event: dict) -> None:
+            if event.get("type") not in ("completed", "cached"):
+                events.put({**event, "candidate_index": candidate_index})
+
+        return forward
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=num_candidates,
+        thread_name_prefix="runcomfy-candidate",
+    ) as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                run_fn,
+                seed=(int(seed) + candidate_index - 2) % 4_294_967_295 + 1,
+                num_candidates=1,
+                on_progress=(
+                    forward_events(candidate_index)
+                    if on_progress is not None
+                    else None
+                ),
+                **kwargs,
+            )
+            for candidate_index in range(1, num_candidates + 1)
+        ]
+
+        while True:
+            finished = all(future.done() for future in futures)
+
+            try:
+                while True:
+                    event = events.get(timeout=0.0 if finished else 0.5)
+                    if on_progress is not None:
+                        on_progress(event)
+            except queue.Empty:
+                pass
+
+            if finished:
+                break
+
+    candidates = []
+    candidate_errors = []
+
+    for candidate_index, future in enumerate(futures, start=1):
+        try:
+            candidates.append((candidate_index, future.result()))
+        except Exception as e:
+            candidate_errors.append({"candidate_index": candidate_index, "error": str(e)})
+
+    if not candidates:
+        scope = _CANCEL_SCOPE.get()
+        if scope is not None:
+            scope.raise_if_cancelled()
+
+        raise RuntimeError(
+            f"All {num_candidates} candidates failed: "
+            + "; ".join(item["error"] for item in candidate_errors)
+        )
+
+    if on_progress is not None:
+        on_progress({"type": "completed", "status": "completed"})
+
+    first_result = candidates[0][1]
+
+    return {
+        **first_result,
+        "images": [
+            {
+                **image,
+                "label": f"{image['label']} (Candidate {candidate_index})",
+                "candidate_index": candidate_index,
+            }
+            for candidate_index, result in candidates
+            for image in result.get("images", [])
+        ],
+        "candidates": [result for _candidate_index, result in candidates],
+        "candidate_errors": candidate_errors,
+    }
+
+
+def iter_completed_jobs(
+    job_factories: list,
+    max_concurrency: int,
+):
+    """
+    job_factories의 callable을 최대 max_concurrency개까지 동시에 submit하고,
+    job이 끝나는 순서대로 (index, job)을 yield 합니다.
+    하나가 끝나면 다음 factory를 submit하므로 in-flight job 수가 상한을 넘지 않습니다.
+    """
+    max_concurrency = max(1, int(max_concurrency))
+    pending_factories = list(enumerate(job_factories))
+    pending_factories.reverse()
+    in_flight: dict[concurrent.futures.Future, tuple[int, RunComfyJob]] = {}
+
+    def fill():
+        while pending_factories and len(in_flight) < max_concurrency:
+            index, factory = pending_factories.pop()
+            job = factory()
+            in_flight[job.future] = (index, job)
+
+    fill()
+
+    while in_flight:
+        done, _not_done = concurrent.futures.wait(
+            in_flight,
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+
+        for future in done:
+            yield in_flight.pop(future)
+
+        fill()
+
+
+class BackgroundRun(_ProgressEventLog):
+    """
+    run_* 호출 하나를 background worker에서 실행하는 handle입니다.
+
+    Streamlit script가 rerun / 새로고침 / websocket 끊김으로 중단되어도
+    worker가 결과를 끝까지 받아 보관하므로, UI는 run_id로 다시 연결해
+    같은 GPU job의 결과를 가져올 수 있습니다.
+    progress event는 run_*의 on_progress event를 그대로 기록합니다.
+    """
+
+    def __init__(self, step: str, context: dict | None = None):
+        self.run_id = uuid.uuid4().hex
+        self.step = step
+        self.context = dict(context or {})
+
+        self.request_ids: list[str] = []
+        self.status = "pending"
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+
+        self.cancel_scope = CancelScope()
+
+        self._future: concurrent.futures.Future = concurrent.futures.Future()
+        self._init_progress_events()
+
+    def wait(self, timeout: float | None = None) -> dict:
+        return self._future.result(timeout=timeout)
+
+    @property
+    def future(self) -> concurrent.futures.Future:
+        return self._future
+
+    def cancel(self) -> bool:
+        """
+        run이 submit한 job을 모두 취소하고 이후 submit을 막습니다.
+        이미 끝난 run이면 False를 반환합니다.
+        """
+        if self.done():
+            return False
+
+        self.status = "cancelling"
+        self.cancel_scope.cancel()
+        return True
+
+    def _record_event(self, event: dict) -> None:
+        request_id = event.get("request_id")
+
+        if request_id and request_id not in self.request_ids:
+            self.request_ids.append(request_id)
+
+        self.status = event.get("status") or self.status
+        self._append_event(event)
+
+    def _finish(
+        self,
+        result_data: dict | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        self.finished_at = time.time()
+
+        if error is not None:
+            self.status = (
+                "cancelled"
+                if self.cancel_scope.cancelled
+                or isinstance(error, RunComfyCancelledError)
+                else "failed"
+            )
+            self._future.set_exception(error)
+        else:
+            self.status = "completed"
+            self._future.set_result(result_data)
+
+        self._notify_finished()
+
+
+class BackgroundRunRegistry:
+    """
+    BackgroundRun을 실행하고 run_id / RunComfy request_id로 조회하는 process 단위 registry입니다.
+    """
+
+    def __init__(self, max_workers: int = BACKGROUND_RUN_WORKERS):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="runcomfy-background-run",
+        )
+        self._lock = threading.Lock()
+        self._runs: dict[str, BackgroundRun] = {}
+
+    def start(
+        self,
+        step: str,
+        run_fn,
+        context: dict | None = None,
+        owner: str = "",
+        **kwargs,
+    ) -> BackgroundRun:
+        """
+        run_fn(**kwargs, on_progress=...)를 background worker에서 실행합니다.
+        run_fn은 on_progress 인자를 받는 run_* 함수여야 합니다.
+        owner는 DeploymentGovernor의 공정 대기열 단위(session 등)입니다.
+        """
+        run = BackgroundRun(step=step, context=context)
+
+        with self._lock:
+            self._prune_runs()
+            self._runs[run.run_id] = run
+
+        self._executor.submit(self._drive, run, run_fn, owner, kwargs)
+
+        return run
+
+    def get(self, run_id: str) -> BackgroundRun | None:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def recover(self, run_id: str) -> BackgroundRun | None:
+        """
+        server 재시작으로 registry에서 사라진 run을 JobLedger 기록으로 복구합니다.
+
+        - 재시작 전에 끝난 run은 저장된 run 결과(또는 error)를 그대로 돌려줍니다.
+        - 끝나지 않은 run은 그 run이 submit한 job을 모두 기다려 request / result / images
+          기본 구조로 합칩니다. run_* 후처리와 재시작 이후에 submit될 예정이던 job은
+          다시 실행할 수 없으므로 결과에 partial=True와 복구하지 못한 job 수를 표시합니다.
+        """
+        ledger = get_job_ledger()
+        if ledger is None:
+            return None
+
+        run_row = ledger.get_run(run_id)
+        rows = ledger.find_by_run_id(run_id)
+
+        if run_row is None and not rows:
+            return None
+
+        if run_row is not None:
+            run = BackgroundRun(step=run_row.get("step") or "")
+        else:
+            run = BackgroundRun(step=rows[-1].get("workflow_key") or "")
+        run.run_id = run_id
+        run.request_ids = [row["request_id"] for row in rows if row.get("request_id")]
+
+        if run_row is not None and run_row.get("finished_at") is not None:
+            if run_row.get("error"):
+                error_type = (
+                    RunComfyCancelledError
+                    if run_row.get("status") == "cancelled"
+                    else RuntimeError
+                )
+                run._finish(error=error_type(run_row["error"]))
+            else:
+                run._finish(result_data=JobLedger.result_of(run_row) or {})
+        elif not self._recover_jobs(run, rows):
+            return None
+
+        with self._lock:
+            self._runs[run.run_id] = run
+
+        return run
+
+    @staticmethod
+    def _recover_jobs(run: BackgroundRun, rows: list[dict]) -> bool:
+        """
+        끝나지 않은 run의 job을 모두 기다려 run을 끝냅니다.
+        submit 기록이 없어 복구할 수 없는 job만 있으면 False를 반환합니다.
+        """
+        engine = get_job_engine()
+        entries = []
+        missing_job_count = 0
+
+        for row in rows:
+            job = engine.get(row["run_job_id"])
+
+            if job is None and row.get("finished_at") is None:
+                missing_job_count += 1
+                continue
+
+            entries.append((row, job))
+
+        if not entries:
+            return False
+
+        def finish() -> None:
+            jobs = []
+
+            for row, job in entries:
+                if job is not None:
+                    error = job.future.exception()
+                    result_data = None if error else job.future.result()
+                    error = str(error) if error else None
+                else:
+                    result_data, error = JobLedger.result_of(row), row.get("error")
+
+                jobs.append(
+                    {
+                        "request": {
+                            "request_id": row.get("request_id") or "",
+                            "status_url": row.get("status_url") or "",
+                            "result_url": row.get("result_url") or "",
+                        },
+                        "workflow_key": row.get("workflow_key") or "",
+                        "result": result_data or {},
+                        "images": extract_output_images(result_data or {}),
+                        "error": error or "",
+                    }
+                )
+
+            succeeded = [job for job in jobs if not job["error"]]
+
+            if not succeeded:
+                run._finish(error=RuntimeError(jobs[-1]["error"]))
+                return
+
+            run._finish(
+                result_data={
+                    "request": succeeded[-1]["request"],
+                    "result": succeeded[-1]["result"],
+                    "images": [image for job in succeeded for image in job["images"]],
+                    "jobs": jobs,
+                    "partial": True,
+                    "missing_job_count": missing_job_count,
+                    "failed_job_count": len(jobs) - len(succeeded),
+                }
+            )
+
+        live_jobs = [job for _row, job in entries if job is not None]
+        remaining = [len(live_jobs)]
+        remaining_lock = threading.Lock()
+
+        def on_job_done(_job) -> None:
+            with remaining_lock:
+                remaining[0] -= 1
+                done = remaining[0] == 0
+
+            if done:
+                finish()
+
+        for job in live_jobs:
+            run.cancel_scope.track(job)
+            job.add_progress_listener(run._record_event)
+            job.add_done_callback(on_job_done)
+
+        if not live_jobs:
+            finish()
+
+        return True
+
+    def find_by_request_id(self, request_id: str) -> BackgroundRun | None:
+        with self._lock:
+            for run in self._runs.values():
+                if request_id in run.request_ids:
+                    return run
+
+        return None
+
+    def runs(self) -> list[BackgroundRun]:
+        with self._lock:
+            return list(self._runs.values())
+
+    def _prune_runs(self) -> None:
+        expire_before = time.time() - JOB_RETENTION_SECONDS
+
+        for run_id, run in list(self._runs.items()):
+            if run.finished_at is not None and run.finished_at < expire_before:
+                del self._runs[run_id]
+
+    @staticmethod
+    def _drive(run: BackgroundRun, run_fn, owner: str, kwargs: dict) -> None:
+        ledger = get_job_ledger()
+        result_data, error = None, None
+
+        if ledger is not None:
+            try:
+                ledger.record_run_start(run)
+            except sqlite3.Error:
+                pass
+
+        token = _BACKGROUND_RUN_ID.set(run.run_id)
+        try:
+            with job_owner(owner), cancel_scope(run.cancel_scope):
+                result_data = run_fn(**kwargs, on_progress=run._record_event)
+        except Exception as e:
+            error = e
+        finally:
+            _BACKGROUND_RUN_ID.reset(token)
+
+        run._finish(result_data=result_data, error=error)
+
+        if ledger is not None:
+            try:
+                ledger.record_run_finish(run, result_data=result_data, error=error)
+            except sqlite3.Error:
+                pass
+
+
+_BACKGROUND_RUNS: BackgroundRunRegistry | None = None
+_BACKGROUND_RUNS_LOCK = threading.Lock()
+
+
+def get_background_runs() -> BackgroundRunRegistry:
+    global _BACKGROUND_RUNS
+
+    with _BACKGROUND_RUNS_LOCK:
+        if _BACKGROUND_RUNS is None:
+            _BACKGROUND_RUNS = BackgroundRunRegistry()
+
+        return _BACKGROUND_RUNS
+
+
+# =========================
+# Storyboard model
+# =========================
+STORYBOARD_SHOT_ID_COLUMNS = ("shot", "shot_id", "shot id", "id")
+STORYBOARD_CHARACTER_SEPARATORS = (",", ";", "/", "|")
+
+# 업로드 CSV encoding은 앞부분 sample만 decode해 보고 정합니다.
+# incremental decoder를 쓰므로 sample 끝에서 잘린 multi-byte 문자는 오류로 보지 않습니다.
+STORYBOARD_ENCODING_SAMPLE_BYTES = 64 * 1024
+STORYBOARD_ENCODINGS = ("utf-8", "cp949")
+
+# 어떤 encoding으로도 전체를 decode하지 못해 잘못된 byte를 버리고 읽었을 때의 encoding 표시입니다.
+STORYBOARD_LOSSY_ENCODING = "utf-8 (lossy)"
+
+
+def detect_csv_encoding(sample: bytes) -> str:
+    """
+    BOM이 있으면 utf-8-sig, 아니면 sample을 오류 없이 decode하는 첫 번째 encoding을 반환합니다.
+    모두 실패하면 빈 문자열입니다.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    for encoding in STORYBOARD_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+
+        return encoding
+
+    return ""
+
+
+def read_storyboard_csv(raw: bytes) -> tuple[str, str, "Storyboard"]:
+    """
+    업로드 CSV bytes를 (csv_text, encoding, Storyboard)로 읽습니다.
+
+    - encoding은 앞 STORYBOARD_ENCODING_SAMPLE_BYTES로 먼저 고르고 전체 bytes를 decode합니다.
+      뒷부분에서 decode가 실패하면 나머지 STORYBOARD_ENCODINGS를 전체 bytes로 다시 시도합니다.
+    - 모두 실패하면 utf-8로 읽고 잘못된 byte는 버리며, encoding은 STORYBOARD_LOSSY_ENCODING입니다.
+    - bytes는 한 번만 decode하고, Storyboard는 그 csv_text를 csv.reader로 읽어 만듭니다.
+    csv_text는 RunComfy CSVStoryboardParser에 그대로 전달하기 위해 반환합니다.
+    """
+    detected = detect_csv_encoding(raw[:STORYBOARD_ENCODING_SAMPLE_BYTES])
+    candidates = [detected] if detected else []
+    candidates += [encoding for encoding in STORYBOARD_ENCODINGS if encoding not in candidates]
+
+    encoding, errors = "utf-8", "ignore"
+    csv_text = None
+
+    for candidate in candidates:
+        try:
+            csv_text = raw.decode(candidate)
+        except UnicodeDecodeError:
+            continue
+
+        encoding, errors = candidate, "strict"
+        break
+
+    if csv_text is None:
+        csv_text = raw.decode(encoding, errors=errors)
+
+    storyboard = Storyboard.from_rows(csv.reader(io.StringIO(csv_text, newline="")))
+
+    if errors != "strict":
+        encoding = STORYBOARD_LOSSY_ENCODING
+
+    return csv_text, encoding, storyboard
+
+
+class StoryboardShot:
+    """
+    Storyboard의 shot 하나입니다. 값은 Storyboard의 column 배열에 있고 shot은 행 위치만 가집니다.
+
+    - rows: 이 shot에 속한 행(column → 값)입니다.
+      shot id 칸이 빈 행은 바로 앞 shot의 이어지는 행으로 봅니다.
+    - characters: 이름에 "character"가 들어간 column 값을 구분자로 나눈 character id 목록입니다.
+    - fields: shot id / character column을 뺀 scene field 값입니다. 여러 행이면 줄바꿈으로 이어 붙입니다.
+    - fingerprint: rows 전체의 hash이며, 두 revision의 같은 shot이 바뀌었는지 비교하는 데 씁니다.
+    """
+
+    def __init__(self, storyboard: "Storyboard", shot_id: str, positions: list[int]):
+        self.storyboard = storyboard
+        self.shot_id = shot_id
+        self.positions = positions
+        self._fingerprint: str | None = None
+
+    @property
+    def rows(self) -> list[dict[str, str]]:
+        return [self.storyboard.row(position) for position in self.positions]
+
+    @property
+    def characters(self) -> list[str]:
+        characters = []
+
+        for position in self.positions:
+            for column in self.storyboard.character_columns:
+                value = self.storyboard.value(position, column)
+                for separator in STORYBOARD_CHARACTER_SEPARATORS:
+                    value = value.replace(separator, ",")
+
+                for character in value.split(","):
+                    character = character.strip()
+                    if character and character not in characters:
+                        characters.append(character)
+
+        return characters
+
+    @property
+    def fields(self) -> dict[str, str]:
+        skipped_columns = {
+            self.storyboard.shot_id_column,
+            *self.storyboard.character_columns,
+        }
+        fields: dict[str, list[str]] = {}
+
+        for row in self.rows:
+            for column, value in row.items():
+                if column not in skipped_columns and value:
+                    fields.setdefault(column, []).append(value)
+
+        return {column: "\n".join(values) for column, values in fields.items()}
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha256(
+                json.dumps(self.rows, ensure_ascii=False, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+
+        return self._fingerprint
+
+    def changed_columns(self, other: "StoryboardShot") -> list[str]:
+        """
+        other와 값이 다른 column 목록을 column 순서대로 반환합니다.
+        """
+        rows = self.rows
+        other_rows = other.rows
+        columns = []
+
+        for index in range(max(len(rows), len(other_rows))):
+            row = rows[index] if index < len(rows) else {}
+            other_row = other_rows[index] if index < len(other_rows) else {}
+
+            for column in list(row) + [key for key in other_row if key not in row]:
+                if row.get(column, "") != other_row.get(column, "") and column not in columns:
+                    columns.append(column)
+
+        return columns
+
+
+class Storyboard:
+    """
+    storyboard CSV를 column 배열로 보관하는 model입니다.
+
+    - 행 dict를 만들지 않고 column마다 값 list 하나만 두며, 같은 column의 반복 값
+      (character id, camera 설정 등)은 같은 str 객체를 공유합니다.
+    - shot id column은 STORYBOARD_SHOT_ID_COLUMNS 이름의 column, 없으면 첫 번째 column입니다.
+    - shot_positions는 shot id → 행 위치 목록이며 shot 순서는 CSV 첫 등장 순서입니다.
+    - CSV 문법 오류가 나면 그 앞까지 읽은 행을 유지하고 parse_error에 내용을 남깁니다.
+    - ragged_lines: header와 칸 수가 다른 행의 CSV line 번호입니다.
+    - orphan_lines: 첫 shot id보다 앞에 있어 어느 shot에도 속하지 않은 행의 line 번호입니다.
+    """
+
+    def __init__(
+        self,
+        columns: list[str],
+        column_values: list[list[str]],
+        shot_positions: dict[str, list[int]],
+        parse_error: str | None = None,
+        ragged_lines: list[int] | None = None,
+        orphan_lines: list[int] | None = None,
+    ):
+        self.columns = list(columns)
+        self.column_values = column_values
+        self.shot_positions = shot_positions
+        self.parse_error = parse_error
+        self.ragged_lines = list(ragged_lines or [])
+        self.orphan_lines = list(orphan_lines or [])
+
+        self._column_index = {column: index for index, column in enumerate(self.columns)}
+        self.shot_id_column = (
+            self.columns[self._shot_id_index(self.columns)] if self.columns else ""
+        )
+        self.character_columns = tuple(
+            column for column in self.columns if "character" in column.lower()
+        )
+        self._shots_by_id: dict[str, StoryboardShot] | None = None
+
+    @classmethod
+    def from_rows(cls, rows) -> "Storyboard":
+        """
+        csv.reader 같은 행 iterator를 한 행씩 읽어 column 배열에 쌓습니다.
+        """
+        columns: list[str] = []
+        column_values: list[list[str]] = []
+        value_pools: list[dict[str, str]] = []
+        shot_positions: dict[str, list[int]] = {}
+        shot_id_index = 0
+        current_shot_id = ""
+        parse_error = None
+        ragged_lines: list[int] = []
+        orphan_lines: list[int] = []
+        row_count = 0
+
+        try:
+            for row in rows:
+                if not any(value.strip() for value in row):
+                    continue
+
+                if not columns:
+                    columns = [column.strip() for column in row]
+                    column_values = [[] for _column in columns]
+                    value_pools = [{} for _column in columns]
+                    shot_id_index = cls._shot_id_index(columns)
+                    continue
+
+                # csv.reader가 아니면 line 번호 대신 데이터 행 번호(header = 1)를 기록합니다.
+                line_number = getattr(rows, "line_num", row_count + 2)
+                if len(row) != len(columns):
+                    ragged_lines.append(line_number)
+
+                for index, values in enumerate(column_values):
+                    value = row[index].strip() if index < len(row) else ""
+                    values.append(value_pools[index].setdefault(value, value))
+
+                shot_id = column_values[shot_id_index][-1]
+                if shot_id:
+                    current_shot_id = shot_id
+                if current_shot_id:
+                    shot_positions.setdefault(current_shot_id, []).append(row_count)
+                else:
+                    orphan_lines.append(line_number)
+
+                row_count += 1
+        except csv.Error as e:
+            parse_error = str(e)
+
+        return cls(
+            columns,
+            column_values,
+            shot_positions,
+            parse_error=parse_error,
+            ragged_lines=ragged_lines,
+            orphan_lines=orphan_lines,
+        )
+
+    @staticmethod
+    def _shot_id_index(columns: list[str]) -> int:
+        for index, column in enumerate(columns):
+            if column.lower() in STORYBOARD_SHOT_ID_COLUMNS:
+                return index
+
+        return 0
+
+    @classmethod
+    def from_csv(cls, csv_text: str) -> "Storyboard":
+        return cls.from_rows(csv.reader(io.StringIO(str(csv_text))))
+
+    @property
+    def row_count(self) -> int:
+        return len(self.column_values[0]) if self.column_values else 0
+
+    def value(self, position: int, column: str) -> str:
+        index = self._column_index.get(column)
+        return self.column_values[index][position] if index is not None else ""
+
+    def row(self, position: int) -> dict[str, str]:
+        return {
+            column: self.column_values[index][position]
+            for index, column in enumerate(self.columns)
+        }
+
+    def column_data(self) -> dict[str, list[str]]:
+        return dict(zip(self.columns, self.column_values))
+
+    def _shot_map(self) -> dict[str, StoryboardShot]:
+        if self._shots_by_id is None:
+            self._shots_by_id = {
+                shot_id: StoryboardShot(self, shot_id, positions)
+                for shot_id, positions in self.shot_positions.items()
+            }
+
+        return self._shots_by_id
+
+    @property
+    def shots(self) -> list[StoryboardShot]:
+        return list(self._shot_map().values())
+
+    @property
+    def shot_ids(self) -> list[str]:
+        return list(self.shot_positions)
+
+    @property
+    def characters(self) -> list[str]:
+        characters = []
+
+        for shot in self.shots:
+            for character in shot.characters:
+                if character not in characters:
+                    characters.append(character)
+
+        return characters
+
+    def get(self, shot_id: str) -> StoryboardShot | None:
+        return self._shot_map().get(str(shot_id))
+
+
+class StoryboardDiff:
+    """
+    두 storyboard revision 사이의 shot 단위 변경 내역입니다.
+
+    - added / removed / changed / unchanged: shot id 목록(새 revision 순서, removed는 이전 순서)
+    - changed_columns: 바뀐 shot id → 값이 달라진 column 목록
+    - stale_shot_ids: 결과를 버려야 하는 shot (changed + removed)
+    - regenerate_shot_ids: 다시 생성해야 하는 shot (added + changed)
+    """
+
+    def __init__(
+        self,
+        added: list[str],
+        removed: list[str],
+        changed: list[str],
+        unchanged: list[str],
+        changed_columns: dict[str, list[str]],
+    ):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.unchanged = unchanged
+        self.changed_columns = changed_columns
+
+    @property
+    def stale_shot_ids(self) -> list[str]:
+        return self.changed + self.removed
+
+    @property
+    def regenerate_shot_ids(self) -> list[str]:
+        return self.added + self.changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def to_dict(self) -> dict:
+        return {
+            "added": list(self.added),
+            "removed": list(self.removed),
+            "changed": list(self.changed),
+            "unchanged": list(self.unchanged),
+            "changed_columns": deepcopy(self.changed_columns),
+        }
+
+
+def diff_storyboards(
+    previous: Storyboard | None,
+    current: Storyboard,
+) -> StoryboardDiff:
+    """
+    shot id가 같은 shot끼리 fingerprint를 비교합니다.
+    이전 revision이 없으면 모든 shot이 added입니다.
+    """
+    previous = previous or Storyboard([], [], {})
+
+    added, changed, unchanged = [], [], []
+    changed_columns = {}
+
+    for shot in current.shots:
+        previous_shot = previous.get(shot.shot_id)
+
+        if previous_shot is None:
+            added.append(shot.shot_id)
+        elif previous_shot.fingerprint != shot.fingerprint:
+            changed.append(shot.shot_id)
+            changed_columns[shot.shot_id] = previous_shot.changed_columns(shot)
+        else:
+            unchanged.append(shot.shot_id)
+
+    removed = [
+        shot.shot_id
+        for shot in previous.shots
+        if current.get(shot.shot_id) is None
+    ]
+
+    return StoryboardDiff(
+        added=added,
+        removed=removed,
+        changed=changed,
+        unchanged=unchanged,
+        changed_columns=changed_columns,
+    )
+
+
+# =========================
+# Storyboard validation
+# =========================
+# CSVStoryboardParser / CharacterRegistryParser / ScenePromptBuilder가 받는 입력 규칙을
+# submit 전에 local에서 확인합니다. custom node 구현은 이 repo에 없으므로
+# workflow 입력값(shot_filter, character_filter, description_source)으로 드러나는 규칙만 따릅니다.
+STORYBOARD_SHOT_FILTERS = ("ALL", "CUSTOM")
+STORYBOARD_AUTO_CHARACTER_FILTER = "AUTO_FIRST"
+STORYBOARD_CUSTOM_CHARACTER_FILTER = "CUSTOM"
+STORYBOARD_DESCRIPTION_COLUMNS = ("description", "desc")
+
+# include_technical_settings="false"이면 prompt data에서 빼는 column 이름 keyword입니다.
+# scene workflow의 instruction이 flux_multi_angle_prompt 같은 prompt 원문을 쓰지 말라고 하므로
+# "prompt" column도 technical 설정으로 봅니다.
+STORYBOARD_TECHNICAL_COLUMN_KEYWORDS = (
+    "technical",
+    "prompt",
+    "lens",
+    "focal",
+    "aperture",
+    "shutter",
+    "iso",
+    "fps",
+)
+
+STORYBOARD_PARSE_CACHE_SIZE = 8
+
+_STORYBOARD_PARSE_CACHE: OrderedDict[str, Storyboard] = OrderedDict()
+_STORYBOARD_PARSE_CACHE_LOCK = threading.Lock()
+
+
+class StoryboardValidationError(ValueError):
+    """
+    local storyboard 검증에서 error가 나온 config로 submit하려 할 때 발생합니다.
+    """
+
+    def __init__(self, validation: "StoryboardValidation"):
+        self.validation = validation
+        super().__init__(
+            "Storyboard CSV is invalid: " + "; ".join(validation.errors)
+        )
+
+
+class StoryboardValidation:
+    """
+    validate_storyboard 결과입니다.
+
+    - errors: remote parser도 반드시 실패하거나 빈 결과를 낼 문제입니다. 하나라도 있으면 submit하지 않습니다.
+    - warnings: column 이름 추정 등으로 찾은, 실행은 되지만 의도와 다를 수 있는 문제입니다.
+    - shot_ids / characters: 선택된 shot과 그 shot이 참조하는 character id입니다.
+    - description_column: ScenePromptBuilder가 description으로 읽을 column입니다.
+    """
+
+    def __init__(self):
+        self.errors: list[str] = []
+        self.warnings: list[str] = []
+        self.shot_ids: list[str] = []
+        self.characters: list[str] = []
+        self.description_column = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_if_invalid(self) -> None:
+        if self.errors:
+            raise StoryboardValidationError(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "ok": self.ok,
+            "errors": list(self.errors),
+            "warnings": list(self.warnings),
+            "shot_ids": list(self.shot_ids),
+            "characters": list(self.characters),
+            "description_column": self.description_column,
+        }
+
+
+def parse_storyboard_text(csv_text: str) -> Storyboard:
+    """
+    같은 CSV 텍스트는 다시 파싱하지 않도록 최근 STORYBOARD_PARSE_CACHE_SIZE개의 model을 보관합니다.
+    scene batch처럼 같은 CSV로 patch를 여러 번 할 때 검증 비용을 한 번으로 줄입니다.
+    """
+    key = hashlib.sha256(str(csv_text).encode("utf-8")).hexdigest()
+
+    with _STORYBOARD_PARSE_CACHE_LOCK:
+        storyboard = _STORYBOARD_PARSE_CACHE.get(key)
+        if storyboard is not None:
+            _STORYBOARD_PARSE_CACHE.move_to_end(key)
+            return storyboard
+
+    storyboard = Storyboard.from_csv(csv_text)
+
+    with _STORYBOARD_PARSE_CACHE_LOCK:
+        _STORYBOARD_PARSE_CACHE[key] = storyboard
+        while len(_STORYBOARD_PARSE_CACHE) > STORYBOARD_PARSE_CACHE_SIZE:
+            _STORYBOARD_PARSE_CACHE.popitem(last=False)
+
+    return storyboard
+
+
+def find_description_column(
+    storyboard: Storyboard,
+    description_source: str = "english",
+) -> str:
+    """
+    description_source에 맞는 description column을 찾습니다.
+
+    - 이름에 description keyword와 description_source가 모두 들어간 column
+      (예: "description_english", "English Description")
+    - 없으면 description_source 이름 그대로인 column
+    - 그래도 없으면 description keyword만 들어간 첫 column
+    """
+    source = str(description_source or "").strip().lower()
+    description_columns = [
+        column
+        for column in storyboard.columns
+        if any(keyword in column.lower() for keyword in STORYBOARD_DESCRIPTION_COLUMNS)
+    ]
+
+    if source:
+        for column in description_columns:
+            if source in column.lower():
+                return column
+
+        for column in storyboard.columns:
+            if column.lower() == source:
+                return column
+
+    return description_columns[0] if description_columns else ""
+
+
+def _split_shot_ids(custom_shot_ids) -> list[str]:
+    if isinstance(custom_shot_ids, (list, tuple)):
+        values = custom_shot_ids
+    else:
+        values = str(custom_shot_ids or "").split(",")
+
+    shot_ids = []
+    for value in values:
+        value = str(value).strip()
+        if value and value not in shot_ids:
+            shot_ids.append(value)
+
+    return shot_ids
+
+
+def validate_storyboard(
+    storyboard: Storyboard,
+    shot_filter: str = "ALL",
+    custom_shot_ids="",
+    character_filter: str | None = None,
+    custom_character_id: str = "",
+    description_source: str | None = None,
+) -> StoryboardValidation:
+    """
+    column / shot id / character 참조를 확인합니다.
+
+    - error는 확실히 실패하는 경우만입니다: CSV를 읽지 못함, shot이 없음, 선택한 shot id가 없음.
+    - column 이름으로 추정하는 검사(shot id / character / description column, 중복 column,
+      shot에 속하지 않는 행)는 실제 parser가 받아들일 수 있으므로 warning입니다.
+    - character_filter가 None이면 character 검증을 하지 않습니다 (scene / parser test).
+    - description_source가 None이면 description column 검증을 하지 않습니다 (face).
+    """
+    validation = StoryboardValidation()
+    errors = validation.errors
+    warnings = validation.warnings
+
+    if storyboard.parse_error is not None:
+        errors.append(f"CSV syntax error: {storyboard.parse_error}")
+
+    if not storyboard.columns:
+        errors.append("CSV has no header row.")
+        return validation
+
+    if storyboard.row_count == 0:
+        errors.append("CSV has a header but no data rows.")
+        return validation
+
+    if not all(storyboard.columns):
+        warnings.append("CSV header has an empty column name.")
+
+    seen_columns = set()
+    for column in storyboard.columns:
+        if column and column.lower() in seen_columns:
+            warnings.append(f"Duplicate column '{column}' in CSV header.")
+        seen_columns.add(column.lower())
+
+    if storyboard.shot_id_column.lower() not in STORYBOARD_SHOT_ID_COLUMNS:
+        warnings.append(
+            f"No shot id column ({', '.join(STORYBOARD_SHOT_ID_COLUMNS)}); "
+            f"using first column '{storyboard.shot_id_column}'."
+        )
+
+    if storyboard.ragged_lines:
+        warnings.append(
+            "Rows with a different number of fields than the header "
+            f"(line {', '.join(str(line) for line in storyboard.ragged_lines[:10])})."
+        )
+
+    if not storyboard.shot_ids:
+        errors.append("CSV has no shot ids.")
+        return validation
+
+    if storyboard.orphan_lines:
+        warnings.append(
+            "Rows before the first shot id belong to no shot "
+            f"(line {', '.join(str(line) for line in storyboard.orphan_lines[:10])})."
+        )
+
+    # shot 선택
+    shot_filter = str(shot_filter or "ALL")
+    if shot_filter == "CUSTOM":
+        shot_ids = _split_shot_ids(custom_shot_ids)
+        if not shot_ids:
+            errors.append("shot_filter is CUSTOM but custom_shot_ids is empty.")
+    elif shot_filter == "ALL":
+        shot_ids = storyboard.shot_ids
+    else:
+        # CSVStoryboardParser는 shot_filter에 shot id 하나를 직접 받을 수도 있습니다.
+        shot_ids = [shot_filter]
+
+    unknown_shot_ids = [shot_id for shot_id in shot_ids if storyboard.get(shot_id) is None]
+    if unknown_shot_ids:
+        errors.append(f"Unknown shot id: {', '.join(unknown_shot_ids)}")
+
+    shots = [
+        shot
+        for shot in (storyboard.get(shot_id) for shot_id in shot_ids)
+        if shot is not None
+    ]
+    validation.shot_ids = [shot.shot_id for shot in shots]
+    for shot in shots:
+        for character in shot.characters:
+            if character not in validation.characters:
+                validation.characters.append(character)
+
+    # character 참조
+    if character_filter is not None:
+        if not storyboard.character_columns:
+            warnings.append("CSV has no character column.")
+        elif character_filter == STORYBOARD_AUTO_CHARACTER_FILTER:
+            if not validation.characters:
+                warnings.append("Selected shots reference no character.")
+        else:
+            character_id = (
+                str(custom_character_id or "").strip()
+                if character_filter == STORYBOARD_CUSTOM_CHARACTER_FILTER
+                else str(character_filter)
+            )
+
+            if not character_id:
+                warnings.append(
+                    "character_filter is CUSTOM but custom_character_id is empty."
+                )
+            elif character_id not in validation.characters:
+                warnings.append(
+                    f"Character {character_id} is not referenced by the selected shots."
+                )
+
+    # description column
+    if description_source is not None:
+        validation.description_column = find_description_column(
+            storyboard,
+            description_source,
+        )
+
+        if not validation.description_column:
+            warnings.append(
+                f"No description column for description_source '{description_source}'."
+            )
+        else:
+            empty_shot_ids = [
+                shot.shot_id
+                for shot in shots
+                if not shot.fields.get(validation.description_column)
+            ]
+            if empty_shot_ids:
+                warnings.append(
+                    f"Empty {validation.description_column} in shot "
+                    f"{', '.join(empty_shot_ids)}."
+                )
+
+    return validation
+
+
+def build_structured_shot_data(
+    storyboard: Storyboard,
+    shot_ids: list[str],
+    description_source: str = "english",
+    include_technical_settings: str | bool = "false",
+) -> dict:
+    """
+    ScenePromptBuilder가 Qwen instruction 뒤에 붙이는 structured_shot_data JSON의 local 미리보기입니다.
+
+    - shot마다 description, characters, 나머지 scene field를 column 이름(snake_case)으로 담습니다.
+    - include_technical_settings가 false이면 STORYBOARD_TECHNICAL_COLUMN_KEYWORDS column은 뺍니다.
+    """
+    include_technical = str(include_technical_settings).lower() == "true"
+    description_column = find_description_column(storyboard, description_source)
+    skipped_columns = {description_column} | {
+        column
+        for column in storyboard.columns
+        if any(keyword in column.lower() for keyword in STORYBOARD_DESCRIPTION_COLUMNS)
+    }
+
+    shots = []
+    for shot_id in shot_ids:
+        shot = storyboard.get(shot_id)
+        if shot is None:
             continue
 
-        inputs = node.get("inputs", {})
-        if (
-            isinstance(inputs, dict)
-            and "seed" in inputs
-            and isinstance(inputs["seed"], int)
-        ):
-            inputs["seed"] = seed
+        fields = shot.fields
+        shot_data = {
+            "shot_id": shot.shot_id,
+            "description": fields.get(description_column, ""),
+            "characters": shot.characters,
+        }
 
-    for node_id in find_nodes_by_class_type(workflow, "SaveImage"):
-        inputs = workflow[node_id].setdefault("inputs", {})
-        if "filename_prefix" in inputs:
-            inputs["filename_prefix"] = filename_prefix
+        for column, value in fields.items():
+            if column in skipped_columns:
+                continue
+            if not include_technical and any(
+                keyword in column.lower() for keyword in STORYBOARD_TECHNICAL_COLUMN_KEYWORDS
+            ):
+                continue
 
-    return workflow
+            shot_data[column.strip().lower().replace(" ", "_")] = value
+
+        shots.append(shot_data)
+
+    return {"shot_count": len(shots), "shots": shots}
+
+
+def check_storyboard_csv(
+    csv_text: str,
+    shot_filter: str = "ALL",
+    custom_shot_ids="",
+    character_filter: str | None = None,
+    custom_character_id: str = "",
+    description_source: str | None = None,
+) -> StoryboardValidation:
+    """
+    patch 함수에서 submit 전에 호출합니다. error가 있으면 StoryboardValidationError가 발생합니다.
+    """
+    validation = validate_storyboard(
+        parse_storyboard_text(csv_text),
+        shot_filter=shot_filter,
+        custom_shot_ids=custom_shot_ids,
+        character_filter=character_filter,
+        custom_character_id=custom_character_id,
+        description_source=description_source,
+    )
+    validation.raise_if_invalid()
+
+    return validation
+
+
+# =========================
+# Step 1. CSV Parser Test
+# =========================
+CSV_PARSER_TEST_PATCH_PLAN = {
+    "name": "Step 1 CSV Parser Test",
+    "nodes": {
+        "csv_parser": {"class_type": "CSVStoryboardParser", "select": "first"},
+        "samplers": {"class_type": "KSampler", "select": "all"},
+        "all_nodes": {"select": "all"},
+        "save_images": {"class_type": "SaveImage", "select": "all"},
+    },
+    "fields": (
+        ("csv_text", "csv_parser", "csv_text", PATCH_SET),
+        ("shot_filter", "csv_parser", "shot_filter", PATCH_SET),
+        ("custom_shot_ids", "csv_parser", "custom_shot_ids", PATCH_SET),
+        ("seed", "samplers", "seed", PATCH_IF_PRESENT),
+        ("seed", "all_nodes", "seed", PATCH_IF_INT),
+        ("filename_prefix", "save_images", "filename_prefix", PATCH_IF_PRESENT),
+    ),
+    "constants": (
+        ("csv_parser", "input_mode", "text"),
+        ("csv_parser", "csv_file", "CUSTOM"),
+    ),
+}
+
+
+def patch_csv_parser_test_workflow(
+    workflow: dict,
+    storyboard_input_config: dict,
+) -> dict:
+    storyboard_input = storyboard_input_config.get(
+        "storyboard_input",
+        storyboard_input_config,
+    )
+
+    csv_text = storyboard_input.get("csv_text", "")
+    shot_filter = storyboard_input.get("shot_filter", "ALL")
+    custom_shot_ids = storyboard_input.get("custom_shot_ids", "")
+
+    if not str(csv_text).strip():
+        raise ValueError(
+            "csv_text is empty. Upload a CSV file first."
+        )
+
+    check_storyboard_csv(
+        csv_text,
+        shot_filter=shot_filter,
+        custom_shot_ids=custom_shot_ids,
+    )
+
+    seed = _resolve_seed(storyboard_input_config)
+    filename_prefix = f"csv_parser_test_{seed}"
+
+    return apply_patch_plan(
+        workflow,
+        CSV_PARSER_TEST_PATCH_PLAN,
+        {
+            "csv_text": csv_text,
+            "shot_filter": shot_filter,
+            "custom_shot_ids": custom_shot_ids,
+            "seed": seed,
+            "filename_prefix": filename_prefix,
+        },
+    )
 
 
 def run_csv_parser_test(
@@ -468,8 +4237,13 @@ def run_csv_parser_test(
     workflow_path: str | Path = CSV_PARSER_TEST_WORKFLOW_PATH,
     poll_interval: int = 10,
     timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
 ) -> dict:
-    base_workflow = load_workflow_api_json(workflow_path)
+    if seed is not None:
+        storyboard_input_config = {**storyboard_input_config, "seed": seed}
+
+    base_workflow = load_workflow_template(workflow_path)
 
     workflow = patch_csv_parser_test_workflow(
         workflow=base_workflow,
@@ -482,6 +4256,9 @@ def run_csv_parser_test(
         workflow=workflow,
         poll_interval=poll_interval,
         timeout_seconds=timeout_seconds,
+        workflow_key="csv_parser_test",
+        cacheable=_has_fixed_seed(storyboard_input_config),
+        on_progress=on_progress,
     )
 
     return {
@@ -495,6 +4272,79 @@ def run_csv_parser_test(
 # ======================================
 # Step 2A. Character Appearance
 # ======================================
+# PortraitMasterBaseCharacter에서 UI가 실제로 선택하는 appearance 값입니다.
+FACE_APPEARANCE_KEYS = (
+    "nationality_1",
+    "body_type",
+    "eyes_color",
+    "eyes_shape",
+    "lips_color",
+    "lips_shape",
+    "facial_expression",
+    "face_shape",
+    "hair_style",
+    "hair_color",
+    "hair_length",
+)
+
+FACE_PATCH_PLAN = {
+    "name": "Step 2A Character Appearance",
+    "nodes": {
+        "11": {
+            "class_type": "CSVStoryboardParser",
+            "description": "Step 2A CSVStoryboardParser",
+        },
+        "17": {
+            "class_type": "CharacterRegistryParser",
+            "description": "Step 2A CharacterRegistryParser",
+        },
+        "19": {
+            "class_type": "PortraitMasterBaseCharacter",
+            "description": "Step 2A PortraitMasterBaseCharacter",
+        },
+        "18": {
+            "class_type": "PortraitMasterSkinDetails",
+            "description": "Step 2A PortraitMasterSkinDetails",
+        },
+        "14": {
+            "class_type": "AILab_QwenVL",
+            "description": "Step 2A QwenVL",
+        },
+        "15": {
+            "class_type": "KSampler",
+            "description": "Step 2A KSampler",
+        },
+        "16": {
+            "class_type": "SaveImage",
+            "description": "Step 2A SaveImage",
+        },
+    },
+    "fields": (
+        ("csv_text", "11", "csv_text", PATCH_SET),
+        ("shot_filter", "11", "shot_filter", PATCH_SET),
+        ("custom_shot_ids", "11", "custom_shot_ids", PATCH_SET),
+        ("character_filter", "17", "character_filter", PATCH_SET),
+        ("custom_character_id", "17", "custom_character_id", PATCH_SET),
+        ("age", "17", "age", PATCH_SET),
+        ("include_character_id", "17", "include_character_id", PATCH_SET),
+        ("appearance", "19", "*", PATCH_MAPPING),
+        # PortraitMaster의 API Format에서는 UI의 "randomize" 문자열을
+        # INT seed로 변환해야 RunComfy prompt validation을 통과합니다.
+        ("seed", "19", "seed", PATCH_IF_PRESENT),
+        ("skin_details", "18", "*", PATCH_MAPPING),
+        ("seed", "18", "seed", PATCH_IF_PRESENT),
+        ("seed", "14", "seed", PATCH_IF_PRESENT),
+        ("attention_mode", "14", "attention_mode", PATCH_IF_PRESENT),
+        ("seed", "15", "seed", PATCH_SET),
+        ("filename_prefix", "16", "filename_prefix", PATCH_SET),
+    ),
+    "constants": (
+        ("11", "input_mode", "text"),
+        ("11", "csv_file", "CUSTOM"),
+    ),
+}
+
+
 def patch_face_workflow(
     workflow: dict,
     config: dict,
@@ -517,8 +4367,6 @@ def patch_face_workflow(
     사용자 UI에서 실제 선택하는 appearance field만 patch하고
     shot/weight 등의 workflow 고정값은 덮어쓰지 않습니다.
     """
-    workflow = deepcopy(workflow)
-
     storyboard_input = config.get("storyboard_input", {})
     csv_config = config.get("csvstoryboardparser", {})
     character_config = config.get("character_registry_parser", {})
@@ -557,130 +4405,47 @@ def patch_face_workflow(
         character_filter
     )
 
-    seed = random.randint(1, 4_294_967_295)
-    filename_prefix = (
-        f"character_appearance_{character_name}_{seed}"
-    )
-
-    # 11: CSVStoryboardParser
-    csv_node = _require_node(
-        workflow,
-        "11",
-        "CSVStoryboardParser",
-        "Step 2A CSVStoryboardParser",
-    )
-    csv_inputs = csv_node.setdefault("inputs", {})
-    csv_inputs["input_mode"] = "text"
-    csv_inputs["csv_file"] = "CUSTOM"
-    csv_inputs["csv_text"] = csv_text
-    csv_inputs["shot_filter"] = shot_filter
-    csv_inputs["custom_shot_ids"] = custom_shot_ids
-
-    # 17: CharacterRegistryParser
-    registry_node = _require_node(
-        workflow,
-        "17",
-        "CharacterRegistryParser",
-        "Step 2A CharacterRegistryParser",
-    )
-    registry_inputs = registry_node.setdefault("inputs", {})
-    registry_inputs["character_filter"] = character_filter
-    registry_inputs["custom_character_id"] = (
-        character_config.get("custom_character_id", "")
-    )
-    registry_inputs["age"] = character_config.get("age", 9)
-    registry_inputs["include_character_id"] = (
-        character_config.get("include_character_id", "false")
-    )
-
-    # 19: PortraitMasterBaseCharacter
-    # UI에서 실제 선택 가능한 appearance 값만 반영합니다.
-    appearance_keys = (
-        "nationality_1",
-        "body_type",
-        "eyes_color",
-        "eyes_shape",
-        "lips_color",
-        "lips_shape",
-        "facial_expression",
-        "face_shape",
-        "hair_style",
-        "hair_color",
-        "hair_length",
-    )
-
-    base_node = _require_node(
-        workflow,
-        "19",
-        "PortraitMasterBaseCharacter",
-        "Step 2A PortraitMasterBaseCharacter",
-    )
-    base_inputs = base_node.setdefault("inputs", {})
-
-    for key in appearance_keys:
-        if (
-            key in base_character_config
-            and key in base_inputs
-        ):
-            base_inputs[key] = base_character_config[key]
-
-    # PortraitMaster의 API Format에서는 UI의 "randomize" 문자열을
-    # INT seed로 변환해야 RunComfy prompt validation을 통과합니다.
-    if "seed" in base_inputs:
-        base_inputs["seed"] = seed
-
-    # 18: PortraitMasterSkinDetails
-    skin_node = _require_node(
-        workflow,
-        "18",
-        "PortraitMasterSkinDetails",
-        "Step 2A PortraitMasterSkinDetails",
-    )
-    skin_inputs = skin_node.setdefault("inputs", {})
-
-    for key, value in skin_config.items():
-        if key in skin_inputs:
-            skin_inputs[key] = value
-
-    if "seed" in skin_inputs:
-        skin_inputs["seed"] = seed
-
-    # 14: QwenVL seed / attention
-    qwen_node = _require_node(
-        workflow,
-        "14",
-        "AILab_QwenVL",
-        "Step 2A QwenVL",
+    check_storyboard_csv(
+        csv_text,
+        shot_filter=shot_filter,
+        custom_shot_ids=custom_shot_ids,
+        character_filter=character_filter,
+        custom_character_id=character_config.get("custom_character_id", ""),
     )
-    qwen_inputs = qwen_node.setdefault("inputs", {})
 
-    if "seed" in qwen_inputs:
-        qwen_inputs["seed"] = seed
-
-    if "attention_mode" in qwen_inputs:
-        qwen_inputs["attention_mode"] = "auto"
-
-    # 15: KSampler seed
-    sampler_node = _require_node(
-        workflow,
-        "15",
-        "KSampler",
-        "Step 2A KSampler",
+    seed = _resolve_seed(config)
+    filename_prefix = (
+        f"character_appearance_{character_name}_{seed}"
     )
-    sampler_node.setdefault("inputs", {})["seed"] = seed
 
-    # 16: SaveImage
-    save_node = _require_node(
+    return apply_patch_plan(
         workflow,
-        "16",
-        "SaveImage",
-        "Step 2A SaveImage",
+        FACE_PATCH_PLAN,
+        {
+            "csv_text": csv_text,
+            "shot_filter": shot_filter,
+            "custom_shot_ids": custom_shot_ids,
+            "character_filter": character_filter,
+            "custom_character_id": character_config.get(
+                "custom_character_id",
+                "",
+            ),
+            "age": character_config.get("age", 9),
+            "include_character_id": character_config.get(
+                "include_character_id",
+                "false",
+            ),
+            "appearance": {
+                key: base_character_config[key]
+                for key in FACE_APPEARANCE_KEYS
+                if key in base_character_config
+            },
+            "skin_details": skin_config,
+            "seed": seed,
+            "attention_mode": "auto",
+            "filename_prefix": filename_prefix,
+        },
     )
-    save_node.setdefault("inputs", {})[
-        "filename_prefix"
-    ] = filename_prefix
-
-    return workflow
 
 
 def run_face_generation(
@@ -690,8 +4455,28 @@ def run_face_generation(
     workflow_path: str | Path = FACE_WORKFLOW_PATH,
     poll_interval: int = 10,
     timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+    num_candidates: int = 1,
 ) -> dict:
-    base_workflow = load_workflow_api_json(workflow_path)
+    if num_candidates > 1:
+        return _run_candidates(
+            run_face_generation,
+            num_candidates,
+            seed=seed,
+            on_progress=on_progress,
+            api_key=api_key,
+            deployment_id=deployment_id,
+            config=config,
+            workflow_path=workflow_path,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+        )
+
+    if seed is not None:
+        config = {**config, "seed": seed}
+
+    base_workflow = load_workflow_template(workflow_path)
 
     workflow = patch_face_workflow(
         workflow=base_workflow,
@@ -704,11 +4489,9 @@ def run_face_generation(
         workflow=workflow,
         poll_interval=poll_interval,
         timeout_seconds=timeout_seconds,
-    )
-
-    raw_images = _extract_save_node_images(
-        result_data,
-        save_node_id="16",
+        workflow_key="face",
+        cacheable=_has_fixed_seed(config),
+        on_progress=on_progress,
     )
 
     character_filter = config.get(
@@ -723,24 +4506,11 @@ def run_face_generation(
     else:
         label_prefix = "Character Appearance"
 
-    images = []
-
-    for idx, item in enumerate(raw_images, start=1):
-        url = item.get("url") or item.get("image") or ""
-
-        if not url:
-            continue
-
-        images.append(
-            {
-                "label": f"{label_prefix} {idx}",
-                "image": url,
-                "url": url,
-                "filename": item.get("filename", ""),
-                "node_id": item.get("node_id", ""),
-                "raw": item.get("raw", {}),
-            }
-        )
+    images = build_output_images(
+        result_data,
+        save_node_id="16",
+        label=label_prefix,
+    )
 
     return {
         "request": request_data,
@@ -753,6 +4523,35 @@ def run_face_generation(
 # ======================================
 # Step 2B. Reference-based Outfit Change
 # ======================================
+BODY_PATCH_PLAN = {
+    "name": "Step 2B Outfit Change",
+    "nodes": {
+        "34": {"class_type": "LoadImageFromUrl", "description": "Image input node 34"},
+        "35": {"class_type": "LoadImageFromUrl", "description": "Image input node 35"},
+        "38": {"class_type": "LoadImageFromUrl", "description": "Image input node 38"},
+        "37": {"class_type": "LoadImageFromUrl", "description": "Image input node 37"},
+        "36": {"class_type": "LoadImageFromUrl", "description": "Image input node 36"},
+        "29": {
+            "class_type": "easy ifElse",
+            "description": "Step 2B Garment Input Mode switch",
+        },
+        "19": {"class_type": "KSampler", "description": "Step 2B KSampler"},
+        "17": {"class_type": "SaveImage", "description": "Step 2B SaveImage"},
+    },
+    "fields": (
+        ("character_image_url", "34", "image", PATCH_IMAGE),
+        # Stitch order = Top -> Bottom -> Shoes
+        ("top_reference_url", "35", "image", PATCH_IMAGE),
+        ("bottom_reference_url", "38", "image", PATCH_IMAGE),
+        ("shoes_reference_url", "37", "image", PATCH_IMAGE),
+        ("single_outfit_reference", "36", "image", PATCH_IMAGE),
+        ("use_single_outfit_reference", "29", "boolean", PATCH_SET),
+        ("seed", "19", "seed", PATCH_SET),
+        ("filename_prefix", "17", "filename_prefix", PATCH_SET),
+    ),
+}
+
+
 def patch_body_workflow(
     workflow: dict,
     config: dict,
@@ -771,8 +4570,6 @@ def patch_body_workflow(
     - 19: KSampler
     - 17: SaveImage
     """
-    workflow = deepcopy(workflow)
-
     outfit_config = config.get(
         "outfit_change",
         config.get("body_generation", config),
@@ -836,19 +4633,10 @@ def patch_body_workflow(
             f"{input_mode}"
         )
 
-    # 34: Image 1 = Source Character
-    _set_image_input(
-        workflow,
-        "34",
-        character_image_url,
-    )
-
-    branch_node = _require_node(
-        workflow,
-        "29",
-        "easy ifElse",
-        "Step 2B Garment Input Mode switch",
-    )
+    values = {
+        # 34: Image 1 = Source Character
+        "character_image_url": character_image_url,
+    }
 
     if input_mode == "Separate Garments":
         missing = [
@@ -867,26 +4655,10 @@ def patch_body_workflow(
                 + ", ".join(missing)
             )
 
-        # Stitch order = Top -> Bottom -> Shoes
-        _set_image_input(
-            workflow,
-            "35",
-            top_reference_url,
-        )
-        _set_image_input(
-            workflow,
-            "38",
-            bottom_reference_url,
-        )
-        _set_image_input(
-            workflow,
-            "37",
-            shoes_reference_url,
-        )
-
-        branch_node.setdefault("inputs", {})[
-            "boolean"
-        ] = False
+        values["top_reference_url"] = top_reference_url
+        values["bottom_reference_url"] = bottom_reference_url
+        values["shoes_reference_url"] = shoes_reference_url
+        values["use_single_outfit_reference"] = False
 
     else:
         if not single_outfit_reference:
@@ -894,40 +4666,16 @@ def patch_body_workflow(
                 "single_outfit_reference is empty."
             )
 
-        _set_image_input(
-            workflow,
-            "36",
-            single_outfit_reference,
-        )
-
-        branch_node.setdefault("inputs", {})[
-            "boolean"
-        ] = True
+        values["single_outfit_reference"] = single_outfit_reference
+        values["use_single_outfit_reference"] = True
 
-    seed = random.randint(1, 4_294_967_295)
-    filename_prefix = (
+    seed = _resolve_seed(config)
+    values["seed"] = seed
+    values["filename_prefix"] = (
         f"outfit_{character_name}_{seed}"
     )
 
-    sampler_node = _require_node(
-        workflow,
-        "19",
-        "KSampler",
-        "Step 2B KSampler",
-    )
-    sampler_node.setdefault("inputs", {})["seed"] = seed
-
-    save_node = _require_node(
-        workflow,
-        "17",
-        "SaveImage",
-        "Step 2B SaveImage",
-    )
-    save_node.setdefault("inputs", {})[
-        "filename_prefix"
-    ] = filename_prefix
-
-    return workflow
+    return apply_patch_plan(workflow, BODY_PATCH_PLAN, values)
 
 
 def run_body_generation(
@@ -937,8 +4685,28 @@ def run_body_generation(
     workflow_path: str | Path = BODY_WORKFLOW_PATH,
     poll_interval: int = 10,
     timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+    num_candidates: int = 1,
 ) -> dict:
-    base_workflow = load_workflow_api_json(workflow_path)
+    if num_candidates > 1:
+        return _run_candidates(
+            run_body_generation,
+            num_candidates,
+            seed=seed,
+            on_progress=on_progress,
+            api_key=api_key,
+            deployment_id=deployment_id,
+            config=config,
+            workflow_path=workflow_path,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+        )
+
+    if seed is not None:
+        config = {**config, "seed": seed}
+
+    base_workflow = load_workflow_template(workflow_path)
 
     workflow = patch_body_workflow(
         workflow=base_workflow,
@@ -951,11 +4719,9 @@ def run_body_generation(
         workflow=workflow,
         poll_interval=poll_interval,
         timeout_seconds=timeout_seconds,
-    )
-
-    raw_images = _extract_save_node_images(
-        result_data,
-        save_node_id="17",
+        workflow_key="body",
+        cacheable=_has_fixed_seed(config),
+        on_progress=on_progress,
     )
 
     outfit_config = config.get(
@@ -975,24 +4741,11 @@ def run_body_generation(
     else:
         label_prefix = "Outfit Reference"
 
-    images = []
-
-    for idx, item in enumerate(raw_images, start=1):
-        url = item.get("url") or item.get("image") or ""
-
-        if not url:
-            continue
-
-        images.append(
-            {
-                "label": f"{label_prefix} {idx}",
-                "image": url,
-                "url": url,
-                "filename": item.get("filename", ""),
-                "node_id": item.get("node_id", ""),
-                "raw": item.get("raw", {}),
-            }
-        )
+    images = build_output_images(
+        result_data,
+        save_node_id="17",
+        label=label_prefix,
+    )
 
     return {
         "request": request_data,
@@ -1005,6 +4758,37 @@ def run_body_generation(
 # ======================================
 # Step 3. Reference-based Scene Generation
 # ======================================
+SCENE_PATCH_PLAN = {
+    "name": "Step 3 Scene Generation",
+    "nodes": {
+        "33": {"class_type": "LoadImageFromUrl", "description": "Image input node 33"},
+        "34": {"class_type": "LoadImageFromUrl", "description": "Image input node 34"},
+        "25": {
+            "class_type": "CSVStoryboardParser",
+            "description": "Step 3 CSVStoryboardParser",
+        },
+        "31": {"class_type": "AILab_QwenVL", "description": "Step 3 QwenVL"},
+        "15": {"class_type": "RandomNoise", "description": "Step 3 RandomNoise"},
+        "32": {"class_type": "SaveImage", "description": "Step 3 SaveImage"},
+    },
+    "fields": (
+        ("boy_body_image_url", "33", "image", PATCH_IMAGE),
+        ("girl_body_image_url", "34", "image", PATCH_IMAGE),
+        ("csv_text", "25", "csv_text", PATCH_SET),
+        ("shot_filter", "25", "shot_filter", PATCH_SET),
+        ("custom_shot_ids", "25", "custom_shot_ids", PATCH_SET),
+        ("seed", "31", "seed", PATCH_IF_PRESENT),
+        ("attention_mode", "31", "attention_mode", PATCH_IF_PRESENT),
+        ("seed", "15", "noise_seed", PATCH_SET),
+        ("filename_prefix", "32", "filename_prefix", PATCH_SET),
+    ),
+    "constants": (
+        ("25", "input_mode", "text"),
+        ("25", "csv_file", "CUSTOM"),
+    ),
+}
+
+
 def patch_scene_workflow(
     workflow: dict,
     config: dict,
@@ -1027,8 +4811,6 @@ def patch_scene_workflow(
     흐름을 구성하므로 backend에서 별도의 structured JSON prompt를
     다시 조립하지 않습니다.
     """
-    workflow = deepcopy(workflow)
-
     storyboard_input = config.get(
         "storyboard_input",
         {},
@@ -1089,73 +4871,36 @@ def patch_scene_workflow(
             "Generate Image 2 - Girl outfit reference first."
         )
 
-    # 33 / 34: Character references
-    _set_image_input(
-        workflow,
-        "33",
-        boy_body_image_url,
-    )
-    _set_image_input(
-        workflow,
-        "34",
-        girl_body_image_url,
+    check_storyboard_csv(
+        csv_text,
+        shot_filter=shot_filter,
+        custom_shot_ids=custom_shot_ids,
+        # 27: ScenePromptBuilder는 patch하지 않으므로 template 값을 그대로 따릅니다.
+        description_source=(
+            workflow.get("27", {})
+            .get("inputs", {})
+            .get("description_source", "english")
+        ),
     )
 
-    # 25: CSVStoryboardParser
-    csv_node = _require_node(
-        workflow,
-        "25",
-        "CSVStoryboardParser",
-        "Step 3 CSVStoryboardParser",
-    )
-    csv_inputs = csv_node.setdefault("inputs", {})
-    csv_inputs["input_mode"] = "text"
-    csv_inputs["csv_file"] = "CUSTOM"
-    csv_inputs["csv_text"] = csv_text
-    csv_inputs["shot_filter"] = shot_filter
-    csv_inputs["custom_shot_ids"] = custom_shot_ids
-
-    seed = random.randint(1, 4_294_967_295)
+    seed = _resolve_seed(config)
     filename_prefix = f"scene_{seed}"
 
-    # 31: QwenVL
-    qwen_node = _require_node(
-        workflow,
-        "31",
-        "AILab_QwenVL",
-        "Step 3 QwenVL",
-    )
-    qwen_inputs = qwen_node.setdefault("inputs", {})
-
-    if "seed" in qwen_inputs:
-        qwen_inputs["seed"] = seed
-
-    if "attention_mode" in qwen_inputs:
-        qwen_inputs["attention_mode"] = "auto"
-
-    # 15: RandomNoise
-    noise_node = _require_node(
+    return apply_patch_plan(
         workflow,
-        "15",
-        "RandomNoise",
-        "Step 3 RandomNoise",
+        SCENE_PATCH_PLAN,
+        {
+            # 33 / 34: Character references
+            "boy_body_image_url": boy_body_image_url,
+            "girl_body_image_url": girl_body_image_url,
+            "csv_text": csv_text,
+            "shot_filter": shot_filter,
+            "custom_shot_ids": custom_shot_ids,
+            "seed": seed,
+            "attention_mode": "auto",
+            "filename_prefix": filename_prefix,
+        },
     )
-    noise_node.setdefault("inputs", {})[
-        "noise_seed"
-    ] = seed
-
-    # 32: SaveImage
-    save_node = _require_node(
-        workflow,
-        "32",
-        "SaveImage",
-        "Step 3 SaveImage",
-    )
-    save_node.setdefault("inputs", {})[
-        "filename_prefix"
-    ] = filename_prefix
-
-    return workflow
 
 
 def run_scene_generation(
@@ -1165,8 +4910,28 @@ def run_scene_generation(
     workflow_path: str | Path = SCENE_WORKFLOW_PATH,
     poll_interval: int = 10,
     timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+    num_candidates: int = 1,
 ) -> dict:
-    base_workflow = load_workflow_api_json(workflow_path)
+    if num_candidates > 1:
+        return _run_candidates(
+            run_scene_generation,
+            num_candidates,
+            seed=seed,
+            on_progress=on_progress,
+            api_key=api_key,
+            deployment_id=deployment_id,
+            config=config,
+            workflow_path=workflow_path,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+        )
+
+    if seed is not None:
+        config = {**config, "seed": seed}
+
+    base_workflow = load_workflow_template(workflow_path)
 
     workflow = patch_scene_workflow(
         workflow=base_workflow,
@@ -1179,43 +4944,280 @@ def run_scene_generation(
         workflow=workflow,
         poll_interval=poll_interval,
         timeout_seconds=timeout_seconds,
-    )
-
-    raw_images = _extract_save_node_images(
-        result_data,
-        save_node_id="32",
-    )
-
-    images = []
-
-    for idx, item in enumerate(raw_images, start=1):
-        url = item.get("url") or item.get("image") or ""
+        workflow_key="scene",
+        cacheable=_has_fixed_seed(config),
+        on_progress=on_progress,
+    )
+
+    images = build_output_images(
+        result_data,
+        save_node_id="32",
+        label="Scene",
+        shot_ids=selected_scene_shot_ids(config),
+    )
+
+    return {
+        "request": request_data,
+        "result": result_data,
+        "images": images,
+        "workflow_api_json": workflow,
+    }
+
+
+def selected_scene_shot_ids(config: dict) -> list[str]:
+    """
+    Step 3 config의 shot 선택(ALL / CUSTOM)에 해당하는 shot id 목록입니다.
+    """
+    storyboard_input = config.get("storyboard_input", {})
+    scene_config = config.get("scene_generation", {})
+
+    shot_filter = (
+        scene_config.get("shot_filter")
+        or storyboard_input.get("shot_filter", "ALL")
+    )
+    custom_shot_ids = (
+        scene_config.get("custom_shot_ids")
+        or storyboard_input.get("custom_shot_ids", "")
+    )
+
+    if shot_filter == "CUSTOM":
+        return _split_shot_ids(custom_shot_ids)
+
+    # UI / 검증 / revision diff와 같은 Storyboard model의 shot id 규칙을 사용합니다.
+    csv_text = storyboard_input.get("csv_text", "")
+    if not str(csv_text).strip():
+        return []
+
+    return parse_storyboard_text(csv_text).shot_ids
+
+
+def split_scene_shot_batches(
+    config: dict,
+    shots_per_job: int = SCENE_BATCH_SHOTS_PER_JOB,
+) -> list[list[str]]:
+    """
+    Step 3 config의 shot 선택(ALL / CUSTOM)을 shots_per_job 단위 chunk로 나눕니다.
+    """
+    shot_ids = selected_scene_shot_ids(config)
+    shots_per_job = max(1, int(shots_per_job))
+
+    return [
+        shot_ids[start:start + shots_per_job]
+        for start in range(0, len(shot_ids), shots_per_job)
+    ]
+
+
+def scene_config_for_shots(config: dict, shot_ids: list[str]) -> dict:
+    """
+    Step 3 config를 shot_ids만 생성하는 CUSTOM shot 선택으로 바꾼 사본을 반환합니다.
+    """
+    scene_config = config.get("scene_generation", {})
+
+    return {
+        **config,
+        "scene_generation": {
+            **scene_config,
+            "shot_filter": "CUSTOM",
+            "custom_shot_ids": ", ".join(shot_ids),
+        },
+    }
+
+
+def _scene_batch_images(result_data: dict, shot_ids: list[str]) -> list[dict]:
+    images = build_output_images(
+        result_data,
+        save_node_id="32",
+        label="Scene",
+        shot_ids=shot_ids,
+    )
+
+    # shot 수와 결과 이미지 수가 같으면 shot 순서대로 1:1 매칭합니다.
+    for idx, image in enumerate(images, start=1):
+        if len(images) == len(shot_ids):
+            image["label"] = f"Scene {shot_ids[idx - 1]}"
+        else:
+            image["label"] = f"Scene {shot_ids[0]} ({idx})"
+
+    return images
+
+
+def iter_scene_generation_batch(
+    api_key: str,
+    deployment_id: str,
+    config: dict,
+    workflow_path: str | Path = SCENE_WORKFLOW_PATH,
+    shots_per_job: int = SCENE_BATCH_SHOTS_PER_JOB,
+    max_concurrency: int = SCENE_BATCH_MAX_CONCURRENCY,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+):
+    """
+    선택된 shot을 shots_per_job 단위 RunComfy job으로 나누어 병렬 실행하고,
+    job이 끝나는 순서대로 batch 결과를 yield 합니다.
+
+    한 batch가 실패해도 나머지 batch는 계속 진행되며,
+    실패한 batch는 error 필드에 메시지를 담아 반환합니다.
+    """
+    base_workflow = load_workflow_template(workflow_path)
+    shot_batches = split_scene_shot_batches(config, shots_per_job)
+
+    if not shot_batches:
+        raise ValueError(
+            "No shots selected for scene generation."
+        )
+
+    # patch 오류(reference image 누락 등)는 submit 전에 바로 발생시킵니다.
+    workflows = [
+        patch_scene_workflow(
+            workflow=base_workflow,
+            config=scene_config_for_shots(config, shot_ids),
+        )
+        for shot_ids in shot_batches
+    ]
+
+    engine = get_job_engine()
+
+    def job_factory(workflow):
+        return lambda: engine.submit(
+            api_key=api_key,
+            deployment_id=deployment_id,
+            workflow=workflow,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+            workflow_key="scene",
+        )
+
+    for batch_index, job in iter_completed_jobs(
+        [job_factory(workflow) for workflow in workflows],
+        max_concurrency=max_concurrency,
+    ):
+        shot_ids = shot_batches[batch_index]
+        batch_result = {
+            "batch_index": batch_index,
+            "batch_count": len(shot_batches),
+            "shot_ids": shot_ids,
+            "request": job.request_data,
+            "result": {},
+            "images": [],
+            "workflow_api_json": workflows[batch_index],
+            "error": "",
+        }
+
+        try:
+            result_data = job.wait()
+        except Exception as e:
+            batch_result["error"] = str(e)
+        else:
+            batch_result["result"] = result_data
+            batch_result["images"] = _scene_batch_images(result_data, shot_ids)
+
+        yield batch_result
+
+
+def run_scene_generation_batch(
+    api_key: str,
+    deployment_id: str,
+    config: dict,
+    workflow_path: str | Path = SCENE_WORKFLOW_PATH,
+    shots_per_job: int = SCENE_BATCH_SHOTS_PER_JOB,
+    max_concurrency: int = SCENE_BATCH_MAX_CONCURRENCY,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+    on_progress=None,
+) -> dict:
+    """
+    on_progress가 있으면 batch가 끝날 때마다 type="stage" event를,
+    모든 batch가 끝나면 type="completed" event를 전달합니다.
+    """
+    batches = []
+
+    for batch in iter_scene_generation_batch(
+        api_key=api_key,
+        deployment_id=deployment_id,
+        config=config,
+        workflow_path=workflow_path,
+        shots_per_job=shots_per_job,
+        max_concurrency=max_concurrency,
+        poll_interval=poll_interval,
+        timeout_seconds=timeout_seconds,
+    ):
+        batches.append(batch)
+
+        if on_progress is not None:
+            on_progress(
+                {
+                    "type": "stage",
+                    "status": "in_progress",
+                    "request_id": batch["request"].get("request_id", ""),
+                    "stage": f"Shot {', '.join(batch['shot_ids'])}",
+                    "error": batch["error"],
+                    "images": batch["images"],
+                    "completed_stages": len(batches),
+                    "stage_count": batch["batch_count"],
+                }
+            )
 
-        if not url:
-            continue
+    if on_progress is not None:
+        on_progress({"type": "completed", "status": "completed"})
 
-        images.append(
-            {
-                "label": f"Scene {idx}",
-                "image": url,
-                "url": url,
-                "filename": item.get("filename", ""),
-                "node_id": item.get("node_id", ""),
-                "raw": item.get("raw", {}),
-            }
-        )
+    batches.sort(key=lambda item: item["batch_index"])
 
     return {
-        "request": request_data,
-        "result": result_data,
-        "images": images,
-        "workflow_api_json": workflow,
+        "batches": batches,
+        "images": [
+            image
+            for batch in batches
+            for image in batch["images"]
+        ],
+        "errors": [
+            {"shot_ids": batch["shot_ids"], "error": batch["error"]}
+            for batch in batches
+            if batch["error"]
+        ],
     }
 
 
 # ======================================
 # Step 4. Camera Refinement
 # ======================================
+CAMERA_REFINEMENT_PATCH_PLAN = {
+    "name": "Step 4 Camera Refinement",
+    "nodes": {
+        "26": {"class_type": "LoadImageFromUrl", "description": "Step 4 Source Scene"},
+        "27": {
+            "class_type": "QwenMultiangleCameraNode",
+            "description": "Step 4 Qwen Multiangle Camera",
+        },
+        "14": {
+            "class_type": "TextEncodeQwenImageEditPlusAdvance_lrzjason",
+            "description": "Step 4 Qwen Image Edit Text Encoder",
+        },
+        "12": {"class_type": "KSampler", "description": "Step 4 KSampler"},
+        "11": {"class_type": "SaveImage", "description": "Step 4 SaveImage"},
+    },
+    "fields": (
+        ("scene_image_url", "26", "image", PATCH_IMAGE),
+        # LoadImageFromUrl 구현에 따라 image/url 어느 입력을 참조하더라도
+        # 동일한 source scene을 사용하도록 둘 다 설정합니다.
+        ("scene_image_url", "26", "url", PATCH_IF_PRESENT),
+        ("horizontal_angle", "27", "horizontal_angle", PATCH_SET),
+        ("vertical_angle", "27", "vertical_angle", PATCH_SET),
+        ("zoom", "27", "zoom", PATCH_SET),
+        ("default_prompts", "27", "default_prompts", PATCH_SET),
+        ("camera_view", "27", "camera_view", PATCH_SET),
+        # 12: workflow의 고정 sampling 설정은 유지하고 seed만 변경
+        ("seed", "12", "seed", PATCH_SET),
+        ("filename_prefix", "11", "filename_prefix", PATCH_SET),
+    ),
+    "constants": (
+        ("27", "image", ["26", 0]),
+        # 14: 기존 연결을 명시적으로 유지
+        ("14", "prompt", ["27", 0]),
+        ("14", "vl_resize_image1", ["26", 0]),
+    ),
+}
+
+
 def patch_camera_refinement_workflow(
     workflow: dict,
     config: dict,
@@ -1232,8 +5234,6 @@ def patch_camera_refinement_workflow(
     QwenMultiangleCameraNode는 workflow JSON에 이미 존재하므로
     backend에서 새 노드를 생성하지 않고 기존 27번 노드의 입력값만 수정합니다.
     """
-    workflow = deepcopy(workflow)
-
     camera_config = config.get(
         "camera_angle_refinement",
         {},
@@ -1290,76 +5290,23 @@ def patch_camera_refinement_workflow(
         )
     )
 
-    seed = random.randint(1, 4_294_967_295)
+    seed = _resolve_seed(config)
     filename_prefix = f"camera_refined_{seed}"
 
-    # 26: Source Scene URL
-    _set_image_input(
-        workflow,
-        "26",
-        scene_image_url,
-    )
-
-    # LoadImageFromUrl 구현에 따라 image/url 어느 입력을 참조하더라도
-    # 동일한 source scene을 사용하도록 둘 다 설정합니다.
-    source_node = _require_node(
-        workflow,
-        "26",
-        "LoadImageFromUrl",
-        "Step 4 Source Scene",
-    )
-    source_inputs = source_node.setdefault("inputs", {})
-    source_inputs["image"] = scene_image_url
-    if "url" in source_inputs:
-        source_inputs["url"] = scene_image_url
-
-    # 27: 기존 Qwen Multiangle Camera 노드 값만 patch
-    camera_node = _require_node(
-        workflow,
-        "27",
-        "QwenMultiangleCameraNode",
-        "Step 4 Qwen Multiangle Camera",
-    )
-    camera_inputs = camera_node.setdefault("inputs", {})
-    camera_inputs["horizontal_angle"] = horizontal_angle
-    camera_inputs["vertical_angle"] = vertical_angle
-    camera_inputs["zoom"] = zoom
-    camera_inputs["default_prompts"] = default_prompts
-    camera_inputs["camera_view"] = camera_view
-    camera_inputs["image"] = ["26", 0]
-
-    # 14: 기존 연결을 명시적으로 유지
-    encode_node = _require_node(
-        workflow,
-        "14",
-        "TextEncodeQwenImageEditPlusAdvance_lrzjason",
-        "Step 4 Qwen Image Edit Text Encoder",
-    )
-    encode_inputs = encode_node.setdefault("inputs", {})
-    encode_inputs["prompt"] = ["27", 0]
-    encode_inputs["vl_resize_image1"] = ["26", 0]
-
-    # 12: workflow의 고정 sampling 설정은 유지하고 seed만 변경
-    sampler_node = _require_node(
-        workflow,
-        "12",
-        "KSampler",
-        "Step 4 KSampler",
-    )
-    sampler_node.setdefault("inputs", {})["seed"] = seed
-
-    # 11: SaveImage
-    save_node = _require_node(
+    return apply_patch_plan(
         workflow,
-        "11",
-        "SaveImage",
-        "Step 4 SaveImage",
+        CAMERA_REFINEMENT_PATCH_PLAN,
+        {
+            "scene_image_url": scene_image_url,
+            "horizontal_angle": horizontal_angle,
+            "vertical_angle": vertical_angle,
+            "zoom": zoom,
+            "default_prompts": default_prompts,
+            "camera_view": camera_view,
+            "seed": seed,
+            "filename_prefix": filename_prefix,
+        },
     )
-    save_node.setdefault("inputs", {})[
-        "filename_prefix"
-    ] = filename_prefix
-
-    return workflow
 
 
 def run_camera_refinement(
@@ -1369,8 +5316,28 @@ def run_camera_refinement(
     workflow_path: str | Path = CAMERA_REFINEMENT_WORKFLOW_PATH,
     poll_interval: int = 10,
     timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+    num_candidates: int = 1,
 ) -> dict:
-    base_workflow = load_workflow_api_json(workflow_path)
+    if num_candidates > 1:
+        return _run_candidates(
+            run_camera_refinement,
+            num_candidates,
+            seed=seed,
+            on_progress=on_progress,
+            api_key=api_key,
+            deployment_id=deployment_id,
+            config=config,
+            workflow_path=workflow_path,
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+        )
+
+    if seed is not None:
+        config = {**config, "seed": seed}
+
+    base_workflow = load_workflow_template(workflow_path)
 
     workflow = patch_camera_refinement_workflow(
         workflow=base_workflow,
@@ -1383,35 +5350,996 @@ def run_camera_refinement(
         workflow=workflow,
         poll_interval=poll_interval,
         timeout_seconds=timeout_seconds,
+        workflow_key="camera",
+        cacheable=_has_fixed_seed(config),
+        on_progress=on_progress,
+    )
+
+    # 입력 scene의 shot id를 이어받아 storyboard 수정 시 함께 무효화되게 합니다.
+    source_shot_ids = (
+        config.get("camera_angle_refinement", {})
+        .get("input_scene", {})
+        .get("shot_ids", [])
     )
 
-    raw_images = _extract_save_node_images(
+    images = build_output_images(
         result_data,
         save_node_id="11",
+        label="Camera Refined Scene",
     )
+    for image in images:
+        image["shot_ids"] = list(source_shot_ids)
 
-    images = []
+    return {
+        "request": request_data,
+        "result": result_data,
+        "images": images,
+        "workflow_api_json": workflow,
+    }
 
-    for idx, item in enumerate(raw_images, start=1):
-        url = item.get("url") or item.get("image") or ""
 
-        if not url:
-            continue
+def camera_sweep_poses(
+    horizontal_angles: list[int],
+    vertical_angles: list[int] = (0,),
+    zooms: list[float] = (5,),
+) -> list[dict]:
+    """
+    horizontal / vertical / zoom 값 목록의 모든 조합을 camera pose 목록으로 만듭니다.
+    """
+    return [
+        {
+            "horizontal_angle": int(horizontal_angle),
+            "vertical_angle": int(vertical_angle),
+            "zoom": float(zoom),
+        }
+        for vertical_angle, zoom, horizontal_angle in itertools.product(
+            vertical_angles,
+            zooms,
+            horizontal_angles,
+        )
+    ]
+
+
+def _camera_pose_label(index: int, pose: dict) -> str:
+    return (
+        f"Pose {index + 1} · H {pose['horizontal_angle']}° · "
+        f"V {pose['vertical_angle']}° · Zoom {pose['zoom']:g}"
+    )
+
+
+def _shareable_source_image_url(image_url: str) -> str:
+    """
+    source scene이 data URI이면 reference asset store에 한 번만 저장하고 짧은 URL을 반환합니다.
+    store에 public URL이 없으면 원래 값을 그대로 사용합니다.
+    """
+    if not image_url.startswith("data:"):
+        return image_url
+
+    asset_store = get_reference_asset_store()
+    if not asset_store.enabled:
+        return image_url
+
+    header, _, encoded = image_url.partition(",")
+    mime_type = header[len("data:"):].split(";")[0] or "image/png"
 
-        images.append(
+    return asset_store.put(base64.b64decode(encoded), mime_type)["url"]
+
+
+def iter_camera_angle_sweep(
+    api_key: str,
+    deployment_id: str,
+    config: dict,
+    poses: list[dict],
+    workflow_path: str | Path = CAMERA_REFINEMENT_WORKFLOW_PATH,
+    max_concurrency: int = CAMERA_SWEEP_MAX_CONCURRENCY,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+):
+    """
+    하나의 source scene에 대해 poses의 camera pose를 동시에 실행하고,
+    job이 끝나는 순서대로 pose 결과를 yield 합니다.
+    pose마다 _run_workflow를 거치므로 단일 refinement와 같이 결과 cache / coalescing을 사용하고,
+    on_progress에는 pose job의 progress event를 pose_index와 함께 호출한 thread에서 전달합니다.
+
+    source scene과 sampling 설정은 한 번만 patch한 workflow를 공유하고,
+    pose마다 27번 camera node와 SaveImage prefix만 copy-on-write로 바꿉니다.
+    모든 pose는 같은 seed를 사용하므로 contact sheet에서 camera 차이만 비교할 수 있습니다.
+    """
+    if not poses:
+        raise ValueError("No camera poses given for the sweep.")
+
+    if seed is not None:
+        config = {**config, "seed": seed}
+
+    camera_config = config.get("camera_angle_refinement", {})
+    input_scene = camera_config.get("input_scene", {})
+    # run_camera_refinement와 같이 입력 scene의 shot id를 이어받아 storyboard 수정 시 함께 무효화되게 합니다.
+    source_shot_ids = list(input_scene.get("shot_ids", []))
+    scene_image_url = _shareable_source_image_url(
+        str(
+            input_scene.get("image")
+            or camera_config.get("scene_image_url")
+            or ""
+        ).strip()
+    )
+    sweep_seed = _resolve_seed(config)
+
+    base_workflow = patch_camera_refinement_workflow(
+        workflow=load_workflow_template(workflow_path),
+        config={
+            **config,
+            "seed": sweep_seed,
+            "camera_angle_refinement": {
+                **camera_config,
+                "input_scene": {**input_scene, "image": scene_image_url},
+            },
+        },
+    )
+
+    workflows = [
+        apply_patch_plan(
+            base_workflow,
+            CAMERA_REFINEMENT_PATCH_PLAN,
             {
-                "label": f"Camera Refined Scene {idx}",
-                "image": url,
-                "url": url,
-                "filename": item.get("filename", ""),
-                "node_id": item.get("node_id", ""),
-                "raw": item.get("raw", {}),
-            }
+                "horizontal_angle": int(pose.get("horizontal_angle", 0)),
+                "vertical_angle": int(pose.get("vertical_angle", 0)),
+                "zoom": float(pose.get("zoom", 5)),
+                "filename_prefix": f"camera_sweep_{sweep_seed}_{index + 1}",
+            },
+        )
+        for index, pose in enumerate(poses)
+    ]
+
+    events: queue.Queue = queue.Queue()
+
+    def forward_events(pose_index: int):
+        def forward(event: dict) -> None:
+            if event.get("type") not in ("completed", "cached"):
+                events.put({**event, "pose_index": pose_index})
+
+        return forward
+
+    def run_pose(pose_index: int) -> tuple[dict, dict]:
+        # 단일 refinement와 같이 고정 seed면 결과 cache를, 아니면 같은 session 안에서만 coalescing을 사용합니다.
+        return _run_workflow(
+            api_key=api_key,
+            deployment_id=deployment_id,
+            workflow=workflows[pose_index],
+            poll_interval=poll_interval,
+            timeout_seconds=timeout_seconds,
+            workflow_key="camera",
+            cacheable=_has_fixed_seed(config),
+            on_progress=forward_events(pose_index) if on_progress is not None else None,
         )
 
+    def drain_events() -> None:
+        try:
+            while True:
+                event = events.get_nowait()
+                if on_progress is not None:
+                    on_progress(event)
+        except queue.Empty:
+            pass
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, int(max_concurrency)),
+        thread_name_prefix="runcomfy-camera-sweep",
+    ) as executor:
+        pending = {
+            executor.submit(contextvars.copy_context().run, run_pose, pose_index): pose_index
+            for pose_index in range(len(poses))
+        }
+
+        while pending:
+            done, _not_done = concurrent.futures.wait(
+                pending,
+                timeout=0.5,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            # 끝난 pose의 event는 pose 결과보다 먼저 전달합니다.
+            drain_events()
+
+            for future in done:
+                pose_index = pending.pop(future)
+                pose = poses[pose_index]
+                pose_result = {
+                    "index": pose_index,
+                    "pose_count": len(poses),
+                    "pose": pose,
+                    "label": _camera_pose_label(pose_index, pose),
+                    "request": {},
+                    "result": {},
+                    "images": [],
+                    "workflow_api_json": workflows[pose_index],
+                    "error": "",
+                }
+
+                try:
+                    request_data, result_data = future.result()
+                except RunComfyCancelledError:
+                    raise
+                except Exception as e:
+                    pose_result["error"] = str(e)
+                else:
+                    pose_result["request"] = request_data
+                    pose_result["result"] = result_data
+                    pose_result["images"] = [
+                        {
+                            **item,
+                            "label": pose_result["label"],
+                            "pose_index": pose_index,
+                            "pose": pose,
+                            "shot_ids": list(source_shot_ids),
+                        }
+                        for item in OutputImageIndex(result_data).node_images("11")
+                    ]
+
+                yield pose_result
+
+
+def run_camera_angle_sweep(
+    api_key: str,
+    deployment_id: str,
+    config: dict,
+    poses: list[dict],
+    workflow_path: str | Path = CAMERA_REFINEMENT_WORKFLOW_PATH,
+    max_concurrency: int = CAMERA_SWEEP_MAX_CONCURRENCY,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+    seed: int | None = None,
+    on_progress=None,
+) -> dict:
+    """
+    iter_camera_angle_sweep 결과를 pose 순서의 contact sheet로 모아 반환합니다.
+
+    - sheet: pose index 순서의 {index, pose, label, image, error, shot_ids}
+    - images: 성공한 pose 이미지 (기존 camera 후보 목록과 같은 구조)
+
+    on_progress가 있으면 pose가 끝날 때마다 type="stage" event를,
+    모든 pose가 끝나면 type="completed" event를 전달합니다.
+    """
+    pose_results = []
+
+    for pose_result in iter_camera_angle_sweep(
+        api_key=api_key,
+        deployment_id=deployment_id,
+        config=config,
+        poses=poses,
+        workflow_path=workflow_path,
+        max_concurrency=max_concurrency,
+        poll_interval=poll_interval,
+        timeout_seconds=timeout_seconds,
+        seed=seed,
+        on_progress=on_progress,
+    ):
+        pose_results.append(pose_result)
+
+        if on_progress is not None:
+            on_progress(
+                {
+                    "type": "stage",
+                    "status": "in_progress",
+                    "request_id": pose_result["request"].get("request_id", ""),
+                    "stage": pose_result["label"],
+                    "error": pose_result["error"],
+                    "images": pose_result["images"],
+                    "completed_stages": len(pose_results),
+                    "stage_count": pose_result["pose_count"],
+                }
+            )
+
+    if on_progress is not None:
+        on_progress({"type": "completed", "status": "completed"})
+
+    pose_results.sort(key=lambda item: item["index"])
+    source_shot_ids = (
+        config.get("camera_angle_refinement", {})
+        .get("input_scene", {})
+        .get("shot_ids", [])
+    )
+
     return {
-        "request": request_data,
-        "result": result_data,
-        "images": images,
-        "workflow_api_json": workflow,
+        "poses": pose_results,
+        "sheet": [
+            {
+                "index": item["index"],
+                "pose": item["pose"],
+                "label": item["label"],
+                "image": item["images"][0]["image"] if item["images"] else "",
+                "error": item["error"],
+                "shot_ids": list(source_shot_ids),
+            }
+            for item in pose_results
+        ],
+        "images": [
+            image
+            for item in pose_results
+            for image in item["images"]
+        ],
+    }
+
+
+# ======================================
+# Pipeline DAG runner
+# ======================================
+class PipelineStage:
+    """
+    pipeline DAG의 노드 하나입니다.
+
+    run(upstream)은 depends_on stage들의 결과를 {stage name: result} dict로 받아
+    이 stage의 결과 dict를 반환합니다.
+    """
+
+    def __init__(self, name: str, run, depends_on: tuple[str, ...] = ()):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+
+
+def iter_pipeline(
+    stages: list[PipelineStage],
+    max_concurrency: int = PIPELINE_MAX_CONCURRENCY,
+):
+    """
+    의존 stage가 모두 끝난 stage부터 최대 max_concurrency개까지 동시에 실행하고,
+    끝나는 순서대로 {"stage", "result", "error"} dict를 yield 합니다.
+    upstream stage가 실패하면 downstream stage는 실행하지 않고 error로 보고합니다.
+    """
+    stages_by_name = {stage.name: stage for stage in stages}
+
+    for stage in stages:
+        missing = [name for name in stage.depends_on if name not in stages_by_name]
+        if missing:
+            raise ValueError(
+                f"Pipeline stage '{stage.name}' depends on unknown stages: {missing}"
+            )
+
+    results: dict[str, dict] = {}
+    failed: set[str] = set()
+    pending = list(stages)
+    in_flight: dict[concurrent.futures.Future, PipelineStage] = {}
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, int(max_concurrency)),
+        thread_name_prefix="pipeline-stage",
+    ) as executor:
+        while pending or in_flight:
+            for stage in list(pending):
+                if any(name in failed for name in stage.depends_on):
+                    pending.remove(stage)
+                    failed.add(stage.name)
+                    yield {
+                        "stage": stage.name,
+                        "result": None,
+                        "error": "Skipped because an upstream stage failed.",
+                    }
+
+                elif all(name in results for name in stage.depends_on):
+                    pending.remove(stage)
+                    upstream = {name: results[name] for name in stage.depends_on}
+                    in_flight[
+                        executor.submit(
+                            contextvars.copy_context().run,
+                            stage.run,
+                            upstream,
+                        )
+                    ] = stage
+
+            if not in_flight:
+                if pending:
+                    raise ValueError(
+                        "Pipeline has a dependency cycle: "
+                        f"{[stage.name for stage in pending]}"
+                    )
+                break
+
+            done, _not_done = concurrent.futures.wait(
+                in_flight,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+
+            for future in done:
+                stage = in_flight.pop(future)
+
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    failed.add(stage.name)
+                    yield {"stage": stage.name, "result": None, "error": str(e)}
+                else:
+                    yield {
+                        "stage": stage.name,
+                        "result": results[stage.name],
+                        "error": "",
+                    }
+
+
+def _first_result_image(result: dict) -> dict:
+    images = result.get("images", [])
+
+    if not images:
+        raise RuntimeError("Upstream stage finished without result images.")
+
+    return images[0]
+
+
+def build_storyboard_pipeline(
+    api_key: str,
+    deployment_id: str,
+    face_configs: dict[str, dict],
+    body_configs: dict[str, dict],
+    scene_config: dict,
+    camera_config: dict | None = None,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+) -> list[PipelineStage]:
+    """
+    Step 2A → 2B → 3 → 4를 DAG로 연결합니다.
+
+    - face_c1 → body_c1, face_c2 → body_c2 (Boy/Girl 두 갈래는 병렬 실행)
+    - body_c1 + body_c2 → scene
+    - scene → camera (camera_config가 있을 때만, 첫 번째 scene을 입력으로 사용)
+
+    face_configs / body_configs는 {"c1": config, "c2": config} 형태이며,
+    body / scene / camera config의 입력 이미지는 upstream 결과로 채워집니다.
+    poll_interval / timeout_seconds는 모든 stage에 같은 값으로 적용됩니다.
+    """
+    stages = []
+    run_options = {
+        "api_key": api_key,
+        "deployment_id": deployment_id,
+        "poll_interval": poll_interval,
+        "timeout_seconds": timeout_seconds,
     }
+
+    for character_code in ("c1", "c2"):
+        face_stage = f"face_{character_code}"
+        body_stage = f"body_{character_code}"
+
+        def run_face(upstream, config=face_configs[character_code]):
+            return run_face_generation(config=config, **run_options)
+
+        def run_body(
+            upstream,
+            config=body_configs[character_code],
+            face_stage=face_stage,
+        ):
+            face_image = _first_result_image(upstream[face_stage])
+            outfit_change = {
+                **config.get("outfit_change", {}),
+                "character_image_url": face_image["image"],
+                "character_filename": face_image.get("filename", ""),
+            }
+
+            return run_body_generation(
+                config={**config, "outfit_change": outfit_change},
+                **run_options,
+            )
+
+        stages.append(PipelineStage(face_stage, run_face))
+        stages.append(PipelineStage(body_stage, run_body, depends_on=(face_stage,)))
+
+    def run_scene(upstream):
+        generation = scene_config.get("scene_generation", {})
+        reference_images = dict(generation.get("reference_images", {}))
+
+        for reference_key, body_stage in (
+            ("image_1_boy_body", "body_c1"),
+            ("image_2_girl_body", "body_c2"),
+        ):
+            body_image = _first_result_image(upstream[body_stage])
+            reference_images[reference_key] = {
+                **reference_images.get(reference_key, {}),
+                "image": body_image["image"],
+                "filename": body_image.get("filename", ""),
+            }
+
+        return run_scene_generation(
+            **run_options,
+            config={
+                **scene_config,
+                "scene_generation": {
+                    **generation,
+                    "reference_images": reference_images,
+                },
+            },
+        )
+
+    stages.append(PipelineStage("scene", run_scene, depends_on=("body_c1", "body_c2")))
+
+    if camera_config is not None:
+        def run_camera(upstream):
+            scene_image = _first_result_image(upstream["scene"])
+            refinement = camera_config.get("camera_angle_refinement", {})
+
+            return run_camera_refinement(
+                **run_options,
+                config={
+                    **camera_config,
+                    "camera_angle_refinement": {
+                        **refinement,
+                        "input_scene": {
+                            "label": scene_image.get("label", ""),
+                            "image": scene_image["image"],
+                            "filename": scene_image.get("filename", ""),
+                            "shot_ids": scene_image.get("shot_ids", []),
+                        },
+                    },
+                },
+            )
+
+        stages.append(PipelineStage("camera", run_camera, depends_on=("scene",)))
+
+    return stages
+
+
+def run_storyboard_pipeline(
+    api_key: str,
+    deployment_id: str,
+    face_configs: dict[str, dict],
+    body_configs: dict[str, dict],
+    scene_config: dict,
+    camera_config: dict | None = None,
+    max_concurrency: int = PIPELINE_MAX_CONCURRENCY,
+    poll_interval: int = 10,
+    timeout_seconds: int = 1800,
+    on_progress=None,
+) -> dict:
+    """
+    on_progress가 있으면 stage가 끝날 때마다 type="stage" event를,
+    모든 stage가 끝나면 type="completed" event를 전달합니다.
+    """
+    stages = build_storyboard_pipeline(
+        api_key=api_key,
+        deployment_id=deployment_id,
+        face_configs=face_configs,
+        body_configs=body_configs,
+        scene_config=scene_config,
+        camera_config=camera_config,
+        poll_interval=poll_interval,
+        timeout_seconds=timeout_seconds,
+    )
+
+    results = {}
+    errors = {}
+
+    for item in iter_pipeline(stages, max_concurrency=max_concurrency):
+        if item["error"]:
+            errors[item["stage"]] = item["error"]
+        else:
+            results[item["stage"]] = item["result"]
+
+        if on_progress is not None:
+            on_progress(
+                {
+                    "type": "stage",
+                    "status": "in_progress",
+                    "stage": item["stage"],
+                    "error": item["error"],
+                    "images": (item["result"] or {}).get("images", []),
+                    "completed_stages": len(results) + len(errors),
+                    "stage_count": len(stages),
+                }
+            )
+
+    if on_progress is not None:
+        on_progress({"type": "completed", "status": "completed"})
+
+    return {"results": results, "errors": errors}
+
+
+# ======================================
+# Image store
+# ======================================
+class ImageStore:
+    """
+    RunComfy / CDN 결과 이미지를 한 번만 내려받아 local disk에 mirror하고,
+    preview용 WebP thumbnail을 생성합니다.
+
+    - originals/<sha256(url)>.<ext>: 원본 이미지
+    - thumbs/<sha256(url)>_<max_size>.webp: preview thumbnail
+    - 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제
+      (시작할 때 한 번 directory를 읽고 이후에는 memory index로 크기 / 사용 순서를 추적)
+
+    다운로드나 변환에 실패하면 None을 반환하므로
+    호출부는 원격 URL을 그대로 사용하면 됩니다.
+    화면 render 중에는 cached_thumbnail()로 이미 만든 파일만 쓰고,
+    없는 파일은 background worker에서 만들어 다음 rerun부터 사용합니다.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = IMAGE_STORE_DIR,
+        static_url: str = IMAGE_STORE_STATIC_URL,
+        max_bytes: int = IMAGE_STORE_MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.static_url = static_url.rstrip("/")
+        self.max_bytes = max_bytes
+
+        self._originals_dir = self.directory / "originals"
+        self._thumbs_dir = self.directory / "thumbs"
+        self._originals_dir.mkdir(parents=True, exist_ok=True)
+        self._thumbs_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # key -> (lock, 사용 중인 thread 수). 마지막 thread가 놓으면 삭제합니다.
+        self._key_locks: dict[str, tuple[threading.Lock, int]] = {}
+        self._failed_at: dict[str, float] = {}
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=IMAGE_STORE_WORKERS,
+            thread_name_prefix="image-store",
+        )
+        self._pending: set[tuple[str, int]] = set()
+
+        # path -> size. 앞쪽이 가장 오래 사용하지 않은 파일입니다.
+        self._files: OrderedDict[Path, int] = OrderedDict()
+        self._total_bytes = 0
+        self._scan()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _suffix(url: str) -> str:
+        suffix = Path(url.split("?")[0]).suffix.lower()
+        return suffix if suffix in {".png", ".jpg", ".jpeg", ".webp"} else ".img"
+
+    @contextlib.contextmanager
+    def _key_lock(self, key: str):
+        with self._lock:
+            lock, users = self._key_locks.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._key_locks[key] = (lock, users + 1)
+
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._key_locks[key]
+                if users == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+    def _scan(self) -> None:
+        files = []
+
+        for directory in (self._originals_dir, self._thumbs_dir):
+            for path in directory.iterdir():
+                if path.suffix == ".tmp":
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        with self._lock:
+            for _mtime, size, path in sorted(files):
+                self._files[path] = size
+                self._total_bytes += size
+
+    def _record(self, path: Path) -> None:
+        """
+        파일을 가장 최근에 사용한 것으로 index에 기록합니다.
+        """
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            self._total_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+
+    def _recently_failed(self, url: str) -> bool:
+        with self._lock:
+            failed_at = self._failed_at.get(url)
+            return (
+                failed_at is not None
+                and time.time() - failed_at < IMAGE_STORE_RETRY_SECONDS
+            )
+
+    def _record_failure(self, url: str) -> None:
+        now = time.time()
+
+        with self._lock:
+            # 재시도 시간이 지난 실패 기록은 버려 map이 계속 커지지 않게 합니다.
+            self._failed_at = {
+                failed_url: failed_at
+                for failed_url, failed_at in self._failed_at.items()
+                if now - failed_at < IMAGE_STORE_RETRY_SECONDS
+            }
+            self._failed_at[url] = now
+
+    def _touch(self, path: Path) -> Path:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return path
+
+        self._record(path)
+        return path
+
+    def mirror(self, url: str) -> Path | None:
+        """
+        원격 이미지를 local 원본 파일로 저장하고 경로를 반환합니다.
+        """
+        if not isinstance(url, str) or not url.lower().startswith(("http://", "https://")):
+            return None
+
+        if self._recently_failed(url):
+            return None
+
+        key = self._key(url)
+        path = self._originals_dir / f"{key}{self._suffix(url)}"
+
+        if path.exists():
+            return self._touch(path)
+
+        with self._key_lock(key):
+            if path.exists():
+                return self._touch(path)
+
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+
+            try:
+                with get_http_session().get(
+                    url,
+                    stream=True,
+                    timeout=HTTP_TIMEOUT_SECONDS,
+                ) as response:
+                    response.raise_for_status()
+
+                    with tmp_path.open("wb") as f:
+                        for chunk in response.iter_content(chunk_size=256 * 1024):
+                            f.write(chunk)
+
+                os.replace(tmp_path, path)
+
+            except (requests.RequestException, OSError):
+                tmp_path.unlink(missing_ok=True)
+                self._record_failure(url)
+                return None
+
+        self._record(path)
+        self._evict()
+        return path
+
+    def thumbnail(self, url: str, max_size: int = 768) -> Path | None:
+        """
+        긴 변 기준 max_size 이하의 WebP thumbnail 경로를 반환합니다.
+        Pillow가 없으면 원본 mirror 경로를 반환합니다.
+        thumbnail이 이미 있으면 원본이 evict되었어도 다시 내려받지 않습니다.
+        """
+        if Image is None:
+            return self.mirror(url)
+
+        key = self._key(url)
+        thumb_path = self._thumb_path(url, max_size)
+
+        if thumb_path.exists():
+            return self._touch(thumb_path)
+
+        original_path = self.mirror(url)
+
+        if original_path is None:
+            return None
+
+        with self._key_lock(key):
+            if thumb_path.exists():
+                return self._touch(thumb_path)
+
+            tmp_path = thumb_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+
+            try:
+                with Image.open(original_path) as image:
+                    image.thumbnail((max_size, max_size))
+                    if image.mode not in ("RGB", "RGBA"):
+                        image = image.convert("RGBA")
+                    image.save(
+                        tmp_path,
+                        format="WEBP",
+                        quality=IMAGE_STORE_THUMBNAIL_QUALITY,
+                    )
+
+                os.replace(tmp_path, thumb_path)
+
+            except OSError:
+                tmp_path.unlink(missing_ok=True)
+                return original_path
+
+        self._record(thumb_path)
+        self._evict()
+        return thumb_path
+
+    def _thumb_path(self, url: str, max_size: int) -> Path:
+        return self._thumbs_dir / f"{self._key(url)}_{int(max_size)}.webp"
+
+    def cached_thumbnail(self, url: str, max_size: int = 768) -> Path | None:
+        """
+        이미 만든 thumbnail(Pillow가 없으면 원본) 경로를 바로 반환합니다.
+        없으면 background worker에서 만들도록 예약하고 None을 반환합니다.
+        """
+        if not isinstance(url, str) or not url.lower().startswith(("http://", "https://")):
+            return None
+
+        if Image is None:
+            path = self._originals_dir / f"{self._key(url)}{self._suffix(url)}"
+        else:
+            path = self._thumb_path(url, max_size)
+
+        if path.exists():
+            return self._touch(path)
+
+        if self._recently_failed(url):
+            return None
+
+        pending_key = (url, int(max_size))
+
+        with self._lock:
+            if pending_key in self._pending:
+                return None
+            self._pending.add(pending_key)
+
+        def build() -> None:
+            try:
+                self.thumbnail(url, max_size=max_size)
+            finally:
+                with self._lock:
+                    self._pending.discard(pending_key)
+
+        self._executor.submit(build)
+        return None
+
+    def static_url_for(self, path: Path) -> str:
+        relative_path = path.relative_to(self.directory).as_posix()
+        return f"{self.static_url}/{relative_path}"
+
+    def preview_url(self, url: str, max_size: int = 768) -> str:
+        """
+        HTML <img src>에 넣을 local static URL을 반환합니다.
+        local 파일이 아직 없으면 원래 URL을 반환하고 thumbnail은 background에서 만듭니다.
+        """
+        path = self.cached_thumbnail(url, max_size=max_size)
+        return self.static_url_for(path) if path is not None else url
+
+    def _evict(self) -> None:
+        with self._lock:
+            while self._files and self._total_bytes > self.max_bytes:
+                path, size = self._files.popitem(last=False)
+                path.unlink(missing_ok=True)
+                self._total_bytes -= size
+
+
+_IMAGE_STORE: ImageStore | None = None
+_IMAGE_STORE_LOCK = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    global _IMAGE_STORE
+
+    with _IMAGE_STORE_LOCK:
+        if _IMAGE_STORE is None:
+            _IMAGE_STORE = ImageStore()
+
+        return _IMAGE_STORE
+
+
+# ======================================
+# Reference asset store
+# ======================================
+class ReferenceAssetStore:
+    """
+    업로드된 reference 이미지를 sha256 content hash 파일명으로 한 번만 저장하고,
+    LoadImageFromUrl 노드에 넣을 짧은 URL을 반환합니다.
+
+    같은 이미지를 다시 업로드하거나 같은 garment로 재실행해도
+    파일은 다시 쓰지 않고 workflow JSON에는 URL만 들어갑니다.
+    public_base_url이 없으면 RunComfy가 파일에 접근할 수 없으므로 url은 빈 문자열입니다.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = REFERENCE_ASSET_DIR,
+        public_base_url: str = "",
+        static_path: str = REFERENCE_ASSET_STATIC_PATH,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.public_base_url = str(public_base_url or "").rstrip("/")
+        self.static_path = static_path.strip("/")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.public_base_url)
+
+    def url_for(self, filename: str) -> str:
+        if not self.enabled:
+            return ""
+
+        return f"{self.public_base_url}/{self.static_path}/{filename}"
+
+    def put(self, raw: bytes, mime_type: str = "image/png") -> dict:
+        digest = hashlib.sha256(raw).hexdigest()
+        extension = REFERENCE_ASSET_EXTENSIONS.get(
+            str(mime_type or "").lower(),
+            ".png",
+        )
+        filename = f"{digest}{extension}"
+        path = self.directory / filename
+
+        if not path.exists():
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, path)
+
+        return {
+            "sha256": digest,
+            "filename": filename,
+            "path": path,
+            "url": self.url_for(filename),
+        }
+
+
+_REFERENCE_ASSET_STORE: ReferenceAssetStore | None = None
+
+
+def configure_reference_asset_store(
+    public_base_url: str = "",
+    directory: str | Path = REFERENCE_ASSET_DIR,
+) -> ReferenceAssetStore:
+    global _REFERENCE_ASSET_STORE
+
+    _REFERENCE_ASSET_STORE = ReferenceAssetStore(
+        directory=directory,
+        public_base_url=public_base_url,
+    )
+
+    return _REFERENCE_ASSET_STORE
+
+
+def get_reference_asset_store() -> ReferenceAssetStore:
+    global _REFERENCE_ASSET_STORE
+
+    if _REFERENCE_ASSET_STORE is None:
+        _REFERENCE_ASSET_STORE = ReferenceAssetStore()
+
+    return _REFERENCE_ASSET_STORE
+
+
+# ======================================
+# Workflow template validation
+# ======================================
+WORKFLOW_PATCH_PLANS = {
+    "csv_parser_test": (CSV_PARSER_TEST_WORKFLOW_PATH, CSV_PARSER_TEST_PATCH_PLAN),
+    "face": (FACE_WORKFLOW_PATH, FACE_PATCH_PLAN),
+    "body": (BODY_WORKFLOW_PATH, BODY_PATCH_PLAN),
+    "scene": (SCENE_WORKFLOW_PATH, SCENE_PATCH_PLAN),
+    "camera": (CAMERA_REFINEMENT_WORKFLOW_PATH, CAMERA_REFINEMENT_PATCH_PLAN),
+}
+
+
+def validate_workflow_templates() -> dict[str, str]:
+    """
+    모든 기본 workflow template에 대해 patch plan을 미리 컴파일합니다.
+
+    template의 node id / class_type이 patch plan과 어긋나면
+    요청 처리 중이 아니라 앱 시작 시점에 발견할 수 있습니다.
+    반환값은 workflow_key -> 오류 메시지이며, 문제가 없으면 빈 dict입니다.
+    """
+    errors = {}
+
+    for workflow_key, (workflow_path, plan) in WORKFLOW_PATCH_PLANS.items():
+        try:
+            compile_patch_plan(load_workflow_template(workflow_path), plan)
+        except (OSError, KeyError, ValueError) as e:
+            errors[workflow_key] = str(e)
+
+    return errors
@@ -1,6 +1,6 @@
 import base64
-import csv
-import io
+import hashlib
+import uuid
 import pandas as pd
 import streamlit as st
 
@@ -10,6 +10,30 @@ from backend import (
     run_body_generation,
     run_scene_generation,
     run_camera_refinement,
+    run_storyboard_pipeline,
+    run_scene_generation_batch,
+    run_camera_angle_sweep,
+    camera_sweep_poses,
+    Storyboard,
+    diff_storyboards,
+    read_storyboard_csv,
+    scene_config_for_shots,
+    validate_storyboard,
+    build_structured_shot_data,
+    validate_workflow_templates,
+    configure_result_cache,
+    DiskResultStore,
+    get_image_store,
+    get_background_runs,
+    configure_job_ledger,
+    resume_unfinished_jobs,
+    configure_deployment_governor,
+    configure_deployment_routes,
+    RunComfyCancelledError,
+    configure_reference_asset_store,
+    SCENE_BATCH_MAX_CONCURRENCY,
+    STORYBOARD_LOSSY_ENCODING,
+    CAMERA_SWEEP_MAX_CONCURRENCY,
 )
 
 # =========================
@@ -17,6 +41,9 @@ from backend import (
 # =========================
 FIXED_BASE_BACKGROUND_CLOTHING_PROMPT = "gray background"
 
+# Step 3 workflow의 ScenePromptBuilder description_source 값 (local 검증 / prompt 미리보기용)
+SCENE_DESCRIPTION_SOURCE = "english"
+
 # Temporary UI feature flags
 # True로 변경하면 각 수동 입력/가이드 UI를 다시 표시할 수 있습니다.
 ENABLE_MANUAL_FACE_REFERENCE_INPUT = False
@@ -145,16 +172,13 @@ HAIR_COLOR_OPTIONS = [
 # Helper Functions
 # =========================
 
-# ----------------------------- 업로드 파일 텍스트 변환 함수 -----------------------------
-# 업로드된 파일의 바이너리 데이터를 여러 인코딩 방식으로 시도해 문자열 텍스트로 안전하게 디코딩하는 함수
-def decode_uploaded_file(uploaded_file):
-    raw = uploaded_file.getvalue()
-    for encoding in ["utf-8-sig", "utf-8", "cp949"]:
-        try:
-            return raw.decode(encoding)
-        except Exception:
-            pass
-    return raw.decode("utf-8", errors="ignore")
+# ----------------------------- 선택 secret 조회 함수 -----------------------------
+# secrets.toml이 없거나 key가 없어도 화면 렌더링이 멈추지 않도록 기본값을 반환하는 함수
+def get_optional_secret(key, default=None):
+    try:
+        return st.secrets.get(key, default)
+    except Exception:
+        return default
 
 # ----------------------------- 업로드 이미지 Data URI 변환 함수 -----------------------------
 # Streamlit file_uploader로 받은 이미지 파일을
@@ -169,77 +193,110 @@ def uploaded_image_to_data_uri(uploaded_file):
     encoded = base64.b64encode(raw).decode("ascii")
     return f"data:{mime_type};base64,{encoded}"
 
+# ----------------------------- 업로드 이미지 Reference URL 변환 함수 -----------------------------
+# 업로드 이미지를 backend reference asset store에 content hash로 한 번만 저장하고
+# LoadImageFromUrl 노드에 넣을 짧은 URL을 반환합니다.
+# 같은 업로드(file_id)는 rerun마다 다시 hash하지 않도록 세션에 URL을 기억하고,
+# PUBLIC_APP_URL이 설정되지 않아 외부 URL을 만들 수 없으면 기존 data URI 방식을 사용합니다.
+def uploaded_image_to_reference_url(uploaded_file):
+    if uploaded_file is None:
+        return ""
 
-# ----------------------------- CSV 샷 ID 추출 함수 -----------------------------
-# CSV 텍스트의 첫 번째 열에서 중복 없이 샷 ID 목록을 추출하는 함수입니다.
-def extract_shot_ids_from_csv(csv_text):
-    if not csv_text.strip():
-        return []
+    asset_store = init_reference_asset_store()
+    if not asset_store.enabled:
+        return uploaded_image_to_data_uri(uploaded_file)
 
-    shot_ids = []
-    reader = csv.reader(io.StringIO(csv_text.strip()))
+    reference_urls = st.session_state.setdefault("reference_asset_urls", {})
+    file_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
 
-    for row in reader:
-        if not row:
-            continue
+    if file_id not in reference_urls:
+        asset = asset_store.put(
+            uploaded_file.getvalue(),
+            getattr(uploaded_file, "type", None) or "image/png",
+        )
+        reference_urls[file_id] = asset["url"]
 
-        first_value = row[0].strip()
-        if not first_value:
-            continue
+    return reference_urls[file_id]
 
-        if first_value.lower() in {"shot", "shot_id", "shot id", "id"}:
-            continue
 
-        if first_value not in shot_ids:
-            shot_ids.append(first_value)
+# ----------------------------- 스토리보드 CSV 적재 캐시 함수 -----------------------------
+# CSV를 한 번만 decode / 파싱해 CSV 텍스트, encoding, 컬럼형 Storyboard model(샷 ID → 행 위치 index 포함)을 함께 보관하는 함수
+# 업로드 bytes(_raw)가 있으면 앞부분 sample로 encoding을 정하고 bytes stream을 행 단위로 읽어 전체 복사본을 여러 번 만들지 않습니다.
+# csv_hash만 cache key로 사용하므로 같은 CSV는 rerun마다 다시 파싱하지 않고, 같은 CSV를 올린 session끼리 같은 객체를 공유합니다.
+# 반환값은 session 사이에 공유되므로 수정하지 말고 조회만 해야 합니다.
+@st.cache_resource(max_entries=16, show_spinner=False)
+def load_parsed_storyboard(csv_hash, _csv_text, _raw=None):
+    if _raw is not None:
+        csv_text, encoding, model = read_storyboard_csv(_raw)
+    else:
+        csv_text, encoding, model = _csv_text, "", Storyboard.from_csv(_csv_text)
 
-    return shot_ids
+    return {
+        "csv_hash": csv_hash,
+        "csv_text": csv_text,
+        "encoding": encoding,
+        "model": model,
+    }
 
-# ----------------------------- CSV 데이터프레임 변환 함수 -----------------------------
-# CSV 텍스트를 pandas DataFrame으로 변환하고, 실패하거나 비어 있으면 빈 DataFrame을 반환하는 함수
-def read_csv_as_dataframe(csv_text):
-    if not csv_text.strip():
-        return pd.DataFrame()
-    try:
-        return pd.read_csv(io.StringIO(csv_text))
-    except Exception:
-        return pd.DataFrame()
+# ----------------------------- 스토리보드 CSV 업로드 반영 함수 -----------------------------
+# 새 업로드(file_id 기준)일 때만 CSV를 적재하고, session에는 공유 CSV 텍스트와 hash만 기록하는 함수
+def ingest_uploaded_storyboard(uploaded_file):
+    file_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
 
-# ----------------------------- 샷 ID 컬럼 탐색 함수 -----------------------------
-# DataFrame에서 샷 ID로 보이는 컬럼을 찾고, 없으면 첫 번째 컬럼을 반환하는 함수
-def get_shot_id_column(df):
-    if df.empty:
-        return None
+    if st.session_state.get("csv_upload_id") == file_id and "csv_text" in st.session_state:
+        return st.session_state["csv_text"]
+
+    raw = uploaded_file.getvalue()
+    csv_hash = hashlib.sha256(raw).hexdigest()
+    storyboard = load_parsed_storyboard(csv_hash, "", raw)
 
-    candidates = ["shot", "shot_id", "shot id", "id", "Shot", "Shot ID", "Shot_ID"]
-    for col in df.columns:
-        if str(col).strip() in candidates:
-            return col
-    return df.columns[0]
+    st.session_state["csv_upload_id"] = file_id
+    st.session_state["csv_hash"] = csv_hash
+    st.session_state["csv_text"] = storyboard["csv_text"]
+    st.session_state["csv_encoding"] = storyboard["encoding"]
 
-# ----------------------------- 선택 샷 DataFrame 추출 함수 -----------------------------
-# Streamlit 세션의 CSV 데이터에서 현재 선택된 샷 필터에 해당하는 행만 추출해 DataFrame으로 반환하는 함수
-# CSV를 DataFrame으로 읽은 뒤, ALL이면 전체를 반환하고 CUSTOM이면 선택된 샷 ID만 필터링함
-def get_selected_shot_dataframe():
+    return storyboard["csv_text"]
+
+# ----------------------------- 현재 스토리보드 조회 함수 -----------------------------
+# Streamlit 세션의 CSV 텍스트에 해당하는 파싱 결과를 반환하는 함수
+# cache에서 밀려났으면 세션의 CSV 텍스트로 다시 파싱합니다.
+def get_parsed_storyboard():
     csv_text = st.session_state.get("csv_text", "")
-    df = read_csv_as_dataframe(csv_text)
-    if df.empty:
-        return pd.DataFrame()
+    csv_hash = (
+        st.session_state.get("csv_hash")
+        or hashlib.sha256(csv_text.encode("utf-8")).hexdigest()
+    )
+
+    return load_parsed_storyboard(csv_hash, csv_text)
+
+# ----------------------------- 스토리보드 미리보기 DataFrame 함수 -----------------------------
+# Parsed Storyboard Data Preview에 표시할 DataFrame을 CSV hash마다 한 번만 만드는 함수
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_storyboard_preview(csv_hash, _model):
+    return pd.DataFrame(_model.column_data(), columns=_model.columns)
 
-    shot_col = get_shot_id_column(df)
-    if shot_col is None:
-        return df
+# ----------------------------- 선택 샷 행 위치 조회 함수 -----------------------------
+# 현재 선택된 샷 필터에 해당하는 행 위치 목록을 CSV 원래 순서대로 반환하는 함수
+# ALL이면 전체 행을, CUSTOM이면 샷 ID → 행 위치 index에서 선택된 샷의 행만 찾습니다.
+def get_selected_shot_positions(storyboard):
+    model = storyboard["model"]
+
+    if model.row_count == 0:
+        return []
 
     shot_filter_mode = st.session_state.get("shot_filter_mode", "ALL")
     custom_shots = st.session_state.get("custom_shots", [])
 
     if shot_filter_mode == "ALL":
-        return df
+        return list(range(model.row_count))
 
-    if not custom_shots:
-        return pd.DataFrame()
-
-    return df[df[shot_col].astype(str).isin([str(x) for x in custom_shots])]
+    return sorted(
+        {
+            position
+            for shot_id in custom_shots
+            for position in model.shot_positions.get(str(shot_id), [])
+        }
+    )
 
 # ----------------------------- 스토리보드 입력 설정 구성 함수 -----------------------------
 # Streamlit 세션의 CSV와 샷 선택 정보를 모아 RunComfy 요청용 storyboard_input 설정 딕셔너리로 구성하는 함수
@@ -247,7 +304,8 @@ def build_storyboard_input_config():
     csv_text = st.session_state.get("csv_text", "")
     shot_filter_mode = st.session_state.get("shot_filter_mode", "ALL")
     custom_shots = st.session_state.get("custom_shots", [])
-    selected_shot_df = get_selected_shot_dataframe()
+    storyboard = get_parsed_storyboard()
+    selected_positions = get_selected_shot_positions(storyboard)
 
     if shot_filter_mode == "ALL":
         shot_filter = "ALL"
@@ -261,11 +319,45 @@ def build_storyboard_input_config():
             "csv_text": csv_text,
             "shot_filter": shot_filter,
             "custom_shot_ids": custom_shot_ids,
-            "selected_shot_count": len(selected_shot_df),
-            "selected_shot_data": selected_shot_df.to_dict(orient="records"),
+            "selected_shot_count": len(selected_positions),
+            "selected_shot_data": [
+                storyboard["model"].row(position)
+                for position in selected_positions
+            ],
         }
     }
 
+# ------------------------- 스토리보드 local 검증 함수 -------------------------
+# 현재 CSV와 shot 선택을 RunComfy에 보내기 전에 local에서 검증해 error 목록을 반환하는 함수
+# error는 CSV를 읽지 못함 / shot 없음 / 선택한 shot id 없음뿐이며, column 이름 추정 검사는 warning이라 submit을 막지 않습니다.
+def get_storyboard_errors(character_filters=(None,), description_source=None):
+    model = get_parsed_storyboard()["model"]
+    storyboard_input = build_storyboard_input_config()["storyboard_input"]
+    errors = []
+
+    for character_filter in character_filters:
+        validation = validate_storyboard(
+            model,
+            shot_filter=storyboard_input["shot_filter"],
+            custom_shot_ids=storyboard_input["custom_shot_ids"],
+            character_filter=character_filter,
+            description_source=description_source,
+        )
+
+        for error in validation.errors:
+            if error not in errors:
+                errors.append(error)
+
+    return errors
+
+# ------------------------- 스토리보드 검증 오류 표시 함수 -------------------------
+# local 검증 error를 한 번에 보여주는 함수
+def show_storyboard_errors(errors):
+    st.error(
+        "CSV 검증에 실패해 요청을 보내지 않았습니다. Step 1에서 CSV를 확인하세요.\n\n"
+        + "\n".join(f"- {error}" for error in errors)
+    )
+
 # ------------------------- 캐릭터 라벨 변환 함수 ----------------------------- 
 # 선택된 캐릭터 라벨을 RunComfy 워크플로우에서 사용하는 C1, C2 값으로 변환하는 함수
 # 라벨이 Image 1 - Boy이면 C1, Image 2 - Girl이면 C2를 반환하고 기본값은 함수별로 다르게 설정
@@ -279,7 +371,7 @@ def body_character_label_to_value(label):
     return {"Image 1 - Boy": "C1", "Image 2 - Girl": "C2"}.get(label, "C1")
 
 # ------------------------- 의상 레퍼런스 입력 초기화 함수 -------------------------
-# 2B Outfit Change에서 캐릭터별 입력 모드와 Garment / Outfit reference data URI를 세션에 유지합니다.
+# 2B Outfit Change에서 캐릭터별 입력 모드와 Garment / Outfit reference URL을 세션에 유지합니다.
 def initialize_outfit_reference_inputs():
     for character_code in ("c1", "c2"):
         st.session_state.setdefault(
@@ -324,9 +416,14 @@ def sync_scene_reference_selection(session_key, candidates):
 # ------------------------- 얼굴 생성 UI 설정 구성 함수 -------------------------
 # Streamlit에서 선택한 스토리보드·캐릭터·외형 설정을 얼굴 생성 워크플로우용 설정 딕셔너리로 구성하는 함수
 # 세션 상태에서 CSV, 샷 필터, 캐릭터 정보, 얼굴 외형 옵션, 피부 디테일 값을 가져와 RunComfy 요청에 맞는 노드별 입력값으로 정리
-def build_face_ui_config():
+def build_face_ui_config(character_filter=None):
     storyboard_input = build_storyboard_input_config()["storyboard_input"]
 
+    if character_filter is None:
+        character_filter = character_label_to_value(
+            st.session_state.get("character_filter_label", "Image 2 - Girl")
+        )
+
     return {
         "storyboard_input": storyboard_input,
         "csvstoryboardparser": {
@@ -337,9 +434,7 @@ def build_face_ui_config():
             "custom_shot_ids": storyboard_input["custom_shot_ids"],
         },
         "character_registry_parser": {
-            "character_filter": character_label_to_value(
-                st.session_state.get("character_filter_label", "Image 2 - Girl")
-            ),
+            "character_filter": character_filter,
             "custom_character_id": "",
             "age": st.session_state.get("age", 9),
             "include_character_id": "false",
@@ -389,13 +484,15 @@ def build_face_ui_config():
 # ------------------------- 의상 변경 UI 설정 구성 함수 -------------------------
 # 선택한 2A 캐릭터 결과와 업로드된 Top / Bottom / Shoes 레퍼런스를 2B Outfit Change 설정으로 구성합니다.
 # 함수명 build_body_ui_config는 기존 app-backend 연결을 최소 변경하기 위해 유지합니다.
-def build_body_ui_config():
-    character_filter_label = st.session_state.get(
-        "body_character_filter_label",
-        "Image 1 - Boy",
-    )
+def build_body_ui_config(character_filter=None):
+    if character_filter is None:
+        character_filter = body_character_label_to_value(
+            st.session_state.get(
+                "body_character_filter_label",
+                "Image 1 - Boy",
+            )
+        )
 
-    character_filter = body_character_label_to_value(character_filter_label)
     character_code = "c1" if character_filter == "C1" else "c2"
 
     if character_filter == "C1":
@@ -490,6 +587,7 @@ def get_scene_result_candidates():
                 "label": item.get("label", f"Scene {i}"),
                 "image": item.get("image"),
                 "filename": item.get("filename", ""),
+                "shot_ids": item.get("shot_ids", []),
             }
         )
 
@@ -501,6 +599,46 @@ def get_scene_result_candidates():
 
     return normalized
 
+# ------------------------- 쉼표 구분 숫자 목록 변환 함수 -------------------------
+# "-45, 0, 45" 같은 입력을 숫자 목록으로 변환하고, 형식이 잘못되면 ValueError를 발생시킵니다.
+def parse_number_list(text, cast=int):
+    return [cast(item.strip()) for item in str(text).split(",") if item.strip()]
+
+# ------------------------- 카메라 angle sweep contact sheet 렌더링 함수 -------------------------
+# pose 결과를 pose 순서대로 3열 grid에 표시합니다.
+# slots가 주어지면 해당 위치의 placeholder를 채우고, 없으면 grid를 새로 그립니다.
+def render_camera_sweep_cell(item):
+    if item.get("error"):
+        st.warning(f"{item['label']}\n\n{item['error']}")
+    elif item.get("image"):
+        st.image(
+            get_local_preview_image(item["image"], 440),
+            caption=item["label"],
+            use_container_width=True,
+        )
+    else:
+        st.caption(item["label"])
+
+
+def create_camera_sweep_slots(pose_count, columns_per_row=3):
+    slots = []
+
+    for row_start in range(0, pose_count, columns_per_row):
+        row_columns = st.columns(columns_per_row, gap="small")
+        for column in row_columns[: pose_count - row_start]:
+            with column:
+                slots.append(st.empty())
+
+    return slots
+
+
+def render_camera_sweep_sheet(sheet):
+    slots = create_camera_sweep_slots(len(sheet))
+
+    for item in sheet:
+        with slots[item["index"]].container():
+            render_camera_sweep_cell(item)
+
 # ------------------------- 카메라 보정 UI 설정 구성 함수 -------------------------
 # Step 3에서 선택한 장면과 Qwen Multi-Angle Camera 제어값을
 # 새 Camera Refinement workflow용 설정 딕셔너리로 구성합니다.
@@ -518,6 +656,7 @@ def build_camera_refinement_ui_config():
                 "label": selected_scene["label"] if selected_scene else "",
                 "image": selected_scene.get("image", "") if selected_scene else "",
                 "filename": selected_scene.get("filename", "") if selected_scene else "",
+                "shot_ids": selected_scene.get("shot_ids", []) if selected_scene else [],
             },
             "camera_control": {
                 "horizontal_angle": st.session_state.get("camera_horizontal_angle", 0),
@@ -553,8 +692,596 @@ def render_empty_preview_box(message, height=520):
         unsafe_allow_html=True,
     )
 
+# ------------------------- Local preview 이미지 경로 함수 -------------------------
+# 원격 결과 이미지를 backend image store에 한 번만 내려받고, 크기에 맞는 WebP thumbnail 경로를 반환하는 함수
+# st.image()는 local 파일 경로를, HTML preview box는 static URL을 사용함
+# 아직 local 파일이 없거나 실패하면 원격 URL을 그대로 쓰고, thumbnail은 background에서 만들어 다음 rerun부터 사용함
+def get_local_preview_image(image_url, max_size=768):
+    path = get_image_store().cached_thumbnail(image_url, max_size=max_size)
+    return str(path) if path is not None else image_url
+
+
+# ------------------------- RunComfy 진행 상황 표시 함수 -------------------------
+# backend job engine의 progress event(queued / queue position / in progress / 경과 시간 / 부분 결과)를
+# st.status 안에 실시간으로 표시하는 callback을 만듭니다.
+# 반환된 callback은 run_* 함수의 on_progress 인자로 전달합니다.
+def create_progress_status(label):
+    status_box = st.status(label, expanded=True)
+    status_line = status_box.empty()
+    partial_previews = status_box.container()
+    shown_images = set()
+
+    def format_seconds(value):
+        return f"{value:.0f}초" if value is not None else "-"
+
+    def on_progress(event):
+        event_type = event.get("type")
+
+        if event_type == "submitting":
+            status_line.caption("RunComfy에 workflow를 제출하는 중입니다...")
+
+        elif event_type == "waiting":
+            status_line.caption(
+                "Deployment 동시 실행 한도에 도달해 로컬 대기열에서 기다리는 중 · "
+                f"대기 순번 {event.get('local_queue_position', '-')}"
+            )
+
+        elif event_type == "failover":
+            status_line.caption(
+                f"Deployment {event.get('deployment_id')} 제출 실패, "
+                f"다른 deployment로 다시 제출합니다 · {event.get('error')}"
+            )
+
+        elif event_type == "submitted":
+            status_line.caption(
+                f"제출 완료 · deployment: {event.get('deployment_id') or '-'} · "
+                f"request_id: {event.get('request_id') or '-'}"
+            )
+
+        elif event_type == "status" and event.get("status") == "in_queue":
+            queue_position = event.get("queue_position")
+            position_text = (
+                f" · 대기 순번 {queue_position}"
+                if queue_position is not None
+                else ""
+            )
+            status_line.caption(
+                f"대기열에서 기다리는 중{position_text} · "
+                f"대기 {format_seconds(event.get('queue_seconds'))}"
+            )
+
+        elif event_type == "status":
+            eta_seconds = event.get("eta_seconds")
+            eta_text = (
+                f" · 예상 남은 시간 {format_seconds(eta_seconds)}"
+                if eta_seconds is not None
+                else ""
+            )
+            status_line.caption(
+                f"실행 중 · 실행 {format_seconds(event.get('execution_seconds'))} · "
+                f"경과 {format_seconds(event.get('elapsed_seconds'))}{eta_text}"
+            )
+
+        elif event_type == "stage":
+            stage_text = (
+                f"{event['stage']} 실패: {event['error']}"
+                if event.get("error")
+                else f"{event['stage']} 완료"
+            )
+            status_line.caption(
+                f"{event.get('completed_stages')} / {event.get('stage_count')} stage · "
+                f"{stage_text}"
+            )
+
+        elif event_type == "completed":
+            timing_text = (
+                f" · 대기 {format_seconds(event.get('queue_seconds'))} · "
+                f"실행 {format_seconds(event.get('execution_seconds'))}"
+                if event.get("execution_seconds") is not None
+                else ""
+            )
+            status_box.update(
+                label=f"{label} 완료{timing_text}",
+                state="complete",
+                expanded=False,
+            )
+
+        elif event_type == "cancelled":
+            status_box.update(
+                label=f"{label} 중지됨",
+                state="error",
+                expanded=False,
+            )
+
+        elif event_type == "cached":
+            status_box.update(
+                label=f"{label} 완료 · 캐시된 결과를 사용했습니다.",
+                state="complete",
+                expanded=False,
+            )
+
+        elif event_type == "failed":
+            status_line.caption(event.get("error", ""))
+            status_box.update(label=f"{label} 실패", state="error", expanded=True)
+
+        if event_type in ("status", "stage"):
+            for image in event.get("images", []):
+                if image["image"] in shown_images:
+                    continue
+
+                shown_images.add(image["image"])
+                with partial_previews:
+                    st.image(
+                        get_local_preview_image(image["image"], 440),
+                        caption=image.get("label", ""),
+                        width=220,
+                    )
+
+    return on_progress
+
+
+# ------------------------- Background run 연결 함수 -------------------------
+# 생성 작업은 backend background worker가 실행하고, 화면은 run_id로 진행 상황과 결과에 연결만 합니다.
+# run_id는 session_state와 URL query parameter(runs=step:run_id,...)에 함께 저장하므로
+# 탭 이동, 새로고침, websocket 재연결 후에도 같은 작업에 다시 연결해 결과를 받을 수 있습니다.
+BACKGROUND_RUN_QUERY_PARAM = "runs"
+
+
+def get_pending_runs():
+    pending_runs = st.session_state.setdefault("pending_background_runs", {})
+    query_value = st.query_params.get(BACKGROUND_RUN_QUERY_PARAM, "")
+
+    for item in str(query_value).split(","):
+        step, _, run_id = item.partition(":")
+        if step and run_id:
+            pending_runs.setdefault(step, run_id)
+
+    return pending_runs
+
+
+def set_pending_run(step, run_id=None):
+    pending_runs = get_pending_runs()
+
+    if run_id:
+        pending_runs[step] = run_id
+    else:
+        pending_runs.pop(step, None)
+
+    if pending_runs:
+        st.query_params[BACKGROUND_RUN_QUERY_PARAM] = ",".join(
+            f"{pending_step}:{pending_run_id}"
+            for pending_step, pending_run_id in pending_runs.items()
+        )
+    else:
+        st.query_params.pop(BACKGROUND_RUN_QUERY_PARAM, None)
+
+
+def wait_for_background_run(step, label):
+    run_id = get_pending_runs().get(step, "")
+    background_runs = get_background_runs()
+    # 서버가 재시작되어 registry에 없으면 job ledger 기록으로 복구합니다.
+    run = (
+        background_runs.get(run_id) or background_runs.recover(run_id)
+        if run_id
+        else None
+    )
+
+    if run is None:
+        set_pending_run(step, None)
+        return None
+
+    # Stop 버튼은 rerun 시작 시 callback으로 run을 취소합니다.
+    # 기다리는 동안 progress event마다 script가 갱신되므로 다음 polling 안에 적용됩니다.
+    stop_slot = st.empty()
+    stop_slot.button(
+        "Stop",
+        key=f"stop_background_run_{run.run_id}",
+        on_click=run.cancel,
+        use_container_width=True,
+    )
+
+    on_progress = create_progress_status(label)
+    for event in run.iter_events():
+        on_progress(event)
+
+    stop_slot.empty()
+    set_pending_run(step, None)
+    result = run.wait()
+
+    # ledger로 복구한 run은 재시작 전에 submit된 job의 결과만 합친 것입니다.
+    if result.get("partial"):
+        st.warning(
+            f"{label}: 서버 재시작 전에 제출된 작업의 결과만 복구했습니다. "
+            "일부 shot / stage 결과가 빠져 있을 수 있습니다."
+        )
+
+    return result
+
+
+# 브라우저 session마다 고정된 owner id입니다.
+# deployment governor는 owner를 돌아가며 in-flight slot을 배정하므로 한 session의 대량 batch가 다른 session을 막지 않습니다.
+def get_session_owner():
+    return st.session_state.setdefault("job_owner_id", uuid.uuid4().hex)
+
+
+# 같은 step의 작업이 아직 진행 중이면 새로 제출하지 않고 기존 작업에 다시 연결합니다.
+def run_in_background(step, label, run_fn, **kwargs):
+    background_runs = get_background_runs()
+    pending_run = background_runs.get(get_pending_runs().get(step, ""))
+
+    if pending_run is None or pending_run.done():
+        pending_run = background_runs.start(
+            step,
+            run_fn,
+            owner=get_session_owner(),
+            **kwargs,
+        )
+        set_pending_run(step, pending_run.run_id)
+
+    return wait_for_background_run(step, label)
+
+
+# Boy / Girl 두 캐릭터의 run_fn을 background run으로 동시에 제출합니다.
+# 각 캐릭터는 step_prefix_c1 / step_prefix_c2 pending run으로 기록되므로 새로고침 후에도 개별적으로 다시 연결됩니다.
+def start_character_runs(step_prefix, run_fn, configs, **kwargs):
+    background_runs = get_background_runs()
+
+    for character_code, config in configs.items():
+        step = f"{step_prefix}_{character_code}"
+        run = background_runs.get(get_pending_runs().get(step, ""))
+
+        if run is None or run.done():
+            run = background_runs.start(
+                step,
+                run_fn,
+                owner=get_session_owner(),
+                config=config,
+                **kwargs,
+            )
+            set_pending_run(step, run.run_id)
+
+
+# Boy / Girl을 동시에 생성하고, 캐릭터마다 wait_for_background_run으로 기다리며 preview slot을 채웁니다.
+# 단일 캐릭터 생성과 같은 Stop 버튼 / progress가 캐릭터별로 표시됩니다.
+# 두 캐릭터 모두 결과가 반영되면 True를 반환합니다.
+def generate_both_characters(
+    step_prefix,
+    label,
+    run_fn,
+    configs,
+    apply_result,
+    preview_slots,
+    caption_suffix,
+    **kwargs,
+):
+    start_character_runs(step_prefix, run_fn, configs, **kwargs)
+    all_applied = True
+
+    for character_code in configs:
+        character_label = "Image 1 - Boy" if character_code == "c1" else "Image 2 - Girl"
+
+        try:
+            result = wait_for_background_run(
+                f"{step_prefix}_{character_code}",
+                f"{label} ({character_label})",
+            )
+        except RunComfyCancelledError:
+            all_applied = False
+            st.warning(f"{character_label} 작업을 중지했습니다.")
+            continue
+        except Exception as e:
+            all_applied = False
+            st.error(f"{character_label} 실행 중 오류가 발생했습니다: {e}")
+            continue
+
+        if result is None:
+            all_applied = False
+            st.warning(f"이전 {character_label} 작업을 찾을 수 없습니다. 다시 실행하세요.")
+            continue
+
+        if not apply_result(result, character_code):
+            all_applied = False
+            st.error(f"{character_label}: RunComfy 실행은 완료되었지만 결과 이미지가 없습니다.")
+            continue
+
+        with preview_slots[character_code].container():
+            render_image_preview_box(
+                st.session_state[f"{step_prefix}_result_image_{character_code}"],
+                caption=f"{character_label} {caption_suffix}",
+                height=400,
+            )
+
+    return all_applied
+
+
+# 이전 rerun / 새로고침에서 끝나지 않은 작업이 있으면 다시 연결해서 결과를 화면 상태에 반영합니다.
+def resume_background_run(step, label, apply_result):
+    if step not in get_pending_runs():
+        return
+
+    try:
+        result = wait_for_background_run(step, label)
+    except RunComfyCancelledError:
+        st.warning(f"{label} 작업을 중지했습니다.")
+        return
+    except Exception as e:
+        st.error(f"{label} 중 오류가 발생했습니다.")
+        st.exception(e)
+        return
+
+    if result is None:
+        st.warning(f"이전 {label} 작업을 찾을 수 없습니다. 다시 실행하세요.")
+    elif apply_result(result):
+        st.rerun()
+    else:
+        st.error("RunComfy 실행은 완료되었지만 결과 이미지가 없습니다.")
+        with st.expander("RunComfy Raw Result", expanded=False):
+            st.json(result)
+
+
+# ------------------------- 생성 결과 반영 함수 -------------------------
+# run_* 결과의 첫 번째 이미지를 각 Step이 사용하는 session_state 키에 저장합니다.
+# 결과 이미지가 없으면 False를 반환합니다.
+def apply_face_result(result, character_code):
+    images = result.get("images", [])
+    if not images:
+        return False
+
+    first_image = images[0]
+    st.session_state[f"face_result_image_{character_code}"] = first_image["image"]
+    st.session_state[f"face_result_filename_{character_code}"] = first_image.get("filename", "")
+    return True
+
+
+def apply_body_result(result, character_code):
+    images = result.get("images", [])
+
+    # backend 수정 전/응답 구조 차이를 고려한 fallback.
+    # 새 Outfit Change workflow의 final SaveImage는 node 17을 사용합니다.
+    if not images:
+        raw_result = result.get("result", result)
+        outputs = raw_result.get("outputs", {})
+        save_output = outputs.get("17", {})
+        raw_images = save_output.get("images", [])
+
+        images = [
+            {
+                "label": (
+                    f"{'Boy' if character_code == 'c1' else 'Girl'} "
+                    f"Outfit Reference {idx + 1}"
+                ),
+                "image": item.get("url", ""),
+                "url": item.get("url", ""),
+                "filename": item.get("filename", ""),
+                "node_id": "17",
+            }
+            for idx, item in enumerate(raw_images)
+            if item.get("url")
+        ]
+
+    if not images:
+        return False
+
+    first_image = images[0]
+
+    # Step 3가 기존 키를 그대로 사용하므로 결과 저장 키는 유지합니다.
+    st.session_state[f"body_result_image_{character_code}"] = first_image["image"]
+    st.session_state[f"body_result_filename_{character_code}"] = first_image.get("filename", "")
+    return True
+
+
+def apply_scene_result(result):
+    images = result.get("images", [])
+    if not images:
+        return False
+
+    first_image = images[0]
+
+    st.session_state["scene_candidates"] = images
+    st.session_state["scene_result_image"] = first_image["image"]
+    st.session_state["scene_result_filename"] = first_image.get("filename", "")
+    st.session_state["scene_selected_label"] = first_image["label"]
+    st.session_state["storyboard_pending_shot_ids"] = []
+    return True
+
+
+# Garment / Outfit Reference가 비어 있는 캐릭터 label 목록을 반환합니다.
+def get_missing_outfit_labels(body_configs):
+    missing_labels = []
+
+    for body_config in body_configs.values():
+        outfit_change = body_config["outfit_change"]
+
+        if outfit_change["input_mode"] == "Single Outfit Reference":
+            has_references = bool(outfit_change["single_outfit_reference"])
+        else:
+            has_references = all(outfit_change["garment_references"].values())
+
+        if not has_references:
+            missing_labels.append(outfit_change["label"])
+
+    return missing_labels
+
+
+# pipeline 결과는 성공한 stage만 각 Step 결과 키에 반영합니다.
+def apply_pipeline_result(result):
+    stage_results = result.get("results", {})
+    applied = False
+
+    for character_code in ("c1", "c2"):
+        if f"face_{character_code}" in stage_results:
+            applied |= apply_face_result(stage_results[f"face_{character_code}"], character_code)
+        if f"body_{character_code}" in stage_results:
+            applied |= apply_body_result(stage_results[f"body_{character_code}"], character_code)
+
+    if "scene" in stage_results:
+        applied |= apply_scene_result(stage_results["scene"])
+
+    if "camera" in stage_results:
+        applied |= apply_camera_result(stage_results["camera"])
+
+    # 결과 반영 후 st.rerun()으로 화면이 다시 그려져도 실패한 stage가 보이도록 session에 보관합니다.
+    st.session_state["pipeline_stage_errors"] = dict(result.get("errors", {}))
+
+    return applied
+
+
+def apply_camera_result(result):
+    images = result.get("images", [])
+    if not images:
+        return False
+
+    first_image = images[0]
+
+    st.session_state["camera_refined_candidates"] = images
+    st.session_state["camera_refined_result_image"] = first_image["image"]
+    st.session_state["camera_refined_result_filename"] = first_image.get("filename", "")
+    st.session_state["camera_refined_selected_label"] = first_image.get(
+        "label",
+        "Camera Refined Scene 1",
+    )
+    return True
+
+
+# sweep 결과를 contact sheet로 보관하고, pose 이미지를 camera 후보 목록으로 등록해 기존 선택 UI에서 고를 수 있게 합니다.
+def apply_camera_sweep_result(result):
+    st.session_state["camera_sweep_sheet"] = [
+        {
+            "index": item["index"],
+            "label": item["label"],
+            "image": item["image"],
+            "error": item["error"],
+            "shot_ids": item.get("shot_ids", []),
+        }
+        for item in result.get("sheet", [])
+    ]
+
+    return apply_camera_result({"images": result.get("images", [])})
+
+
+# ------------------------- shot 결과 무효화 함수 -------------------------
+# {prefix}_candidates 후보 중 shot_ids가 stale shot과 겹치는 결과를 버립니다.
+# 선택된 결과가 버려지면 남은 첫 번째 후보로 바꾸고, 남은 후보가 없으면 선택 키를 비웁니다.
+def drop_stale_shot_candidates(prefix, stale_shot_ids):
+    candidates_key = f"{prefix}_candidates"
+    result_key = f"{prefix}_result_image"
+    candidates = st.session_state.get(candidates_key, [])
+    kept = [
+        item
+        for item in candidates
+        if not set(item.get("shot_ids") or []) & set(stale_shot_ids)
+    ]
+
+    if len(kept) == len(candidates):
+        return 0
+
+    st.session_state[candidates_key] = kept
+
+    if st.session_state.get(result_key) not in [item["image"] for item in kept]:
+        if kept:
+            st.session_state[result_key] = kept[0]["image"]
+            st.session_state[f"{prefix}_result_filename"] = kept[0].get("filename", "")
+            st.session_state[f"{prefix}_selected_label"] = kept[0]["label"]
+        else:
+            for key in (result_key, f"{prefix}_result_filename", f"{prefix}_selected_label"):
+                st.session_state.pop(key, None)
+
+    return len(candidates) - len(kept)
+
+
+# ------------------------- 스토리보드 revision 추적 함수 -------------------------
+# 새 CSV가 올라오면 이전 revision과 shot 단위로 비교해 바뀌거나 삭제된 shot의 Step 3/4 결과만 버리고,
+# 이미 생성된 scene 결과가 있으면 추가 / 변경된 shot을 다시 생성할 대상으로 기록합니다.
+def update_storyboard_revision():
+    storyboard = get_parsed_storyboard()
+
+    if st.session_state.get("storyboard_csv_hash") == storyboard["csv_hash"]:
+        return
+
+    previous_model = st.session_state.get("storyboard_model")
+    st.session_state["storyboard_csv_hash"] = storyboard["csv_hash"]
+    st.session_state["storyboard_model"] = storyboard["model"]
+
+    if previous_model is None:
+        return
+
+    diff = diff_storyboards(previous_model, storyboard["model"])
+    st.session_state["storyboard_diff"] = diff.to_dict()
+
+    if not diff:
+        return
+
+    has_scene_results = bool(st.session_state.get("scene_candidates"))
+    drop_stale_shot_candidates("scene", diff.stale_shot_ids)
+    drop_stale_shot_candidates("camera_refined", diff.stale_shot_ids)
+
+    # sweep contact sheet는 한 source scene의 pose 모음이므로 그 shot이 바뀌면 통째로 버립니다.
+    if any(
+        set(item.get("shot_ids") or []) & set(diff.stale_shot_ids)
+        for item in st.session_state.get("camera_sweep_sheet", [])
+    ):
+        st.session_state.pop("camera_sweep_sheet", None)
+
+    if has_scene_results:
+        pending_shot_ids = [
+            shot_id
+            for shot_id in st.session_state.get("storyboard_pending_shot_ids", [])
+            if shot_id not in diff.removed
+        ]
+        st.session_state["storyboard_pending_shot_ids"] = [
+            shot_id
+            for shot_id in storyboard["model"].shot_ids
+            if shot_id in pending_shot_ids or shot_id in diff.regenerate_shot_ids
+        ]
+
+
+# ------------------------- 변경 shot 재생성 결과 병합 함수 -------------------------
+# 다시 생성한 shot의 이미지로 기존 scene 후보의 같은 shot 결과를 교체하고, 후보를 storyboard shot 순서로 정렬합니다.
+def merge_scene_result(result):
+    images = result.get("images", [])
+    if not images:
+        return False
+
+    regenerated_shot_ids = {
+        shot_id
+        for image in images
+        for shot_id in image.get("shot_ids", [])
+    }
+    shot_order = {
+        shot_id: position
+        for position, shot_id in enumerate(get_parsed_storyboard()["model"].shot_ids)
+    }
+
+    merged = [
+        item
+        for item in st.session_state.get("scene_candidates", [])
+        if not set(item.get("shot_ids") or []) & regenerated_shot_ids
+    ] + images
+    merged.sort(
+        key=lambda item: min(
+            [shot_order.get(shot_id, len(shot_order)) for shot_id in item.get("shot_ids") or []]
+            or [len(shot_order)]
+        )
+    )
+
+    st.session_state["scene_candidates"] = merged
+    st.session_state["storyboard_pending_shot_ids"] = [
+        shot_id
+        for shot_id in st.session_state.get("storyboard_pending_shot_ids", [])
+        if shot_id not in regenerated_shot_ids
+    ]
+
+    if st.session_state.get("scene_result_image") not in [item["image"] for item in merged]:
+        st.session_state["scene_result_image"] = merged[0]["image"]
+        st.session_state["scene_result_filename"] = merged[0].get("filename", "")
+        st.session_state["scene_selected_label"] = merged[0]["label"]
+
+    return True
+
+
 def render_image_preview_box(image_url, caption="", height=400):
     max_img_height = height - 55
+    image_url = get_image_store().preview_url(image_url, max_size=height * 2)
 
     html = (
         f'<div style="'
@@ -726,6 +1453,116 @@ def apply_preset_step4_results():
     )
 
 
+# ------------------------- Workflow template 검증 함수 -------------------------
+# 서버 프로세스당 한 번만 모든 workflow template과 patch plan을 검증합니다.
+# template이 바뀌어 node id / class_type이 맞지 않으면 생성 요청 전에 화면 상단에 표시합니다.
+@st.cache_resource
+def get_workflow_template_errors():
+    return validate_workflow_templates()
+
+
+# ------------------------- 결과 cache 초기화 함수 -------------------------
+# 고정 seed로 같은 설정을 다시 실행하면 GPU 추론 없이 저장된 결과를 재사용하도록
+# 서버 프로세스당 한 번 disk 기반 결과 cache를 활성화합니다.
+@st.cache_resource
+def init_result_cache():
+    return configure_result_cache(DiskResultStore())
+
+
+# ------------------------- Job ledger 초기화 함수 -------------------------
+# submit된 job을 SQLite ledger에 기록하고, 서버 프로세스 시작 시 이전 프로세스에서
+# 끝나지 않은 job의 polling을 이어서 결과를 받아옵니다.
+@st.cache_resource
+def init_job_ledger():
+    ledger = configure_job_ledger()
+    api_key = get_optional_secret("RUNCOMFY_API_KEY")
+
+    if api_key:
+        resume_unfinished_jobs(api_key)
+
+    return ledger
+
+
+# ------------------------- Deployment governor 초기화 함수 -------------------------
+# 같은 deployment를 공유하는 모든 session의 submit / polling 호출 rate와 동시 실행 job 수를 제한합니다.
+# DEPLOYMENT_MAX_CONCURRENCY는 deployment replica 수, RUNCOMFY_REQUESTS_PER_SECOND는 API 호출 상한입니다.
+@st.cache_resource
+def init_deployment_governor():
+    max_in_flight = get_optional_secret("DEPLOYMENT_MAX_CONCURRENCY")
+    requests_per_second = get_optional_secret("RUNCOMFY_REQUESTS_PER_SECOND")
+
+    configure_deployment_governor(
+        max_in_flight=int(max_in_flight) if max_in_flight else None,
+        requests_per_second=float(requests_per_second) if requests_per_second else None,
+    )
+
+
+# ------------------------- Deployment router 초기화 함수 -------------------------
+# secrets의 DEPLOYMENT_ROUTES 표로 workflow별 deployment 후보를 지정합니다.
+# 예: [DEPLOYMENT_ROUTES] scene = ["scene-a", "scene-b"] / face = "face-a"
+# 지정하지 않은 workflow는 DEPLOYMENT_ID를 그대로 사용합니다.
+@st.cache_resource
+def init_deployment_router():
+    routes = get_optional_secret("DEPLOYMENT_ROUTES", {})
+    configure_deployment_routes(dict(routes))
+
+
+# ------------------------- Reference asset store 초기화 함수 -------------------------
+# 업로드 reference 이미지를 static/reference_assets에 저장하고
+# PUBLIC_APP_URL/app/static/reference_assets/... URL로 RunComfy에 전달하도록 설정합니다.
+@st.cache_resource
+def init_reference_asset_store():
+    return configure_reference_asset_store(
+        public_base_url=get_optional_secret("PUBLIC_APP_URL", ""),
+    )
+
+
+# ------------------------- 고정 seed 입력 UI 렌더링 함수 -------------------------
+# 체크하면 입력한 seed를 반환하고, 체크하지 않으면 None(random seed)을 반환하는 함수
+# 같은 seed + 같은 설정의 재실행은 결과 cache에서 바로 반환됩니다.
+def render_fixed_seed_control(key_prefix):
+    seed_toggle_col, seed_value_col = st.columns([1.2, 1.0])
+
+    with seed_toggle_col:
+        use_fixed_seed = st.checkbox(
+            "Use Fixed Seed",
+            value=False,
+            key=f"{key_prefix}_use_fixed_seed",
+            help="같은 seed와 설정으로 다시 실행하면 저장된 결과를 재사용합니다.",
+        )
+
+    with seed_value_col:
+        seed = st.number_input(
+            "Seed",
+            min_value=1,
+            max_value=4_294_967_295,
+            value=1,
+            step=1,
+            key=f"{key_prefix}_fixed_seed",
+            disabled=not use_fixed_seed,
+            label_visibility="collapsed",
+        )
+
+    return int(seed) if use_fixed_seed else None
+
+
+# ------------------------- 후보 수 입력 UI 렌더링 함수 -------------------------
+# seed만 다른 후보를 몇 개 동시에 생성할지 입력받는 함수
+# 후보 이미지는 기존 결과 후보 목록(selectbox)에 "(Candidate N)" label로 합쳐집니다.
+def render_num_candidates_control(key_prefix):
+    return int(
+        st.number_input(
+            "Candidates",
+            min_value=1,
+            max_value=8,
+            value=1,
+            step=1,
+            key=f"{key_prefix}_num_candidates",
+            help="seed만 다른 후보를 동시에 생성합니다. 고정 seed를 사용하면 seed, seed+1, ...이 사용됩니다.",
+        )
+    )
+
+
 # ------------------------- 비활성화된 수동 입력 상태 정리 함수 -------------------------
 # 기능 플래그가 False인 수동 입력의 텍스트·이미지·선택 상태를 세션에서 제거하는 함수
 # 이전 실행에서 수동 URL을 넣었더라도 현재 파이프라인이 생성 결과만 사용하도록 초기화함
@@ -793,6 +1630,10 @@ st.set_page_config(
     layout="wide",
 )
 
+init_result_cache()
+init_job_ledger()
+init_deployment_governor()
+init_deployment_router()
 clear_disabled_manual_reference_state()
 apply_preset_2a_results()
 apply_preset_2b_results()
@@ -802,6 +1643,9 @@ apply_preset_step4_results()
 st.title("🎬 AI Storyboard Generation Pipeline")
 st.caption("A ComfyUI-based generation pipeline for character-consistent cinematic storyboard creation and camera-angle refinement")
 
+for workflow_key, template_error in get_workflow_template_errors().items():
+    st.error(f"Workflow template `{workflow_key}` 검증 실패: {template_error}")
+
 
 # =========================
 # Tabs
@@ -889,12 +1733,34 @@ with tab1:
     )
 
     if uploaded_csv is not None:
-        csv_text = decode_uploaded_file(uploaded_csv)
-        st.session_state["csv_text"] = csv_text
+        csv_text = ingest_uploaded_storyboard(uploaded_csv)
+        update_storyboard_revision()
         st.success(f"업로드 완료: {uploaded_csv.name}")
+
+        if st.session_state.get("csv_encoding") == STORYBOARD_LOSSY_ENCODING:
+            st.warning(
+                "CSV를 UTF-8 / CP949로 읽지 못해 깨진 문자를 버리고 읽었습니다. "
+                "일부 텍스트가 손상되었을 수 있으니 UTF-8로 다시 저장해 업로드하세요."
+            )
     else:
         csv_text = st.session_state.get("csv_text", "")
 
+    storyboard_diff = st.session_state.get("storyboard_diff")
+    if csv_text and storyboard_diff and (
+        storyboard_diff["added"] or storyboard_diff["removed"] or storyboard_diff["changed"]
+    ):
+        with st.expander("Storyboard Changes (이전 업로드 대비)", expanded=False):
+            for title, shot_ids in (
+                ("추가", storyboard_diff["added"]),
+                ("변경", storyboard_diff["changed"]),
+                ("삭제", storyboard_diff["removed"]),
+            ):
+                if shot_ids:
+                    st.caption(f"{title}: {', '.join(shot_ids)}")
+
+            for shot_id, columns in storyboard_diff["changed_columns"].items():
+                st.caption(f"Shot {shot_id} 변경 column: {', '.join(columns)}")
+
     if csv_text:
 
         # =========================
@@ -904,14 +1770,15 @@ with tab1:
             "Parsed Storyboard Data Preview",
             expanded=True,
         ):
-            try:
-                preview_df = pd.read_csv(io.StringIO(csv_text))
+            storyboard = get_parsed_storyboard()
+
+            if storyboard["model"].parse_error is None:
                 st.dataframe(
-                    preview_df,
+                    load_storyboard_preview(storyboard["csv_hash"], storyboard["model"]),
                     use_container_width=True,
                     hide_index=True,
                 )
-            except Exception:
+            else:
                 st.warning(
                     "CSV를 표 형태로 읽지 못했습니다. "
                     "원본 텍스트로 표시합니다."
@@ -923,7 +1790,7 @@ with tab1:
         # =========================
         st.subheader("Shot Selection Control")
 
-        shot_ids = extract_shot_ids_from_csv(csv_text)
+        shot_ids = get_parsed_storyboard()["model"].shot_ids
 
         st.radio(
             "shot_filter",
@@ -947,6 +1814,140 @@ with tab1:
             else:
                 st.warning("CSV에서 추출된 shot id가 없습니다.")
 
+        # =========================
+        # Local CSV Validation
+        # =========================
+        st.subheader("CSV Validation")
+
+        storyboard_model = get_parsed_storyboard()["model"]
+        storyboard_input = build_storyboard_input_config()["storyboard_input"]
+        csv_validation = validate_storyboard(
+            storyboard_model,
+            shot_filter=storyboard_input["shot_filter"],
+            custom_shot_ids=storyboard_input["custom_shot_ids"],
+            description_source=SCENE_DESCRIPTION_SOURCE,
+        )
+
+        for error in csv_validation.errors:
+            st.error(error)
+
+        for warning in csv_validation.warnings:
+            st.warning(warning)
+
+        if csv_validation.ok:
+            st.success(
+                f"{len(csv_validation.shot_ids)} shot · "
+                f"character: {', '.join(csv_validation.characters) or '-'} · "
+                f"description: {csv_validation.description_column}"
+            )
+
+            with st.expander("Scene Prompt Data Preview (local)", expanded=False):
+                st.caption(
+                    "ScenePromptBuilder가 만드는 structured shot data를 local에서 미리 구성한 결과입니다."
+                )
+                st.json(
+                    build_structured_shot_data(
+                        storyboard_model,
+                        csv_validation.shot_ids,
+                        description_source=SCENE_DESCRIPTION_SOURCE,
+                    )
+                )
+
+        # =========================
+        # Full Pipeline
+        # =========================
+        st.subheader("Full Pipeline")
+        st.caption(
+            "2A Character Appearance → 2B Outfit Change → 3 Scene → 4 Camera Refinement를 "
+            "한 번에 실행합니다. Boy / Girl 2A → 2B는 동시에 진행되고, 각 단계 결과는 "
+            "다음 단계 입력으로 자동 전달됩니다. 2A 외형 설정과 2B Garment / Outfit Reference는 "
+            "현재 각 탭에 입력된 값을 사용합니다."
+        )
+
+        include_camera_stage = st.checkbox(
+            "Step 4 Camera Refinement까지 실행",
+            value=False,
+            key="pipeline_include_camera",
+        )
+
+        resume_background_run(
+            "pipeline",
+            "Full Pipeline 실행",
+            apply_pipeline_result,
+        )
+
+        for stage, error in st.session_state.get("pipeline_stage_errors", {}).items():
+            st.warning(f"Pipeline stage `{stage}` 실패: {error}")
+
+        if st.button("Run Full Pipeline", type="primary", use_container_width=True):
+            st.session_state.pop("pipeline_stage_errors", None)
+            storyboard_input = build_storyboard_input_config()["storyboard_input"]
+            body_configs = {
+                "c1": build_body_ui_config("C1"),
+                "c2": build_body_ui_config("C2"),
+            }
+            missing_outfits = get_missing_outfit_labels(body_configs)
+            storyboard_errors = get_storyboard_errors(
+                character_filters=("C1", "C2"),
+                description_source=SCENE_DESCRIPTION_SOURCE,
+            )
+
+            if (
+                storyboard_input["shot_filter"] == "CUSTOM"
+                and not storyboard_input["custom_shot_ids"]
+            ):
+                st.error("shot_filter가 CUSTOM이면 최소 1개 이상의 shot을 선택해야 합니다.")
+
+            elif storyboard_errors:
+                show_storyboard_errors(storyboard_errors)
+
+            elif missing_outfits:
+                st.error(
+                    "먼저 Step 2B에서 Garment / Outfit Reference를 업로드하세요: "
+                    + ", ".join(missing_outfits)
+                )
+
+            else:
+                try:
+                    result = run_in_background(
+                        "pipeline",
+                        "Full Pipeline 실행",
+                        run_storyboard_pipeline,
+                        api_key=st.secrets["RUNCOMFY_API_KEY"],
+                        deployment_id=st.secrets["DEPLOYMENT_ID"],
+                        face_configs={
+                            "c1": build_face_ui_config("C1"),
+                            "c2": build_face_ui_config("C2"),
+                        },
+                        body_configs=body_configs,
+                        scene_config=build_scene_ui_config(),
+                        camera_config=(
+                            build_camera_refinement_ui_config()
+                            if include_camera_stage
+                            else None
+                        ),
+                        poll_interval=10,
+                        timeout_seconds=1800,
+                    )
+
+                    if apply_pipeline_result(result):
+                        st.success("Full Pipeline 실행이 완료되었습니다.")
+                        st.rerun()
+                    else:
+                        st.error("Full Pipeline 실행 결과 이미지가 없습니다.")
+
+                except RunComfyCancelledError:
+                    st.warning("Full Pipeline 실행을 중지했습니다.")
+
+                except KeyError as e:
+                    st.error("RunComfy secret 설정이 없습니다.")
+                    st.caption("`.streamlit/secrets.toml`에 RUNCOMFY_API_KEY와 DEPLOYMENT_ID를 추가해야 합니다.")
+                    st.exception(e)
+
+                except Exception as e:
+                    st.error("Full Pipeline 실행 중 오류가 발생했습니다.")
+                    st.exception(e)
+
     else:
         st.info(
             "CSV 파일을 업로드하면 "
@@ -972,36 +1973,41 @@ with tab2:
             st.subheader("Character Appearance Preview")
         
             face_preview_col1, face_preview_col2 = st.columns(2, gap="medium")
+            face_preview_slots = {}
         
             with face_preview_col1:
                 st.markdown("##### Image 1 - Boy")
             
-                if st.session_state.get("face_result_image_c1") is not None:
-                    render_image_preview_box(
-                        st.session_state["face_result_image_c1"],
-                        caption="Image 1 - Boy Appearance Reference",
-                        height=400,
-                    )
-                else:
-                    render_empty_preview_box(
-                        "Image 1 - Boy appearance reference will appear here.",
-                        400,
-                    )
+                face_preview_slots["c1"] = st.empty()
+                with face_preview_slots["c1"].container():
+                    if st.session_state.get("face_result_image_c1") is not None:
+                        render_image_preview_box(
+                            st.session_state["face_result_image_c1"],
+                            caption="Image 1 - Boy Appearance Reference",
+                            height=400,
+                        )
+                    else:
+                        render_empty_preview_box(
+                            "Image 1 - Boy appearance reference will appear here.",
+                            400,
+                        )
         
             with face_preview_col2:
                 st.markdown("##### Image 2 - Girl")
             
-                if st.session_state.get("face_result_image_c2") is not None:
-                    render_image_preview_box(
-                        st.session_state["face_result_image_c2"],
-                        caption="Image 2 - Girl Appearance Reference",
-                        height=400,
-                    )
-                else:
-                    render_empty_preview_box(
-                        "Image 2 - Girl appearance reference will appear here.",
-                        400,
-                    )
+                face_preview_slots["c2"] = st.empty()
+                with face_preview_slots["c2"].container():
+                    if st.session_state.get("face_result_image_c2") is not None:
+                        render_image_preview_box(
+                            st.session_state["face_result_image_c2"],
+                            caption="Image 2 - Girl Appearance Reference",
+                            height=400,
+                        )
+                    else:
+                        render_empty_preview_box(
+                            "Image 2 - Girl appearance reference will appear here.",
+                            400,
+                        )
 
             
         with settings_col:
@@ -1133,15 +2139,64 @@ with tab2:
 
             # st.divider()
 
+            face_seed = render_fixed_seed_control("face")
+
+            for pending_character_code in ("c1", "c2"):
+                resume_background_run(
+                    f"face_{pending_character_code}",
+                    "Character Appearance 생성",
+                    lambda result: apply_face_result(result, pending_character_code),
+                )
+
+            st.checkbox(
+                "Generate both (Boy + Girl)",
+                value=False,
+                key="face_generate_both",
+                help="Image 1 - Boy와 Image 2 - Girl을 동시에 생성합니다.",
+            )
+
             generate_clicked = st.button("Generate Character Appearance", type="primary", use_container_width=True)
 
             if generate_clicked:
                 csv_text = st.session_state.get("csv_text", "")
+                storyboard_errors = get_storyboard_errors(
+                    character_filters=(
+                        ("C1", "C2")
+                        if st.session_state.get("face_generate_both", False)
+                        else (build_face_ui_config()["character_registry_parser"]["character_filter"],)
+                    ),
+                )
 
                 if not csv_text.strip():
                     st.error("먼저 Step 1에서 CSV 파일을 업로드해야 합니다.")
                 elif st.session_state.get("shot_filter_mode", "ALL") == "CUSTOM" and len(st.session_state.get("custom_shots", [])) == 0:
                     st.error("shot_filter가 CUSTOM이면 최소 1개 이상의 shot을 선택해야 합니다.")
+                elif storyboard_errors:
+                    show_storyboard_errors(storyboard_errors)
+                elif st.session_state.get("face_generate_both", False):
+                    try:
+                        if generate_both_characters(
+                            "face",
+                            "Character Appearance 생성",
+                            run_face_generation,
+                            {
+                                "c1": build_face_ui_config("C1"),
+                                "c2": build_face_ui_config("C2"),
+                            },
+                            apply_face_result,
+                            face_preview_slots,
+                            "Appearance Reference",
+                            api_key=st.secrets["RUNCOMFY_API_KEY"],
+                            deployment_id=st.secrets["DEPLOYMENT_ID"],
+                            poll_interval=5,
+                            timeout_seconds=900,
+                            seed=face_seed,
+                        ):
+                            st.rerun()
+                    except KeyError as e:
+                        st.error("RunComfy secret 설정이 없습니다.")
+                        st.caption("`.streamlit/secrets.toml`에 RUNCOMFY_API_KEY와 DEPLOYMENT_ID를 추가해야 합니다.")
+                        st.exception(e)
                 else:
                     config = build_face_ui_config()
                     character_filter = config["character_registry_parser"]["character_filter"]
@@ -1151,29 +2206,25 @@ with tab2:
                         api_key = st.secrets["RUNCOMFY_API_KEY"]
                         deployment_id = st.secrets["DEPLOYMENT_ID"]
 
-                        with st.spinner("Character Appearance를 생성하는 중입니다..."):
-                            result = run_face_generation(
-                                api_key=api_key,
-                                deployment_id=deployment_id,
-                                config=config,
-                                poll_interval=5,
-                                timeout_seconds=900,
-                            )
-
-                        images = result.get("images", [])
+                        result = run_in_background(
+                            f"face_{character_code}",
+                            "Character Appearance 생성",
+                            run_face_generation,
+                            api_key=api_key,
+                            deployment_id=deployment_id,
+                            config=config,
+                            poll_interval=5,
+                            timeout_seconds=900,
+                            seed=face_seed,
+                        )
 
-                        if not images:
+                        if not apply_face_result(result, character_code):
                             st.error("RunComfy 실행은 완료되었지만 결과 이미지가 없습니다.")
                             with st.expander("RunComfy Raw Result", expanded=False):
                                 st.json(result)
                             with st.expander("Collected Character Appearance Config", expanded=False):
                                 st.json(config)
                         else:
-                            first_image = images[0]
-                            
-                            st.session_state[f"face_result_image_{character_code}"] = first_image["image"]
-                            st.session_state[f"face_result_filename_{character_code}"] = first_image.get("filename", "")
-       
                             st.success("Character Appearance 생성이 완료되었습니다.")
                             st.rerun()
 
@@ -1201,36 +2252,41 @@ with tab2:
         with preview_col:
             st.subheader("Outfit Change Preview")
             body_preview_col1, body_preview_col2 = st.columns(2, gap="medium")
+            body_preview_slots = {}
 
             with body_preview_col1:
                 st.markdown("##### Image 1 - Boy")
 
-                if st.session_state.get("body_result_image_c1") is not None:
-                    render_image_preview_box(
-                        st.session_state["body_result_image_c1"],
-                        caption="Image 1 - Boy Final Character Reference",
-                        height=400,
-                    )
-                else:
-                    render_empty_preview_box(
-                        "Image 1 - Boy outfit-changed reference will appear here.",
-                        400,
-                    )
+                body_preview_slots["c1"] = st.empty()
+                with body_preview_slots["c1"].container():
+                    if st.session_state.get("body_result_image_c1") is not None:
+                        render_image_preview_box(
+                            st.session_state["body_result_image_c1"],
+                            caption="Image 1 - Boy Final Character Reference",
+                            height=400,
+                        )
+                    else:
+                        render_empty_preview_box(
+                            "Image 1 - Boy outfit-changed reference will appear here.",
+                            400,
+                        )
 
             with body_preview_col2:
                 st.markdown("##### Image 2 - Girl")
 
-                if st.session_state.get("body_result_image_c2") is not None:
-                    render_image_preview_box(
-                        st.session_state["body_result_image_c2"],
-                        caption="Image 2 - Girl Final Character Reference",
-                        height=400,
-                    )
-                else:
-                    render_empty_preview_box(
-                        "Image 2 - Girl outfit-changed reference will appear here.",
-                        400,
-                    )
+                body_preview_slots["c2"] = st.empty()
+                with body_preview_slots["c2"].container():
+                    if st.session_state.get("body_result_image_c2") is not None:
+                        render_image_preview_box(
+                            st.session_state["body_result_image_c2"],
+                            caption="Image 2 - Girl Final Character Reference",
+                            height=400,
+                        )
+                    else:
+                        render_empty_preview_box(
+                            "Image 2 - Girl outfit-changed reference will appear here.",
+                            400,
+                        )
 
         # ================= RIGHT: Outfit Change Controls =================
         with settings_col:
@@ -1331,16 +2387,15 @@ with tab2:
                             key=upload_key,
                             help=(
                                 f"{garment_label} reference image를 업로드합니다. "
-                                "업로드된 이미지는 base64 data URI로 변환되어 "
+                                "업로드된 이미지는 한 번만 저장된 뒤 짧은 URL로 "
                                 "RunComfy LoadImageFromUrl 노드에 전달됩니다."
                             ),
                         )
 
                         if uploaded_garment is not None:
-                            garment_data_uri = uploaded_image_to_data_uri(
-                                uploaded_garment
+                            st.session_state[reference_key] = (
+                                uploaded_image_to_reference_url(uploaded_garment)
                             )
-                            st.session_state[reference_key] = garment_data_uri
 
                             st.image(
                                 uploaded_garment,
@@ -1371,17 +2426,14 @@ with tab2:
                     label_visibility="collapsed",
                     help=(
                         "Full outfit reference image를 업로드합니다. "
-                        "업로드된 이미지는 base64 data URI로 변환되어 "
+                        "업로드된 이미지는 한 번만 저장된 뒤 짧은 URL로 "
                         "RunComfy LoadImageFromUrl 노드에 전달됩니다."
                     ),
                 )
 
                 if single_outfit_upload is not None:
-                    single_outfit_data_uri = uploaded_image_to_data_uri(
-                        single_outfit_upload
-                    )
                     st.session_state[single_reference_key] = (
-                        single_outfit_data_uri
+                        uploaded_image_to_reference_url(single_outfit_upload)
                     )
                 else:
                     st.session_state[single_reference_key] = ""
@@ -1407,13 +2459,78 @@ with tab2:
                 unsafe_allow_html=True,
             )
 
+            for pending_character_code in ("c1", "c2"):
+                resume_background_run(
+                    f"body_{pending_character_code}",
+                    "Reference-based Outfit Change 실행",
+                    lambda result: apply_body_result(result, pending_character_code),
+                )
+
+            st.checkbox(
+                "Generate both (Boy + Girl)",
+                value=False,
+                key="body_generate_both",
+                help=(
+                    "두 캐릭터의 Garment / Outfit Reference를 모두 업로드한 뒤 "
+                    "Image 1 - Boy와 Image 2 - Girl을 동시에 생성합니다."
+                ),
+            )
+
             generate_body_clicked = st.button(
                 "Generate Outfit Reference",
                 type="primary",
                 use_container_width=True,
             )
 
-            if generate_body_clicked:
+            if generate_body_clicked and st.session_state.get("body_generate_both", False):
+                body_configs = {
+                    "c1": build_body_ui_config("C1"),
+                    "c2": build_body_ui_config("C2"),
+                }
+                missing_characters = [
+                    body_config["outfit_change"]["label"]
+                    for body_config in body_configs.values()
+                    if not body_config["outfit_change"]["character_image_url"]
+                ]
+                missing_outfits = get_missing_outfit_labels(body_configs)
+
+                if missing_characters:
+                    st.error(
+                        "먼저 2A에서 Character Appearance를 생성하세요: "
+                        + ", ".join(missing_characters)
+                    )
+
+                elif missing_outfits:
+                    st.error(
+                        "Garment / Outfit Reference 파일을 업로드하세요: "
+                        + ", ".join(missing_outfits)
+                    )
+
+                else:
+                    try:
+                        if generate_both_characters(
+                            "body",
+                            "Reference-based Outfit Change 실행",
+                            run_body_generation,
+                            body_configs,
+                            apply_body_result,
+                            body_preview_slots,
+                            "Final Character Reference",
+                            api_key=st.secrets["RUNCOMFY_API_KEY"],
+                            deployment_id=st.secrets["DEPLOYMENT_ID"],
+                            poll_interval=10,
+                            timeout_seconds=1800,
+                        ):
+                            st.rerun()
+                    except KeyError as e:
+                        st.error("RunComfy secret 설정이 없습니다.")
+                        st.caption(
+                            "`.streamlit/secrets.toml`에 RUNCOMFY_API_KEY와 "
+                            "DEPLOYMENT_ID를 추가해야 합니다."
+                        )
+                        st.exception(e)
+
+            elif generate_body_clicked:
                 body_config = build_body_ui_config()
                 outfit_change_config = body_config["outfit_change"]
 
@@ -1475,42 +2592,18 @@ with tab2:
                         api_key = st.secrets["RUNCOMFY_API_KEY"]
                         deployment_id = st.secrets["DEPLOYMENT_ID"]
 
-                        with st.spinner("Reference-based Outfit Change를 실행하는 중입니다..."):
-                            result = run_body_generation(
-                                api_key=api_key,
-                                deployment_id=deployment_id,
-                                config=body_config,
-                                poll_interval=10,
-                                timeout_seconds=1800,
-                            )
+                        result = run_in_background(
+                            f"body_{character_code}",
+                            "Reference-based Outfit Change 실행",
+                            run_body_generation,
+                            api_key=api_key,
+                            deployment_id=deployment_id,
+                            config=body_config,
+                            poll_interval=10,
+                            timeout_seconds=1800,
+                        )
 
-                        images = result.get("images", [])
-
-                        # backend 수정 전/응답 구조 차이를 고려한 fallback.
-                        # 새 Outfit Change workflow의 final SaveImage는 node 17을 사용합니다.
-                        if not images:
-                            raw_result = result.get("result", result)
-                            outputs = raw_result.get("outputs", {})
-                            save_output = outputs.get("17", {})
-                            raw_images = save_output.get("images", [])
-
-                            images = [
-                                {
-                                    "label": (
-                                        f"{'Boy' if character_code == 'c1' else 'Girl'} "
-                                        f"Outfit Reference {idx + 1}"
-                                    ),
-                                    "image": item.get("url", ""),
-                                    "url": item.get("url", ""),
-                                    "filename": item.get("filename", ""),
-                                    "node_id": "17",
-                                    "raw": item,
-                                }
-                                for idx, item in enumerate(raw_images)
-                                if item.get("url")
-                            ]
-
-                        if not images:
+                        if not apply_body_result(result, character_code):
                             st.error(
                                 "RunComfy 실행은 완료되었지만 Outfit Change 결과 이미지가 없습니다."
                             )
@@ -1522,16 +2615,6 @@ with tab2:
                             ):
                                 st.json(body_config)
                         else:
-                            first_image = images[0]
-
-                            # Step 3가 기존 키를 그대로 사용하므로 결과 저장 키는 유지합니다.
-                            st.session_state[f"body_result_image_{character_code}"] = (
-                                first_image["image"]
-                            )
-                            st.session_state[f"body_result_filename_{character_code}"] = (
-                                first_image.get("filename", "")
-                            )
-
                             st.success("Reference-based Outfit Change가 완료되었습니다.")
                             st.rerun()
 
@@ -1722,7 +2805,7 @@ with tab3:
     
             if boy_body_image:
                 st.image(
-                    boy_body_image,
+                    get_local_preview_image(boy_body_image, 440),
                     caption="Image 1 Character Reference",
                     width=220,
                 )
@@ -1736,7 +2819,7 @@ with tab3:
     
             if girl_body_image:
                 st.image(
-                    girl_body_image,
+                    get_local_preview_image(girl_body_image, 440),
                     caption="Image 2 Character Reference",
                     width=220,
                 )
@@ -1746,7 +2829,100 @@ with tab3:
                 st.warning("Step 2에서 Image 2 character reference를 먼저 생성해야 합니다.")
     
         st.divider()
-    
+
+        with st.container(border=True):
+            st.markdown("###### Batch Mode")
+            st.checkbox(
+                "Split selected shots into parallel jobs",
+                value=False,
+                key="scene_batch_mode",
+                help=(
+                    "선택된 shot을 shot 단위 RunComfy job으로 나누어 병렬 실행합니다. "
+                    "일부 shot이 실패해도 나머지 결과는 유지됩니다."
+                ),
+            )
+
+            if st.session_state.get("scene_batch_mode", False):
+                batch_col1, batch_col2 = st.columns(2)
+
+                with batch_col1:
+                    st.number_input(
+                        "Shots per Job",
+                        min_value=1,
+                        max_value=20,
+                        value=1,
+                        step=1,
+                        key="scene_batch_shots_per_job",
+                    )
+
+                with batch_col2:
+                    st.number_input(
+                        "Max Parallel Jobs",
+                        min_value=1,
+                        max_value=32,
+                        value=int(
+                            get_optional_secret(
+                                "DEPLOYMENT_MAX_CONCURRENCY",
+                                SCENE_BATCH_MAX_CONCURRENCY,
+                            )
+                        ),
+                        step=1,
+                        key="scene_batch_max_concurrency",
+                        help="RunComfy deployment의 replica 수에 맞춰 설정합니다.",
+                    )
+
+        if not st.session_state.get("scene_batch_mode", False):
+            scene_num_candidates = render_num_candidates_control("scene")
+        else:
+            scene_num_candidates = 1
+
+        resume_background_run("scene", "Storyboard Scene 생성", apply_scene_result)
+        resume_background_run("scene_batch", "Scene Batch 생성", apply_scene_result)
+        resume_background_run("scene_changed", "변경 Shot Scene 재생성", merge_scene_result)
+
+        pending_shot_ids = st.session_state.get("storyboard_pending_shot_ids", [])
+
+        if pending_shot_ids:
+            st.info(
+                "Storyboard CSV 수정으로 다시 생성이 필요한 shot: "
+                f"{', '.join(pending_shot_ids)} · 나머지 shot 결과는 그대로 유지됩니다."
+            )
+
+            if st.button("Regenerate Changed Shots", use_container_width=True):
+                try:
+                    merged = merge_scene_result(
+                        run_in_background(
+                            "scene_changed",
+                            "변경 Shot Scene 재생성",
+                            run_scene_generation_batch,
+                            api_key=st.secrets["RUNCOMFY_API_KEY"],
+                            deployment_id=st.secrets["DEPLOYMENT_ID"],
+                            config=scene_config_for_shots(
+                                build_scene_ui_config(),
+                                pending_shot_ids,
+                            ),
+                            shots_per_job=1,
+                            max_concurrency=st.session_state.get(
+                                "scene_batch_max_concurrency",
+                                SCENE_BATCH_MAX_CONCURRENCY,
+                            ),
+                            poll_interval=10,
+                            timeout_seconds=1800,
+                        )
+                    )
+
+                    if merged:
+                        st.rerun()
+                    else:
+                        st.error("RunComfy 실행은 완료되었지만 scene 결과 이미지가 없습니다.")
+
+                except RunComfyCancelledError:
+                    st.warning("변경 Shot Scene 재생성을 중지했습니다.")
+
+                except Exception as e:
+                    st.error("변경 Shot Scene 재생성 중 오류가 발생했습니다.")
+                    st.exception(e)
+
         generate_scene_clicked = st.button(
             "Generate Storyboard Scene",
             type="primary",
@@ -1755,6 +2931,9 @@ with tab3:
 
         if generate_scene_clicked:
             storyboard_input = build_storyboard_input_config()["storyboard_input"]
+            storyboard_errors = get_storyboard_errors(
+                description_source=SCENE_DESCRIPTION_SOURCE,
+            )
 
             if not storyboard_input["csv_text"].strip():
                 st.error("먼저 Step 1에서 CSV 파일을 업로드해야 합니다.")
@@ -1765,6 +2944,9 @@ with tab3:
             ):
                 st.error("shot_filter가 CUSTOM이면 최소 1개 이상의 shot을 선택해야 합니다.")
 
+            elif storyboard_errors:
+                show_storyboard_errors(storyboard_errors)
+
             elif not boy_body_image:
                 st.error("Image 1 - Boy body reference가 없습니다. 먼저 Step 2B에서 생성하세요.")
 
@@ -1778,18 +2960,36 @@ with tab3:
                     api_key = st.secrets["RUNCOMFY_API_KEY"]
                     deployment_id = st.secrets["DEPLOYMENT_ID"]
 
-                    with st.spinner("Storyboard Scene을 생성하는 중입니다..."):
-                        result = run_scene_generation(
+                    if st.session_state.get("scene_batch_mode", False):
+                        result = run_in_background(
+                            "scene_batch",
+                            "Scene Batch 생성",
+                            run_scene_generation_batch,
                             api_key=api_key,
                             deployment_id=deployment_id,
                             config=scene_config,
+                            shots_per_job=st.session_state.get("scene_batch_shots_per_job", 1),
+                            max_concurrency=st.session_state.get(
+                                "scene_batch_max_concurrency",
+                                SCENE_BATCH_MAX_CONCURRENCY,
+                            ),
                             poll_interval=10,
                             timeout_seconds=1800,
                         )
+                    else:
+                        result = run_in_background(
+                            "scene",
+                            "Storyboard Scene 생성",
+                            run_scene_generation,
+                            api_key=api_key,
+                            deployment_id=deployment_id,
+                            config=scene_config,
+                            poll_interval=10,
+                            timeout_seconds=1800,
+                            num_candidates=scene_num_candidates,
+                        )
 
-                    images = result.get("images", [])
-
-                    if not images:
+                    if not apply_scene_result(result):
                         st.error("RunComfy 실행은 완료되었지만 scene 결과 이미지가 없습니다.")
 
                         with st.expander("RunComfy Raw Scene Result", expanded=False):
@@ -1799,13 +2999,6 @@ with tab3:
                             st.json(scene_config)
 
                     else:
-                        first_image = images[0]
-
-                        st.session_state["scene_candidates"] = images
-                        st.session_state["scene_result_image"] = first_image["image"]
-                        st.session_state["scene_result_filename"] = first_image.get("filename", "")
-                        st.session_state["scene_selected_label"] = first_image["label"]
-
                         st.success("Storyboard Scene 생성이 완료되었습니다.")
                         st.rerun()
 
@@ -1817,6 +3010,9 @@ with tab3:
                     with st.expander("Collected Scene Generation Config", expanded=False):
                         st.json(scene_config)
 
+                except RunComfyCancelledError:
+                    st.warning("Storyboard Scene 생성을 중지했습니다.")
+
                 except Exception as e:
                     st.error("RunComfy Scene Generation 실행 중 오류가 발생했습니다.")
                     st.exception(e)
@@ -1947,7 +3143,7 @@ with tab4:
 
                     if selected_input_scene.get("image"):
                         st.image(
-                            selected_input_scene["image"],
+                            get_local_preview_image(selected_input_scene["image"]),
                             caption=selected_input_scene.get("label", "Source Scene"),
                             use_container_width=True,
                         )
@@ -2042,6 +3238,15 @@ with tab4:
             unsafe_allow_html=True,
         )
 
+        camera_seed = render_fixed_seed_control("camera")
+        camera_num_candidates = render_num_candidates_control("camera")
+
+        resume_background_run(
+            "camera",
+            "Camera-Refined Scene 생성",
+            apply_camera_result,
+        )
+
         generate_camera_clicked = st.button(
             "Generate Camera-Refined Scene",
             type="primary",
@@ -2076,18 +3281,20 @@ with tab4:
                     api_key = st.secrets["RUNCOMFY_API_KEY"]
                     deployment_id = st.secrets["DEPLOYMENT_ID"]
 
-                    with st.spinner("Camera-Refined Scene을 생성하는 중입니다..."):
-                        result = run_camera_refinement(
-                            api_key=api_key,
-                            deployment_id=deployment_id,
-                            config=camera_config,
-                            poll_interval=10,
-                            timeout_seconds=1800,
-                        )
-
-                    images = result.get("images", [])
+                    result = run_in_background(
+                        "camera",
+                        "Camera-Refined Scene 생성",
+                        run_camera_refinement,
+                        api_key=api_key,
+                        deployment_id=deployment_id,
+                        config=camera_config,
+                        poll_interval=10,
+                        timeout_seconds=1800,
+                        seed=camera_seed,
+                        num_candidates=camera_num_candidates,
+                    )
 
-                    if not images:
+                    if not apply_camera_result(result):
                         st.error(
                             "RunComfy 실행은 완료되었지만 "
                             "camera refinement 결과 이미지가 없습니다."
@@ -2112,22 +3319,6 @@ with tab4:
                             st.json(result.get("workflow_api_json", {}))
 
                     else:
-                        first_image = images[0]
-
-                        st.session_state["camera_refined_candidates"] = images
-                        st.session_state["camera_refined_result_image"] = (
-                            first_image["image"]
-                        )
-                        st.session_state["camera_refined_result_filename"] = (
-                            first_image.get("filename", "")
-                        )
-                        st.session_state["camera_refined_selected_label"] = (
-                            first_image.get(
-                                "label",
-                                "Camera Refined Scene 1",
-                            )
-                        )
-
                         st.success("Camera-Refined Scene 생성이 완료되었습니다.")
                         st.rerun()
 
@@ -2163,3 +3354,102 @@ with tab4:
                             expanded=False,
                         ):
                             st.json(result)
+
+        # -------------------------------------------------
+        # Camera Angle Sweep
+        # -------------------------------------------------
+        with st.expander("Camera Angle Sweep", expanded=False):
+            st.caption(
+                "선택한 scene 하나에 여러 camera pose를 동시에 실행해 contact sheet로 비교합니다. "
+                "source scene은 한 번만 전달되고, 모든 pose는 같은 seed를 사용합니다."
+            )
+
+            st.text_input(
+                "Horizontal Angles",
+                value="-45, 0, 45",
+                key="camera_sweep_horizontal_angles",
+                help="쉼표로 구분한 좌우 각도 목록입니다.",
+            )
+            st.text_input(
+                "Vertical Angles",
+                value="0",
+                key="camera_sweep_vertical_angles",
+                help="쉼표로 구분한 상하 각도 목록입니다.",
+            )
+            st.text_input(
+                "Zoom Levels",
+                value="5",
+                key="camera_sweep_zooms",
+                help="쉼표로 구분한 zoom 목록입니다. 세 목록의 모든 조합이 실행됩니다.",
+            )
+
+            resume_background_run(
+                "camera_sweep",
+                "Camera Angle Sweep",
+                apply_camera_sweep_result,
+            )
+
+            sweep_clicked = st.button(
+                "Run Angle Sweep",
+                use_container_width=True,
+                key="run_camera_angle_sweep",
+            )
+
+            if sweep_clicked:
+                selected_input_scene = get_selected_candidate(
+                    get_scene_result_candidates(),
+                    st.session_state.get("camera_input_scene_label", ""),
+                )
+
+                try:
+                    poses = camera_sweep_poses(
+                        parse_number_list(
+                            st.session_state["camera_sweep_horizontal_angles"]
+                        ),
+                        parse_number_list(
+                            st.session_state["camera_sweep_vertical_angles"]
+                        ),
+                        parse_number_list(
+                            st.session_state["camera_sweep_zooms"],
+                            cast=float,
+                        ),
+                    )
+                except ValueError:
+                    poses = []
+                    st.error("각도와 zoom은 쉼표로 구분한 숫자로 입력하세요.")
+
+                if not selected_input_scene or not selected_input_scene.get("image"):
+                    st.error("Camera Refinement에 사용할 입력 scene을 선택하세요.")
+
+                elif poses:
+                    try:
+                        result = run_in_background(
+                            "camera_sweep",
+                            "Camera Angle Sweep",
+                            run_camera_angle_sweep,
+                            api_key=st.secrets["RUNCOMFY_API_KEY"],
+                            deployment_id=st.secrets["DEPLOYMENT_ID"],
+                            config=build_camera_refinement_ui_config(),
+                            poses=poses,
+                            max_concurrency=CAMERA_SWEEP_MAX_CONCURRENCY,
+                            poll_interval=10,
+                            timeout_seconds=1800,
+                            seed=camera_seed,
+                        )
+
+                        if apply_camera_sweep_result(result):
+                            st.rerun()
+
+                    except RunComfyCancelledError:
+                        st.warning("Camera Angle Sweep을 중지했습니다.")
+
+                    except KeyError as e:
+                        st.error("RunComfy secret 설정이 없습니다.")
+                        st.exception(e)
+
+                    except Exception as e:
+                        st.error("Camera Angle Sweep 실행 중 오류가 발생했습니다.")
+                        st.exception(e)
+
+            elif st.session_state.get("camera_sweep_sheet"):
+                render_camera_sweep_sheet(st.session_state["camera_sweep_sheet"])
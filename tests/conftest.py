@@ -0,0 +1,171 @@
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import backend  # noqa: E402
+
+
+class FakeRunComfy:
+    """
+    RunComfy serverless API를 흉내 내는 local HTTP server입니다.
+
+    - POST .../deployments/<id>/inference: job을 만들고 request_id를 반환
+      (fail_deployments에 있는 deployment는 503)
+    - GET .../status: delay_seconds 동안 in_queue → in_progress, 이후 completed
+    - GET .../result: workflow의 SaveImage node마다 이미지 하나를 반환
+    - POST .../cancel: job을 cancelled로 표시
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.posts_by_deployment = {}
+        self.cancels = 0
+        self.delay_seconds = 0.2
+        self.fail_deployments = set()
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def posts(self) -> int:
+        return sum(self.posts_by_deployment.values())
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status_code, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                parts = self.path.rstrip("/").split("/")
+
+                if parts[-1] == "cancel":
+                    with fake._lock:
+                        fake.cancels += 1
+                        job = fake.jobs.get(parts[-2])
+                        if job is not None:
+                            job["cancelled"] = True
+                    return self._send(200, {"status": "cancelled"})
+
+                deployment_id = parts[-2]
+                if deployment_id in fake.fail_deployments:
+                    return self._send(503, {"error": "unavailable"})
+
+                request_id = uuid.uuid4().hex
+                with fake._lock:
+                    fake.posts_by_deployment[deployment_id] = (
+                        fake.posts_by_deployment.get(deployment_id, 0) + 1
+                    )
+                    fake.jobs[request_id] = {
+                        "created_at": time.time(),
+                        "workflow": payload.get("workflow_api_json") or {},
+                        "cancelled": False,
+                    }
+
+                request_url = (
+                    f"{fake.base_url}/prod/v1/deployments/{deployment_id}"
+                    f"/requests/{request_id}"
+                )
+                self._send(
+                    200,
+                    {
+                        "request_id": request_id,
+                        "status_url": f"{request_url}/status",
+                        "result_url": f"{request_url}/result",
+                    },
+                )
+
+            def do_GET(self):
+                parts = self.path.rstrip("/").split("/")
+                job = fake.jobs.get(parts[-2])
+
+                if job is None:
+                    return self._send(404, {"error": "not found"})
+
+                if parts[-1] == "status":
+                    if job["cancelled"]:
+                        return self._send(200, {"status": "cancelled"})
+
+                    elapsed = time.time() - job["created_at"]
+                    if elapsed < fake.delay_seconds / 2:
+                        status = "in_queue"
+                    elif elapsed < fake.delay_seconds:
+                        status = "in_progress"
+                    else:
+                        status = "completed"
+                    return self._send(200, {"status": status})
+
+                outputs = {}
+                for node_id, node in job["workflow"].items():
+                    if isinstance(node, dict) and node.get("class_type") == "SaveImage":
+                        filename = f"{node_id}_00001_.png"
+                        outputs[node_id] = {
+                            "images": [
+                                {
+                                    "url": f"https://cdn.example/{parts[-2]}/{filename}",
+                                    "filename": filename,
+                                    "type": "output",
+                                }
+                            ]
+                        }
+                self._send(200, {"status": "succeeded", "outputs": outputs})
+
+        return Handler
+
+
+@pytest.fixture
+def fake_runcomfy(monkeypatch):
+    fake = FakeRunComfy()
+    monkeypatch.setattr(backend, "RUNCOMFY_API_BASE", fake.base_url)
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def engine(monkeypatch, fake_runcomfy):
+    """
+    test마다 새 RunComfyJobEngine을 module singleton으로 설정합니다.
+    ledger / result cache는 끄고, polling 간격은 짧게 줄입니다.
+    """
+    monkeypatch.setattr(backend, "POLL_MIN_INTERVAL", 0.05)
+    monkeypatch.setattr(backend, "_JOB_LEDGER", None)
+    monkeypatch.setattr(backend, "_RESULT_CACHE", None)
+
+    job_engine = backend.RunComfyJobEngine()
+    monkeypatch.setattr(backend, "_JOB_ENGINE", job_engine)
+    return job_engine
+
+
+@pytest.fixture
+def save_workflow():
+    return {
+        "9": {
+            "class_type": "SaveImage",
+            "inputs": {"filename_prefix": "test"},
+        }
+    }
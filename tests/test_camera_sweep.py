@@ -0,0 +1,78 @@
+import pytest
+
+import backend
+
+
+@pytest.fixture
+def camera_config():
+    return {
+        "camera_angle_refinement": {
+            "input_scene": {
+                "label": "S1 · Scene 1",
+                "image": "https://cdn.example/scene.png",
+                "shot_ids": ["S1"],
+            },
+            "camera_control": {"horizontal_angle": 30},
+        }
+    }
+
+
+def test_sweep_returns_sheet_in_pose_order(engine, fake_runcomfy, camera_config):
+    poses = backend.camera_sweep_poses([-45, 0, 45], [0])
+    events = []
+
+    result = backend.run_camera_angle_sweep(
+        "key",
+        "dep",
+        camera_config,
+        poses,
+        max_concurrency=2,
+        poll_interval=0.1,
+        on_progress=events.append,
+    )
+
+    assert [item["index"] for item in result["sheet"]] == [0, 1, 2]
+    assert all(item["image"] and not item["error"] for item in result["sheet"])
+    assert fake_runcomfy.posts == 3
+    assert all(item["shot_ids"] == ["S1"] for item in result["sheet"])
+    assert all(image["shot_ids"] == ["S1"] for image in result["images"])
+
+    job_events = [event for event in events if "pose_index" in event]
+    assert {event["pose_index"] for event in job_events} == {0, 1, 2}
+    assert {event["type"] for event in job_events} >= {"submitted", "status"}
+    assert [event["type"] for event in events].count("stage") == 3
+    assert events[-1]["type"] == "completed"
+
+
+def test_fixed_seed_sweep_uses_result_cache(engine, fake_runcomfy, camera_config):
+    backend.configure_result_cache()
+    poses = backend.camera_sweep_poses([-45, 45], [0])
+
+    first = backend.run_camera_angle_sweep(
+        "key", "dep", camera_config, poses, poll_interval=0.1, seed=7
+    )
+    second = backend.run_camera_angle_sweep(
+        "key", "dep", camera_config, poses, poll_interval=0.1, seed=7
+    )
+
+    assert fake_runcomfy.posts == 2
+    assert [item["image"] for item in second["sheet"]] == [
+        item["image"] for item in first["sheet"]
+    ]
+
+
+def test_cancelled_sweep_raises(engine, fake_runcomfy, camera_config):
+    fake_runcomfy.delay_seconds = 30
+    scope = backend.CancelScope()
+    scope.cancel()
+
+    with backend.cancel_scope(scope), pytest.raises(backend.RunComfyCancelledError):
+        backend.run_camera_angle_sweep(
+            "key",
+            "dep",
+            camera_config,
+            backend.camera_sweep_poses([0], [0]),
+            poll_interval=0.1,
+        )
+
+    assert fake_runcomfy.posts == 0
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import backend
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("condition was not met in time")
+        time.sleep(0.02)
+
+
+def test_cancel_job_cancels_remote_request(engine, fake_runcomfy, save_workflow):
+    fake_runcomfy.delay_seconds = 30
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1)
+    _wait_until(lambda: job.request_id)
+
+    assert backend.cancel_job(job)
+
+    with pytest.raises(backend.RunComfyCancelledError):
+        job.wait(5)
+
+    assert job.status == "cancelled"
+    _wait_until(lambda: fake_runcomfy.cancels == 1)
+
+
+def test_cancel_scope_blocks_later_submits(engine, save_workflow):
+    scope = backend.CancelScope()
+
+    with backend.cancel_scope(scope):
+        scope.cancel()
+
+        with pytest.raises(backend.RunComfyCancelledError):
+            engine.submit("key", "dep", save_workflow, poll_interval=0.1)
+
+
+def test_cancelling_one_waiter_keeps_shared_job(engine, fake_runcomfy, save_workflow):
+    fake_runcomfy.delay_seconds = 1.0
+    first = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+    second = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+
+    backend.cancel_job(first)
+
+    with pytest.raises(backend.RunComfyCancelledError):
+        first.wait(5)
+
+    assert second.wait(10)["outputs"]
+    assert second.status == "completed"
+    assert fake_runcomfy.cancels == 0
+
+
+def test_cancelling_every_waiter_cancels_shared_job(engine, fake_runcomfy, save_workflow):
+    fake_runcomfy.delay_seconds = 30
+    first = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+    second = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+    _wait_until(lambda: first.request_id)
+
+    backend.cancel_job(first)
+    backend.cancel_job(second)
+
+    for waiter in (first, second):
+        with pytest.raises(backend.RunComfyCancelledError):
+            waiter.wait(5)
+
+    _wait_until(lambda: fake_runcomfy.cancels == 1)
+
+
+def test_cancel_during_ledger_finish_still_records_it(
+    engine,
+    tmp_path,
+    monkeypatch,
+    save_workflow,
+):
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(backend, "_JOB_LEDGER", ledger)
+    record_finish = ledger.record_finish
+
+    def slow_record_finish(job, **kwargs):
+        time.sleep(0.3)
+        record_finish(job, **kwargs)
+
+    monkeypatch.setattr(ledger, "record_finish", slow_record_finish)
+
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1)
+    job.wait(10)
+
+    # result는 끝났지만 ledger 기록 중인 task를 cancel합니다.
+    engine._loop.call_soon_threadsafe(job._task.cancel)
+    _wait_until(lambda: job._task.done())
+
+    assert ledger.get(job.job_id)["finished_at"] is not None
+    assert ledger.unfinished() == []
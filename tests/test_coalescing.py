@@ -0,0 +1,61 @@
+import concurrent.futures
+import contextvars
+
+import backend
+
+
+def test_coalesced_submits_share_one_request(engine, fake_runcomfy, save_workflow):
+    first = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+    second = engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x")
+
+    assert first.job is second.job
+    assert first.wait(10) == second.wait(10)
+    assert fake_runcomfy.posts == 1
+
+
+def test_finished_job_is_not_coalesced(engine, fake_runcomfy, save_workflow):
+    engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x").wait(10)
+    engine.submit("key", "dep", save_workflow, poll_interval=0.1, coalesce_key="x").wait(10)
+
+    assert fake_runcomfy.posts == 2
+
+
+def _run_as(owners: list[str], workflow: dict, cacheable: bool) -> None:
+    def run(owner: str) -> None:
+        with backend.job_owner(owner):
+            backend._run_workflow(
+                "key",
+                "dep",
+                workflow,
+                poll_interval=0.1,
+                timeout_seconds=10,
+                cacheable=cacheable,
+            )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(owners)) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, run, owner)
+            for owner in owners
+        ]
+        for future in futures:
+            future.result()
+
+
+def test_random_seed_requests_coalesce_only_within_one_owner(
+    engine,
+    fake_runcomfy,
+    save_workflow,
+):
+    fake_runcomfy.delay_seconds = 1.0
+
+    _run_as(["session-a", "session-a", "session-b"], save_workflow, cacheable=False)
+
+    assert fake_runcomfy.posts == 2
+
+
+def test_fixed_seed_requests_coalesce_across_owners(engine, fake_runcomfy, save_workflow):
+    fake_runcomfy.delay_seconds = 1.0
+
+    _run_as(["session-a", "session-b"], save_workflow, cacheable=True)
+
+    assert fake_runcomfy.posts == 1
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import backend
+
+
+def test_governor_grants_slots_round_robin_by_owner():
+    governor = backend.DeploymentGovernor(
+        requests_per_second=100,
+        burst=100,
+        max_in_flight=1,
+    )
+    granted = []
+
+    async def acquire(owner: str, label: str) -> None:
+        await governor.acquire_slot("dep", owner=owner)
+        granted.append(label)
+
+    async def scenario() -> None:
+        await governor.acquire_slot("dep", owner="holder")
+
+        tasks = [
+            asyncio.create_task(acquire(owner, label))
+            for owner, label in (
+                ("batch", "batch-1"),
+                ("batch", "batch-2"),
+                ("batch", "batch-3"),
+                ("single", "single-1"),
+            )
+        ]
+        await asyncio.sleep(0)
+        assert governor.queued("dep") == 4
+
+        for _ in tasks:
+            governor.release_slot("dep")
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+    assert granted == ["batch-1", "single-1", "batch-2", "batch-3"]
+    assert governor.in_flight("dep") == 1
+
+
+def test_governor_limits_in_flight_per_deployment():
+    governor = backend.DeploymentGovernor(max_in_flight=2)
+
+    async def scenario() -> None:
+        await governor.acquire_slot("dep")
+        await governor.acquire_slot("dep")
+        assert not governor.has_free_slot("dep")
+        assert governor.has_free_slot("other")
+
+        waiter = asyncio.create_task(governor.acquire_slot("dep"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        governor.release_slot("dep")
+        await waiter
+        assert governor.in_flight("dep") == 2
+
+    asyncio.run(scenario())
+
+
+def test_governor_throttle_rate_limits_after_burst():
+    governor = backend.DeploymentGovernor(requests_per_second=20, burst=2)
+
+    async def scenario() -> float:
+        started_at = time.monotonic()
+        for _ in range(6):
+            await governor.throttle("dep")
+        return time.monotonic() - started_at
+
+    # burst 2개 이후 4개는 20/s로 소비되므로 최소 0.2초가 걸립니다.
+    assert asyncio.run(scenario()) >= 0.18
+
+
+def test_governor_configure_overrides_one_deployment():
+    governor = backend.DeploymentGovernor(max_in_flight=4)
+    governor.configure("small", max_in_flight=1)
+
+    assert governor._lane("small").max_in_flight == 1
+    assert governor._lane("large").max_in_flight == 4
+
+
+def test_governor_load_does_not_create_lanes():
+    governor = backend.DeploymentGovernor(max_in_flight=3)
+    governor.configure("small", max_in_flight=1)
+
+    assert governor.load("unused") == (0, 3)
+    assert governor.load("small") == (0, 1)
+    assert governor._lanes == {}
+
+    async def scenario() -> None:
+        await governor.acquire_slot("small")
+        waiter = asyncio.create_task(governor.acquire_slot("small"))
+        await asyncio.sleep(0)
+        assert governor.load("small") == (2, 1)
+        governor.release_slot("small")
+        await waiter
+
+    asyncio.run(scenario())
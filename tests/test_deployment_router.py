@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+import backend
+
+
+def test_router_uses_caller_deployment_without_routes():
+    router = backend.DeploymentRouter()
+    governor = backend.DeploymentGovernor()
+
+    assert router.choose("face", "dep", governor) == "dep"
+    assert router.choose("face", "dep", governor, exclude=("dep",)) is None
+
+
+def test_router_prefers_less_loaded_deployment():
+    router = backend.DeploymentRouter()
+    router.configure({"scene": "dep-a, dep-b"})
+    governor = backend.DeploymentGovernor(max_in_flight=2)
+
+    async def load_dep_a() -> None:
+        await governor.acquire_slot("dep-a")
+        await governor.acquire_slot("dep-a")
+
+    asyncio.run(load_dep_a())
+
+    assert router.routes() == {"scene": ["dep-a", "dep-b"]}
+    assert router.choose("scene", "dep", governor) == "dep-b"
+
+
+def test_router_skips_deployment_in_cooldown():
+    router = backend.DeploymentRouter()
+    router.configure({"scene": ["dep-a", "dep-b"]})
+    governor = backend.DeploymentGovernor()
+
+    router.record_failure("dep-a")
+    assert router.choose("scene", "dep", governor) == "dep-b"
+    assert router.choose("scene", "dep", governor, exclude=("dep-b",)) == "dep-a"
+
+    router.record_success("dep-a")
+    router.record_failure("dep-b")
+    assert router.choose("scene", "dep", governor) == "dep-a"
+
+
+def test_router_cooldown_grows_with_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(backend, "ROUTER_FAILURE_COOLDOWN_SECONDS", 10.0)
+    monkeypatch.setattr(backend, "ROUTER_MAX_COOLDOWN_SECONDS", 25.0)
+    router = backend.DeploymentRouter()
+    router.configure({"scene": ["dep-a", "dep-b"]})
+    governor = backend.DeploymentGovernor()
+
+    now = time.monotonic()
+    router.record_failure("dep-a")
+    assert router._cooldown_until["dep-a"] - now >= 10.0
+
+    router.record_failure("dep-a")
+    router.record_failure("dep-a")
+    assert router._cooldown_until["dep-a"] - now <= 25.0 + 1.0
+
+    # 모든 후보가 cooldown 중이면 가장 먼저 풀리는 deployment를 고릅니다.
+    router.record_failure("dep-b")
+    assert router.choose("scene", "dep", governor) == "dep-b"
+
+
+def test_submit_fails_over_to_next_route(engine, fake_runcomfy, save_workflow):
+    engine.router.configure({"scene": ["dep-a", "dep-b"]})
+    fake_runcomfy.fail_deployments = {"dep-a"}
+
+    jobs = [
+        engine.submit("key", "dep", save_workflow, poll_interval=0.1, workflow_key="scene")
+        for _ in range(2)
+    ]
+    for job in jobs:
+        job.wait(10)
+
+    assert fake_runcomfy.posts_by_deployment == {"dep-b": 2}
+    assert {job.deployment_id for job in jobs} == {"dep-b"}
+
+
+def test_submit_fails_when_every_route_fails(engine, fake_runcomfy, save_workflow):
+    engine.router.configure({"scene": ["dep-a", "dep-b"]})
+    fake_runcomfy.fail_deployments = {"dep-a", "dep-b"}
+
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1, workflow_key="scene")
+
+    with pytest.raises(backend.RunComfyHTTPError):
+        job.wait(30)
+
+    assert fake_runcomfy.posts == 0
@@ -0,0 +1,101 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import backend
+
+pytest.importorskip("PIL")
+
+
+@pytest.fixture
+def image_server():
+    """
+    /<name>.png 요청마다 작은 PNG를 반환하고 요청 수를 셉니다. /missing.png는 404입니다.
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), "red").save(buffer, format="PNG")
+    png_bytes = buffer.getvalue()
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+
+            if self.path == "/missing.png":
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(png_bytes)))
+            self.end_headers()
+            self.wfile.write(png_bytes)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    server.requests_seen = requests_seen
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_thumbnail_is_reused_after_original_is_evicted(tmp_path, image_server):
+    store = backend.ImageStore(directory=tmp_path)
+    url = f"{image_server.base_url}/scene.png"
+
+    thumb_path = store.thumbnail(url, max_size=16)
+    for original_path in store._originals_dir.iterdir():
+        original_path.unlink()
+
+    assert store.thumbnail(url, max_size=16) == thumb_path
+    assert image_server.requests_seen == ["/scene.png"]
+    assert store._key_locks == {}
+
+
+def test_cached_thumbnail_builds_in_background(tmp_path, image_server):
+    store = backend.ImageStore(directory=tmp_path)
+    url = f"{image_server.base_url}/scene.png"
+
+    assert store.cached_thumbnail(url, max_size=16) is None
+
+    deadline = time.time() + 5
+    while store.cached_thumbnail(url, max_size=16) is None:
+        assert time.time() < deadline
+        time.sleep(0.02)
+
+    assert store.preview_url(url, max_size=16).startswith(store.static_url)
+    assert image_server.requests_seen == ["/scene.png"]
+
+
+def test_failed_downloads_expire(tmp_path, image_server, monkeypatch):
+    store = backend.ImageStore(directory=tmp_path)
+    monkeypatch.setattr(backend, "IMAGE_STORE_RETRY_SECONDS", 0.05)
+
+    assert store.mirror(f"{image_server.base_url}/missing.png") is None
+    assert store._recently_failed(f"{image_server.base_url}/missing.png")
+
+    time.sleep(0.1)
+    assert store.mirror(f"{image_server.base_url}/other.png") is not None
+    store._record_failure("https://cdn.example/new.png")
+
+    assert list(store._failed_at) == ["https://cdn.example/new.png"]
+
+
+def test_eviction_keeps_total_size_under_limit(tmp_path, image_server):
+    store = backend.ImageStore(directory=tmp_path, max_bytes=1)
+
+    store.mirror(f"{image_server.base_url}/a.png")
+    store.mirror(f"{image_server.base_url}/b.png")
+
+    assert store._total_bytes <= 1
+    assert list(store._originals_dir.iterdir()) == []
@@ -0,0 +1,28 @@
+import backend
+
+
+def test_submit_returns_handle_and_result(engine, fake_runcomfy, save_workflow):
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1)
+
+    result = job.wait(10)
+
+    assert job.status == "completed"
+    assert job.request_id
+    assert fake_runcomfy.posts == 1
+    assert result["outputs"]["9"]["images"][0]["filename"] == "9_00001_.png"
+    assert [event["type"] for event in job.events()][-1] == "completed"
+    assert engine.get(job.job_id) is job
+
+
+def test_run_workflow_returns_request_and_result(engine, fake_runcomfy, save_workflow):
+    request_data, result_data = backend._run_workflow(
+        "key",
+        "dep",
+        save_workflow,
+        poll_interval=0.1,
+        timeout_seconds=10,
+    )
+
+    assert request_data["request_id"]
+    assert result_data["outputs"]["9"]["images"]
+    assert fake_runcomfy.posts == 1
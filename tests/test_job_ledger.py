@@ -0,0 +1,121 @@
+import sqlite3
+import time
+
+import pytest
+
+import backend
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("condition was not met in time")
+        time.sleep(0.02)
+
+
+def test_ledger_records_submission_and_result(engine, tmp_path, monkeypatch, save_workflow):
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(backend, "_JOB_LEDGER", ledger)
+
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1, workflow_key="face")
+    result = job.wait(10)
+    _wait_until(lambda: (ledger.get(job.job_id) or {}).get("finished_at"))
+
+    row = ledger.get(job.job_id)
+    assert row["request_id"] == job.request_id
+    assert row["workflow_key"] == "face"
+    assert row["status"] == "completed"
+    assert backend.JobLedger.result_of(row) == result
+    assert ledger.find_by_request_id(job.request_id)["job_id"] == job.job_id
+    assert ledger.unfinished() == []
+
+
+def test_resume_continues_polling_unfinished_job(
+    engine,
+    fake_runcomfy,
+    tmp_path,
+    monkeypatch,
+    save_workflow,
+):
+    fake_runcomfy.delay_seconds = 1.0
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(backend, "_JOB_LEDGER", ledger)
+
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1)
+    _wait_until(lambda: (ledger.get(job.job_id) or {}).get("status_url"))
+    unfinished = ledger.unfinished()
+    assert [row["job_id"] for row in unfinished] == [job.job_id]
+
+    # server 재시작: 새 engine은 기록된 status_url / result_url로 polling만 이어갑니다.
+    restarted_engine = backend.RunComfyJobEngine()
+    monkeypatch.setattr(backend, "_JOB_ENGINE", restarted_engine)
+
+    resumed = backend.resume_unfinished_jobs("key")
+
+    assert [item.job_id for item in resumed] == [job.job_id]
+    assert resumed[0].request_id == job.request_id
+    assert resumed[0].wait(10)["outputs"]["9"]["images"]
+    assert fake_runcomfy.posts == 1
+
+
+def test_resume_fetches_result_after_restart_longer_than_timeout(
+    engine,
+    fake_runcomfy,
+    tmp_path,
+    monkeypatch,
+    save_workflow,
+):
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(backend, "_JOB_LEDGER", ledger)
+
+    job = engine.submit("key", "dep", save_workflow, poll_interval=0.1, timeout_seconds=5)
+    _wait_until(lambda: (ledger.get(job.job_id) or {}).get("status_url"))
+    row = ledger.get(job.job_id)
+
+    # 마지막 기록 이후 timeout_seconds보다 오래 server가 꺼져 있던 경우입니다.
+    row.update(submitted_at=row["submitted_at"] - 3600, finished_at=None)
+    resumed = backend.RunComfyJobEngine().resume("key", row)
+
+    assert resumed.wait(10)["outputs"]["9"]["images"]
+    assert resumed.status == "completed"
+
+
+def test_ledger_closes_connections(tmp_path):
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+
+    with ledger._connect() as connection:
+        connection.execute("SELECT 1")
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("SELECT 1")
+
+
+def test_recover_background_run_after_restart(
+    engine,
+    fake_runcomfy,
+    tmp_path,
+    monkeypatch,
+    save_workflow,
+):
+    ledger = backend.JobLedger(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(backend, "_JOB_LEDGER", ledger)
+
+    def run_two_jobs(on_progress=None):
+        jobs = [
+            backend.get_job_engine().submit("key", "dep", save_workflow, poll_interval=0.1)
+            for _ in range(2)
+        ]
+        return {"results": [job.wait(10) for job in jobs]}
+
+    run = backend.BackgroundRunRegistry().start("batch", run_two_jobs)
+    run.wait(10)
+    _wait_until(lambda: (ledger.get_run(run.run_id) or {}).get("finished_at"))
+
+    assert len(ledger.find_by_run_id(run.run_id)) == 2
+
+    recovered = backend.BackgroundRunRegistry().recover(run.run_id)
+
+    assert recovered.step == "batch"
+    assert recovered.wait(5) == run.wait()
+    assert backend.BackgroundRunRegistry().recover("unknown") is None
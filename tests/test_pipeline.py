@@ -0,0 +1,40 @@
+import backend
+
+
+def test_camera_stage_inherits_scene_shot_ids(monkeypatch):
+    camera_configs = []
+
+    def stage_result(label, shot_ids=()):
+        image = {
+            "image": f"https://cdn.example/{label}.png",
+            "label": label,
+            "shot_ids": list(shot_ids),
+        }
+        return {"images": [image]}
+
+    monkeypatch.setattr(backend, "run_face_generation", lambda **kwargs: stage_result("face"))
+    monkeypatch.setattr(backend, "run_body_generation", lambda **kwargs: stage_result("body"))
+    monkeypatch.setattr(
+        backend,
+        "run_scene_generation",
+        lambda **kwargs: stage_result("scene", shot_ids=["S2"]),
+    )
+
+    def run_camera(**kwargs):
+        camera_configs.append(kwargs["config"])
+        return stage_result("camera")
+
+    monkeypatch.setattr(backend, "run_camera_refinement", run_camera)
+
+    result = backend.run_storyboard_pipeline(
+        "key",
+        "dep",
+        face_configs={"c1": {}, "c2": {}},
+        body_configs={"c1": {}, "c2": {}},
+        scene_config={},
+        camera_config={},
+    )
+
+    assert result["errors"] == {}
+    input_scene = camera_configs[0]["camera_angle_refinement"]["input_scene"]
+    assert input_scene["shot_ids"] == ["S2"]
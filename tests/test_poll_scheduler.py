@@ -0,0 +1,51 @@
+import pytest
+
+import backend
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(backend, "POLL_JITTER_RATIO", 0.0)
+
+
+def test_queued_backoff_starts_at_poll_interval_and_caps_at_max():
+    scheduler = backend.AdaptivePollScheduler(base_interval=10)
+
+    delays = [scheduler.next_delay("in_queue") for _ in range(4)]
+
+    assert delays == [10, 20, backend.POLL_MAX_INTERVAL, backend.POLL_MAX_INTERVAL]
+
+
+def test_backoff_restarts_when_job_starts_running():
+    scheduler = backend.AdaptivePollScheduler(base_interval=5)
+    for _ in range(3):
+        scheduler.next_delay("in_queue")
+
+    assert scheduler.next_delay("in_progress") == 5
+    assert scheduler.next_delay("in_progress") == 10
+
+
+def test_expected_duration_tightens_only_near_finish():
+    scheduler = backend.AdaptivePollScheduler(
+        base_interval=10,
+        expected_execution_seconds=120,
+    )
+
+    assert scheduler.next_delay("in_progress") == backend.POLL_MAX_INTERVAL
+
+    scheduler._in_progress_since -= 118
+    assert scheduler.next_delay("in_progress") == pytest.approx(
+        backend.POLL_MIN_INTERVAL,
+        abs=0.1,
+    )
+
+    # 예상 시간을 넘기면 다시 poll_interval부터 backoff 합니다.
+    scheduler._in_progress_since -= 10
+    assert scheduler.next_delay("in_progress") == 10
+
+
+def test_server_eta_and_retry_after_hints():
+    scheduler = backend.AdaptivePollScheduler(base_interval=10)
+
+    assert scheduler.next_delay("in_queue", {"eta": 4}) == 2
+    assert scheduler.next_delay("in_queue", {"eta": 4}, retry_after=7) == 7
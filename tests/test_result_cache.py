@@ -0,0 +1,74 @@
+import backend
+
+
+def _workflow(index: int) -> dict:
+    return {"1": {"class_type": "KSampler", "inputs": {"seed": index}}}
+
+
+def test_result_cache_round_trip():
+    cache = backend.ResultCache()
+
+    assert cache.get(_workflow(1)) is None
+
+    cache.put(_workflow(1), {"request_id": "r1"}, {"outputs": {}})
+
+    assert cache.get(_workflow(1)) == ({"request_id": "r1"}, {"outputs": {}})
+    assert cache.get(_workflow(2)) is None
+
+
+def test_result_cache_ignores_expired_entries():
+    cache = backend.ResultCache(ttl_seconds=-1)
+    cache.put(_workflow(1), {}, {})
+
+    assert cache.get(_workflow(1)) is None
+    assert cache.store.list_entries() == []
+
+
+def test_result_cache_evicts_least_recently_used_entry():
+    cache = backend.ResultCache(max_entries=2)
+    cache.put(_workflow(1), {}, {"index": 1})
+    cache.put(_workflow(2), {}, {"index": 2})
+
+    # 1을 다시 사용했으므로 3을 넣으면 2가 삭제됩니다.
+    assert cache.get(_workflow(1)) is not None
+    cache.put(_workflow(3), {}, {"index": 3})
+
+    assert cache.get(_workflow(2)) is None
+    assert cache.get(_workflow(1)) is not None
+    assert cache.get(_workflow(3)) is not None
+
+
+def test_result_cache_evicts_by_total_size():
+    cache = backend.ResultCache(max_bytes=300)
+
+    for index in range(5):
+        cache.put(_workflow(index), {}, {"payload": "x" * 100, "index": index})
+
+    entries = cache.store.list_entries()
+    assert sum(size for _key, _accessed_at, size in entries) <= 300
+    assert cache.get(_workflow(4)) is not None
+    assert cache.get(_workflow(0)) is None
+
+
+def test_disk_result_store_survives_new_cache(tmp_path):
+    cache = backend.ResultCache(store=backend.DiskResultStore(tmp_path), max_entries=2)
+    for index in range(3):
+        cache.put(_workflow(index), {}, {"index": index})
+
+    reopened = backend.ResultCache(store=backend.DiskResultStore(tmp_path), max_entries=2)
+    reopened.put(_workflow(3), {}, {"index": 3})
+
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert reopened.get(_workflow(3)) == ({}, {"index": 3})
+
+
+def test_memory_store_returns_copies():
+    cache = backend.ResultCache()
+    result_data = {"images": [{"label": "Scene"}]}
+    cache.put(_workflow(1), {}, result_data)
+    result_data["images"].append({"label": "added after put"})
+
+    _request, cached = cache.get(_workflow(1))
+    cached["images"][0]["label"] = "Scene (Candidate 1)"
+
+    assert cache.get(_workflow(1))[1] == {"images": [{"label": "Scene"}]}
@@ -0,0 +1,85 @@
+import backend
+
+CSV_HEADER = "Scene,description,character\n"
+
+
+def _storyboard(body: str) -> backend.Storyboard:
+    return backend.Storyboard.from_csv(CSV_HEADER + body)
+
+
+def test_diff_storyboards_without_previous_marks_all_added():
+    current = _storyboard("S1,a,Boy\nS2,b,Girl\n")
+
+    diff = backend.diff_storyboards(None, current)
+
+    assert diff.added == ["S1", "S2"]
+    assert diff.regenerate_shot_ids == ["S1", "S2"]
+    assert diff.stale_shot_ids == []
+
+
+def test_diff_storyboards_reports_changed_columns():
+    previous = _storyboard("S1,a,Boy\nS2,b,Girl\nS4,d,Boy\n")
+    current = _storyboard("S1,a,Boy\nS3,c,Girl\nS2,b2,Girl\n")
+
+    diff = backend.diff_storyboards(previous, current)
+
+    assert diff.added == ["S3"]
+    assert diff.removed == ["S4"]
+    assert diff.changed == ["S2"]
+    assert diff.unchanged == ["S1"]
+    assert diff.changed_columns == {"S2": ["description"]}
+    assert diff.stale_shot_ids == ["S2", "S4"]
+    assert diff.regenerate_shot_ids == ["S3", "S2"]
+
+
+def test_diff_storyboards_identical_revision_is_empty():
+    previous = _storyboard("S1,a,Boy\n")
+
+    diff = backend.diff_storyboards(previous, _storyboard("S1,a,Boy\n"))
+
+    assert not diff
+    assert diff.to_dict()["unchanged"] == ["S1"]
+
+
+def test_read_storyboard_csv_utf8_with_bom():
+    raw = (CSV_HEADER + "S1,소년이 달린다,Boy\n").encode("utf-8-sig")
+
+    csv_text, encoding, storyboard = backend.read_storyboard_csv(raw)
+
+    assert encoding == "utf-8-sig"
+    assert csv_text.startswith("Scene")
+    assert storyboard.shot_ids == ["S1"]
+
+
+def test_read_storyboard_csv_cp949():
+    raw = (CSV_HEADER + "S1,소년이 달린다,Boy\n").encode("cp949")
+
+    csv_text, encoding, storyboard = backend.read_storyboard_csv(raw)
+
+    assert encoding == "cp949"
+    assert "소년이 달린다" in csv_text
+    assert storyboard.get("S1") is not None
+
+
+def test_read_storyboard_csv_retries_full_bytes_after_sample():
+    # encoding sample 범위에는 ASCII만 있어 utf-8로 고르지만 뒷부분은 cp949입니다.
+    filler = "".join(
+        f"F{index},filler,Boy\n"
+        for index in range(backend.STORYBOARD_ENCODING_SAMPLE_BYTES // 10)
+    )
+    raw = (CSV_HEADER + filler + "S1,소녀가 웃는다,Girl\n").encode("cp949")
+
+    csv_text, encoding, storyboard = backend.read_storyboard_csv(raw)
+
+    assert encoding == "cp949"
+    assert csv_text.endswith("S1,소녀가 웃는다,Girl\n")
+    assert storyboard.shot_ids[-1] == "S1"
+
+
+def test_read_storyboard_csv_falls_back_to_lossy_utf8():
+    raw = CSV_HEADER.encode("utf-8") + b"S1,\xff\xfe\xff,Boy\n"
+
+    csv_text, encoding, storyboard = backend.read_storyboard_csv(raw)
+
+    assert encoding == backend.STORYBOARD_LOSSY_ENCODING
+    assert storyboard.shot_ids == ["S1"]